@@ -56,6 +56,14 @@ def create_app():
         from models.clip import Clip
         from models.gravacao_tag import gravacao_tags
         from models.cliente import Cliente
+        from models.transcription_job import TranscriptionJob
+        from models.transcription_segment import TranscriptionSegment
+        from models.tag_occurrence import TagOccurrence, TagCloudKey
+        from models.keyword_alert import KeywordAlert, AlertWebhookDelivery
+        from models.media_probe import MediaProbe
+        from models.audio_location import AudioLocation
+        from models.dropbox_upload import DropboxUpload
+        from models.recording_process import RecordingProcess
         
         # Garantir que todas as tabelas existam antes de receber requisições
         try:
@@ -149,13 +157,14 @@ def create_app():
     
     # Inicializar scheduler (aguardar banco estar pronto)
     from services.scheduler_service import init_scheduler
-    with app.app_context():
-        try:
-            wait_for_db(max_tries=60, delay=1)  # Mais tentativas, intervalo menor
-            init_scheduler()
-        except RuntimeError as e:
-            # Log do erro mas não falha a inicialização
-            print(f"Warning: {e}. Scheduler não iniciado.")
+    if Config.SCHEDULER_ENABLED:
+        with app.app_context():
+            try:
+                wait_for_db(max_tries=60, delay=1)  # Mais tentativas, intervalo menor
+                init_scheduler()
+            except RuntimeError as e:
+                # Log do erro mas não falha a inicialização
+                print(f"Warning: {e}. Scheduler não iniciado.")
     
     @app.errorhandler(404)
     def not_found(e):
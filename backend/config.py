@@ -96,6 +96,10 @@ class Config:
     STORAGE_PATH = os.path.join(os.path.dirname(__file__), 'storage')
     UPLOAD_PATH = os.path.join(os.path.dirname(__file__), 'uploads')
 
+    # Desligado em processos auxiliares (ex.: tools/transcription_worker.py) para não duplicar agendamentos;
+    # desligado na API quando as gravações rodam em tools/recording_worker.py
+    SCHEDULER_ENABLED = _env_bool('SCHEDULER_ENABLED', True)
+
     # Dropbox (opcional) - arquivamento de áudios para economizar disco
     DROPBOX_UPLOAD_ENABLED = os.getenv('DROPBOX_UPLOAD_ENABLED', 'false').lower() == 'true'
     DROPBOX_ACCESS_TOKEN = os.getenv('DROPBOX_ACCESS_TOKEN')
@@ -107,6 +111,26 @@ class Config:
     DROPBOX_AUDIO_UNRECOGNIZED_PATH = os.getenv('DROPBOX_AUDIO_UNRECOGNIZED_PATH', '/audio/_NAO_RECONHECIDO')
     DROPBOX_DELETE_LOCAL_AFTER_UPLOAD = os.getenv('DROPBOX_DELETE_LOCAL_AFTER_UPLOAD', 'true').lower() == 'true'
     DROPBOX_LOCAL_RETENTION_DAYS = int(os.getenv('DROPBOX_LOCAL_RETENTION_DAYS', '30') or 30)
+    # Fila de envio ao Dropbox (dropbox_uploads): envios paralelos e novas tentativas
+    DROPBOX_UPLOAD_WORKERS = _env_int('DROPBOX_UPLOAD_WORKERS', 2)
+    DROPBOX_UPLOAD_MAX_ATTEMPTS = _env_int('DROPBOX_UPLOAD_MAX_ATTEMPTS', 6)
+    DROPBOX_UPLOAD_POLL_SECONDS = _env_int('DROPBOX_UPLOAD_POLL_SECONDS', 10)
+    # Envio sem conclusão após esse tempo volta para a fila (worker perdido)
+    DROPBOX_UPLOAD_LEASE_SECONDS = _env_int('DROPBOX_UPLOAD_LEASE_SECONDS', 1800)
+    # Conexões keep-alive por host do Dropbox (0 = automático pelo número de workers)
+    DROPBOX_HTTP_POOL_SIZE = _env_int('DROPBOX_HTTP_POOL_SIZE', 0)
+    # Pastas remotas já criadas/listadas ficam em cache para pular create_folder (0 = desliga)
+    DROPBOX_FOLDER_CACHE_SECONDS = _env_int('DROPBOX_FOLDER_CACHE_SECONDS', 3600)
+    # Blocos enviados em paralelo por arquivo grande (sessão concorrente; 1 = sequencial)
+    DROPBOX_UPLOAD_CHUNK_CONCURRENCY = _env_int('DROPBOX_UPLOAD_CHUNK_CONCURRENCY', 4)
+    # Cache em disco (storage/audio_cache) dos áudios arquivados, para a reprodução não baixar de novo
+    AUDIO_CACHE_ENABLED = _env_bool('AUDIO_CACHE_ENABLED', True)
+    AUDIO_CACHE_MAX_MB = _env_int('AUDIO_CACHE_MAX_MB', 2048)
+    # Acima disso o áudio segue direto do Dropbox (proxy com Range)
+    AUDIO_CACHE_MAX_FILE_MB = _env_int('AUDIO_CACHE_MAX_FILE_MB', 256)
+    AUDIO_CACHE_FETCH_TIMEOUT_SECONDS = _env_int('AUDIO_CACHE_FETCH_TIMEOUT_SECONDS', 300)
+    # Áudio grande demais ou ausente em todos os caminhos: não tenta baixar de novo por esse tempo
+    AUDIO_CACHE_SKIP_TTL_SECONDS = _env_int('AUDIO_CACHE_SKIP_TTL_SECONDS', 3600)
     try:
         AUDIO_STREAM_MAX_AGE_DAYS = int(os.getenv('AUDIO_STREAM_MAX_AGE_DAYS', '30') or 30)
     except (TypeError, ValueError):
@@ -139,18 +163,94 @@ class Config:
     TRANSCRIBE_AUDIO_PREPROCESS = _env_bool('TRANSCRIBE_AUDIO_PREPROCESS', True)
     TRANSCRIBE_AUDIO_SAMPLE_RATE = _env_int('TRANSCRIBE_AUDIO_SAMPLE_RATE', 16000)
     TRANSCRIBE_AUDIO_CHANNELS = _env_int('TRANSCRIBE_AUDIO_CHANNELS', 1)
+    # Áudio decodificado vai direto para memória; acima deste tamanho (MB de float32) usa memmap
+    TRANSCRIBE_AUDIO_MEMMAP_MB = _env_int('TRANSCRIBE_AUDIO_MEMMAP_MB', 512)
+    TRANSCRIBE_SCRATCH_DIR = _env_str('TRANSCRIBE_SCRATCH_DIR')
     TRANSCRIBE_AUDIO_FILTER = _env_str(
         'TRANSCRIBE_AUDIO_FILTER',
         'highpass=f=80,lowpass=f=7600,loudnorm=I=-16:LRA=11:TP=-1.5',
     )
     TRANSCRIBE_TEXT_UPDATE_SECONDS = _env_int('TRANSCRIBE_TEXT_UPDATE_SECONDS', 10)
     TRANSCRIBE_PROGRESS_STEP = _env_int('TRANSCRIBE_PROGRESS_STEP', 5)
+    # Intervalo mínimo entre gravações de progresso/texto parcial no banco
+    TRANSCRIBE_PROGRESS_FLUSH_SECONDS = _env_float('TRANSCRIBE_PROGRESS_FLUSH_SECONDS', 5.0)
     TRANSCRIBE_MAX_CONCURRENT = _env_int('TRANSCRIBE_MAX_CONCURRENT', 1)
-    TRANSCRIBE_RECOVERY_ENABLED = _env_bool('TRANSCRIBE_RECOVERY_ENABLED', True)
-    TRANSCRIBE_RECOVERY_INTERVAL_SECONDS = _env_int('TRANSCRIBE_RECOVERY_INTERVAL_SECONDS', 45)
-    TRANSCRIBE_RECOVERY_BATCH_SIZE = _env_int('TRANSCRIBE_RECOVERY_BATCH_SIZE', 5)
+    # Pool de processos: um modelo por processo (0 = núcleos / TRANSCRIBE_CPU_THREADS)
+    TRANSCRIBE_POOL_ENABLED = _env_bool('TRANSCRIBE_POOL_ENABLED', False)
+    TRANSCRIBE_POOL_PROCESSES = _env_int('TRANSCRIBE_POOL_PROCESSES', 0)
+    # Job do pool sem nenhum evento por esse tempo é abandonado e o processo reciclado
+    TRANSCRIBE_POOL_IDLE_TIMEOUT_SECONDS = _env_int('TRANSCRIBE_POOL_IDLE_TIMEOUT_SECONDS', 1800)
+    # Lote: várias gravações curtas numa passada do BatchedInferencePipeline (faster-whisper >= 1.1)
+    TRANSCRIBE_BATCH_ENABLED = _env_bool('TRANSCRIBE_BATCH_ENABLED', False)
+    TRANSCRIBE_BATCH_SIZE = _env_int('TRANSCRIBE_BATCH_SIZE', 8)
+    TRANSCRIBE_BATCH_RECORDINGS = _env_int('TRANSCRIBE_BATCH_RECORDINGS', 8)
+    TRANSCRIBE_BATCH_MAX_DURATION_SECONDS = _env_int('TRANSCRIBE_BATCH_MAX_DURATION_SECONDS', 900)
+    # Transcrição ao vivo a partir do ingest compartilhado (janela deslizante)
+    TRANSCRIBE_LIVE_ENABLED = _env_bool('TRANSCRIBE_LIVE_ENABLED', False)
+    TRANSCRIBE_LIVE_WINDOW_SECONDS = _env_int('TRANSCRIBE_LIVE_WINDOW_SECONDS', 30)
+    TRANSCRIBE_LIVE_OVERLAP_SECONDS = _env_int('TRANSCRIBE_LIVE_OVERLAP_SECONDS', 5)
+    # Fila de transcrição no banco (transcricao_jobs) com lease/heartbeat
+    TRANSCRIBE_WORKER_ENABLED = _env_bool('TRANSCRIBE_WORKER_ENABLED', True)
+    TRANSCRIBE_JOB_LEASE_SECONDS = _env_int('TRANSCRIBE_JOB_LEASE_SECONDS', 120)
+    TRANSCRIBE_JOB_MAX_ATTEMPTS = _env_int('TRANSCRIBE_JOB_MAX_ATTEMPTS', 3)
+    TRANSCRIBE_JOB_RETRY_BACKOFF_SECONDS = _env_int('TRANSCRIBE_JOB_RETRY_BACKOFF_SECONDS', 60)
+    TRANSCRIBE_JOB_POLL_SECONDS = _env_int('TRANSCRIBE_JOB_POLL_SECONDS', 5)
+    # Presets adaptativos: rápido com fila cheia/atrasada, alta fidelidade com fila ociosa
+    TRANSCRIBE_ADAPTIVE_PRESETS = _env_bool('TRANSCRIBE_ADAPTIVE_PRESETS', False)
+    TRANSCRIBE_PRESET_FAST_QUEUE_DEPTH = _env_int('TRANSCRIBE_PRESET_FAST_QUEUE_DEPTH', 10)
+    TRANSCRIBE_PRESET_FAST_AGE_SECONDS = _env_int('TRANSCRIBE_PRESET_FAST_AGE_SECONDS', 3600)
+    TRANSCRIBE_PRESET_IDLE_QUEUE_DEPTH = _env_int('TRANSCRIBE_PRESET_IDLE_QUEUE_DEPTH', 2)
+    TRANSCRIBE_PRESET_HIGH_PRIORITY = _env_int('TRANSCRIBE_PRESET_HIGH_PRIORITY', 10)
+    # Modelos por preset (vazio = TRANSCRIBE_MODEL); o pool de processos usa sempre TRANSCRIBE_MODEL
+    TRANSCRIBE_PRESET_FAST_MODEL = _env_str('TRANSCRIBE_PRESET_FAST_MODEL')
+    TRANSCRIBE_PRESET_HIGH_MODEL = _env_str('TRANSCRIBE_PRESET_HIGH_MODEL')
+    # Prioridade extra por rádio/cliente: "id:prioridade,id:prioridade"
+    TRANSCRIBE_PRIORITY_RADIOS = _env_str('TRANSCRIBE_PRIORITY_RADIOS')
+    TRANSCRIBE_PRIORITY_CLIENTES = _env_str('TRANSCRIBE_PRIORITY_CLIENTES')
+    # Reprocessa em alta fidelidade, fora de pico, o que saiu no preset rápido
+    TRANSCRIBE_OFFPEAK_RERUN = _env_bool('TRANSCRIBE_OFFPEAK_RERUN', False)
+    TRANSCRIBE_OFFPEAK_START_HOUR = _env_int('TRANSCRIBE_OFFPEAK_START_HOUR', 1)
+    TRANSCRIBE_OFFPEAK_END_HOUR = _env_int('TRANSCRIBE_OFFPEAK_END_HOUR', 5)
 
     FFMPEG_THREADS = _env_int('FFMPEG_THREADS', 0)
+    # ffprobe com cache em midia_probes; arquivos novos são inspecionados em paralelo
+    MEDIA_PROBE_WORKERS = _env_int('MEDIA_PROBE_WORKERS', 4)
+    MEDIA_PROBE_TIMEOUT_SECONDS = _env_int('MEDIA_PROBE_TIMEOUT_SECONDS', 15)
+    # Reconciliação em segundo plano de duração/tamanho/status (listagens não escrevem no banco)
+    METADATA_RECONCILE_ENABLED = _env_bool('METADATA_RECONCILE_ENABLED', True)
+    METADATA_RECONCILE_SECONDS = _env_int('METADATA_RECONCILE_SECONDS', 30)
+    METADATA_RECONCILE_BATCH = _env_int('METADATA_RECONCILE_BATCH', 200)
+    # Gravações sem duração/tamanho mais antigas que isso não são mais revisitadas
+    METADATA_RECONCILE_LOOKBACK_HOURS = _env_int('METADATA_RECONCILE_LOOKBACK_HOURS', 72)
+
+    # Ingest compartilhado: uma conexão/decodificação por rádio para todas as gravações simultâneas
+    RECORDING_SHARED_INGEST = _env_bool('RECORDING_SHARED_INGEST', True)
+    RECORDING_INGEST_SAMPLE_RATE = _env_int('RECORDING_INGEST_SAMPLE_RATE', 44100)
+    RECORDING_INGEST_CHANNELS = _env_int('RECORDING_INGEST_CHANNELS', 2)
+    RECORDING_FINALIZE_WORKERS = _env_int('RECORDING_FINALIZE_WORKERS', 4)
+    # Modo segmentado: além do arquivo completo, grava blocos de N segundos com manifesto (0 desativa)
+    RECORDING_SEGMENT_SECONDS = _env_int('RECORDING_SEGMENT_SECONDS', 0)
+    RECORDING_SEGMENT_POLL_SECONDS = _env_int('RECORDING_SEGMENT_POLL_SECONDS', 5)
+    RECORDING_SEGMENT_KEEP = _env_bool('RECORDING_SEGMENT_KEEP', False)
+
+    # Clipes por palavra-chave (corte sem recodificar a partir do áudio local)
+    CLIP_PRE_ROLL_SECONDS = _env_float('CLIP_PRE_ROLL_SECONDS', 5.0)
+    CLIP_POST_ROLL_SECONDS = _env_float('CLIP_POST_ROLL_SECONDS', 10.0)
+    # Ocorrências da mesma palavra separadas por até N segundos viram um clipe só
+    CLIP_MERGE_GAP_SECONDS = _env_float('CLIP_MERGE_GAP_SECONDS', 10.0)
+    CLIP_MAX_SECONDS = _env_int('CLIP_MAX_SECONDS', 120)
+    # Clipes cortados por invocação do ffmpeg
+    CLIP_FFMPEG_BATCH = _env_int('CLIP_FFMPEG_BATCH', 20)
+
+    # Alertas de palavra-chave (agendamentos e tags) sobre os segmentos transcritos
+    ALERTS_ENABLED = _env_bool('ALERTS_ENABLED', True)
+    # Mesma palavra na mesma rádio dentro desta janela não gera novo alerta
+    ALERT_DEDUP_SECONDS = _env_int('ALERT_DEDUP_SECONDS', 600)
+    ALERT_RULES_CACHE_SECONDS = _env_int('ALERT_RULES_CACHE_SECONDS', 60)
+    ALERT_WEBHOOK_URL = _env_str('ALERT_WEBHOOK_URL')
+    ALERT_WEBHOOK_TIMEOUT_SECONDS = _env_int('ALERT_WEBHOOK_TIMEOUT_SECONDS', 10)
+    ALERT_WEBHOOK_MAX_ATTEMPTS = _env_int('ALERT_WEBHOOK_MAX_ATTEMPTS', 5)
+    ALERT_WEBHOOK_POLL_SECONDS = _env_int('ALERT_WEBHOOK_POLL_SECONDS', 15)
 
     STREAM_VALIDATE_ON_SCHEDULE = _env_bool('STREAM_VALIDATE_ON_SCHEDULE', True)
     STREAM_VALIDATE_ON_EXECUTE = _env_bool('STREAM_VALIDATE_ON_EXECUTE', True)
@@ -163,4 +263,6 @@ class Config:
         os.makedirs(os.path.join(Config.STORAGE_PATH, 'audio'), exist_ok=True)
         os.makedirs(os.path.join(Config.STORAGE_PATH, 'clips'), exist_ok=True)
         os.makedirs(os.path.join(Config.STORAGE_PATH, 'transcripts'), exist_ok=True)
+        os.makedirs(os.path.join(Config.STORAGE_PATH, 'segments'), exist_ok=True)
+        os.makedirs(os.path.join(Config.STORAGE_PATH, 'audio_cache'), exist_ok=True)
 
@@ -15,6 +15,8 @@ echo "PostgreSQL está pronto!"
 # flask db upgrade
 
 # Iniciar a aplicação
+# Gravações, ingest e scheduler rodam dentro do worker: reciclar o worker
+# (--max-requests) mata os encoders no meio. Por isso o padrão é 0 (desligado).
 exec gunicorn \
   --worker-class eventlet \
   --workers "${GUNICORN_WORKERS:-1}" \
@@ -22,8 +24,8 @@ exec gunicorn \
   --timeout "${GUNICORN_TIMEOUT:-300}" \
   --graceful-timeout "${GUNICORN_GRACEFUL_TIMEOUT:-30}" \
   --keep-alive "${GUNICORN_KEEPALIVE:-5}" \
-  --max-requests "${GUNICORN_MAX_REQUESTS:-1000}" \
-  --max-requests-jitter "${GUNICORN_MAX_REQUESTS_JITTER:-100}" \
+  --max-requests "${GUNICORN_MAX_REQUESTS:-0}" \
+  --max-requests-jitter "${GUNICORN_MAX_REQUESTS_JITTER:-0}" \
   --access-logfile - \
   --error-logfile - \
   app:app
@@ -7,6 +7,14 @@ from models.tag import Tag
 from models.clip import Clip
 from models.gravacao_tag import gravacao_tags
 from models.cliente import Cliente
+from models.transcription_job import TranscriptionJob
+from models.transcription_segment import TranscriptionSegment
+from models.tag_occurrence import TagOccurrence, TagCloudKey
+from models.keyword_alert import KeywordAlert, AlertWebhookDelivery
+from models.media_probe import MediaProbe
+from models.audio_location import AudioLocation
+from models.dropbox_upload import DropboxUpload
+from models.recording_process import RecordingProcess
 
-__all__ = ['User', 'Radio', 'Gravacao', 'Agendamento', 'Tag', 'Clip', 'Cliente', 'gravacao_tags']
+__all__ = ['User', 'Radio', 'Gravacao', 'Agendamento', 'Tag', 'Clip', 'Cliente', 'TranscriptionJob', 'TranscriptionSegment', 'TagOccurrence', 'TagCloudKey', 'KeywordAlert', 'AlertWebhookDelivery', 'MediaProbe', 'AudioLocation', 'DropboxUpload', 'RecordingProcess', 'gravacao_tags']
 
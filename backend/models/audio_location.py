@@ -0,0 +1,24 @@
+from app import db
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+LOCAL_TZ = ZoneInfo("America/Fortaleza")
+
+
+class AudioLocation(db.Model):
+    """Onde está o áudio de cada gravação (disco local e/ou Dropbox), sem varrer storage/audio."""
+
+    __tablename__ = 'audio_localizacoes'
+
+    gravacao_id = db.Column(
+        db.String(36),
+        db.ForeignKey('gravacoes.id', ondelete='CASCADE'),
+        primary_key=True,
+    )
+    # Nome do arquivo em storage/audio; None quando não há cópia local
+    arquivo_local = db.Column(db.String(255))
+    dropbox_path = db.Column(db.String(1024))
+    # Existe <arquivo>.dropbox ao lado do arquivo local
+    marcador = db.Column(db.Boolean, nullable=False, default=False)
+    atualizado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ), onupdate=lambda: datetime.now(tz=LOCAL_TZ))
+
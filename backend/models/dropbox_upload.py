@@ -0,0 +1,49 @@
+from app import db
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+LOCAL_TZ = ZoneInfo("America/Fortaleza")
+
+# pendente -> enviando -> arquivado | pendente (nova tentativa) | erro
+DROPBOX_UPLOAD_ACTIVE_STATUSES = ('pendente', 'enviando')
+
+
+class DropboxUpload(db.Model):
+    """Fila persistente de envio ao Dropbox; uma linha por gravação com o estado do arquivo."""
+
+    __tablename__ = 'dropbox_uploads'
+    __table_args__ = (
+        db.Index('ix_dropbox_uploads_fila', 'status', 'disponivel_em'),
+    )
+
+    gravacao_id = db.Column(
+        db.String(36),
+        db.ForeignKey('gravacoes.id', ondelete='CASCADE'),
+        primary_key=True,
+    )
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    arquivo_local = db.Column(db.String(1024), nullable=False)
+    dropbox_path = db.Column(db.String(1024))
+    # Remover a cópia local depois do envio (respeitando transcrição pendente)
+    apagar_local = db.Column(db.Boolean, nullable=False, default=False)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    lease_owner = db.Column(db.String(255))
+    lease_expira_em = db.Column(db.DateTime(timezone=True))
+    disponivel_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ))
+    ultimo_erro = db.Column(db.String(500))
+    criado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ))
+    atualizado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ), onupdate=lambda: datetime.now(tz=LOCAL_TZ))
+
+    def to_dict(self):
+        return {
+            'gravacao_id': self.gravacao_id,
+            'status': self.status,
+            'arquivo_local': self.arquivo_local,
+            'dropbox_path': self.dropbox_path,
+            'apagar_local': self.apagar_local,
+            'tentativas': self.tentativas,
+            'disponivel_em': self.disponivel_em.isoformat() if self.disponivel_em else None,
+            'ultimo_erro': self.ultimo_erro,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None,
+        }
@@ -0,0 +1,73 @@
+from app import db
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+LOCAL_TZ = ZoneInfo("America/Fortaleza")
+
+
+class KeywordAlert(db.Model):
+    """Palavra-chave ouvida numa transcrição (regra de agendamento ou tag do usuário)."""
+
+    __tablename__ = 'alertas_palavra_chave'
+    __table_args__ = (
+        # Deduplicação: alertas da mesma palavra para o mesmo usuário/rádio perto de ouvido_em
+        db.Index('ix_alertas_palavra_chave_dedup', 'user_id', 'radio_id', 'palavra_normalizada', 'ouvido_em'),
+        db.Index('ix_alertas_palavra_chave_usuario', 'user_id', 'criado_em'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(36), nullable=False)
+    radio_id = db.Column(db.String(36), nullable=False)
+    gravacao_id = db.Column(
+        db.String(36),
+        db.ForeignKey('gravacoes.id', ondelete='CASCADE'),
+        nullable=False,
+        index=True,
+    )
+    origem = db.Column(db.String(20), nullable=False)  # agendamento, tag
+    origem_id = db.Column(db.String(36))
+    palavra = db.Column(db.String(255), nullable=False)
+    palavra_normalizada = db.Column(db.String(255), nullable=False)
+    inicio_segundos = db.Column(db.Float)
+    trecho = db.Column(db.Text)
+    ouvido_em = db.Column(db.DateTime(timezone=True))
+    criado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'radio_id': self.radio_id,
+            'gravacao_id': self.gravacao_id,
+            'origem': self.origem,
+            'origem_id': self.origem_id,
+            'palavra': self.palavra,
+            'inicio_segundos': self.inicio_segundos,
+            'trecho': self.trecho,
+            'ouvido_em': self.ouvido_em.isoformat() if self.ouvido_em else None,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+        }
+
+
+class AlertWebhookDelivery(db.Model):
+    """Fila de envio dos alertas para o webhook configurado."""
+
+    __tablename__ = 'alertas_webhook'
+    __table_args__ = (
+        db.Index('ix_alertas_webhook_fila', 'status', 'disponivel_em'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    alerta_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey('alertas_palavra_chave.id', ondelete='CASCADE'),
+        nullable=False,
+    )
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, enviado, erro
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    disponivel_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ))
+    erro = db.Column(db.String(500))
+    criado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ))
+    atualizado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ), onupdate=lambda: datetime.now(tz=LOCAL_TZ))
+
+    alerta = db.relationship('KeywordAlert', lazy='joined')
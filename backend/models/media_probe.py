@@ -0,0 +1,33 @@
+from app import db
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+LOCAL_TZ = ZoneInfo("America/Fortaleza")
+
+
+class MediaProbe(db.Model):
+    """Resultado do ffprobe por arquivo; vale enquanto tamanho e mtime não mudarem."""
+
+    __tablename__ = 'midia_probes'
+
+    caminho = db.Column(db.String(1024), primary_key=True)
+    tamanho_bytes = db.Column(db.BigInteger, nullable=False)
+    modificado_em = db.Column(db.Float, nullable=False)  # mtime do arquivo
+    duracao_segundos = db.Column(db.Float)
+    formato = db.Column(db.String(100))
+    codec = db.Column(db.String(50))
+    bitrate = db.Column(db.Integer)
+    canais = db.Column(db.Integer)
+    sample_rate = db.Column(db.Integer)
+    atualizado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ), onupdate=lambda: datetime.now(tz=LOCAL_TZ))
+
+    def to_info(self):
+        return {
+            'duration': self.duracao_segundos,
+            'format': self.formato,
+            'codec': self.codec,
+            'bitrate': self.bitrate,
+            'channels': self.canais,
+            'sample_rate': self.sample_rate,
+            'size_bytes': self.tamanho_bytes,
+        }
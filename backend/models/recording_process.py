@@ -0,0 +1,34 @@
+from app import db
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+LOCAL_TZ = ZoneInfo("America/Fortaleza")
+
+
+class RecordingProcess(db.Model):
+    """Processo dono de cada gravação em andamento, com heartbeat e pedido de parada."""
+
+    __tablename__ = 'gravacao_processos'
+
+    gravacao_id = db.Column(
+        db.String(36),
+        db.ForeignKey('gravacoes.id', ondelete='CASCADE'),
+        primary_key=True,
+    )
+    # host:pid do processo cujo supervisor roda o ffmpeg
+    owner = db.Column(db.String(255), nullable=False)
+    pid = db.Column(db.Integer)
+    # Parada pedida por outro processo; o dono encerra e finaliza
+    parar_solicitado = db.Column(db.Boolean, nullable=False, default=False)
+    heartbeat_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ))
+    iniciado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ))
+
+    def to_dict(self):
+        return {
+            'gravacao_id': self.gravacao_id,
+            'owner': self.owner,
+            'pid': self.pid,
+            'parar_solicitado': self.parar_solicitado,
+            'heartbeat_em': self.heartbeat_em.isoformat() if self.heartbeat_em else None,
+            'iniciado_em': self.iniciado_em.isoformat() if self.iniciado_em else None,
+        }
@@ -0,0 +1,42 @@
+from app import db
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+LOCAL_TZ = ZoneInfo("America/Fortaleza")
+
+
+class TagOccurrence(db.Model):
+    """Ocorrência de uma tag (pelo nome normalizado) numa transcrição, materializada."""
+
+    __tablename__ = 'tag_ocorrencias'
+    __table_args__ = (
+        db.Index('ix_tag_ocorrencias_chave_usuario', 'tag_key', 'user_id'),
+        db.Index('ix_tag_ocorrencias_gravacao', 'gravacao_id', 'tag_key'),
+        db.Index('ix_tag_ocorrencias_ouvido_em', 'ouvido_em'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    tag_key = db.Column(db.String(255), nullable=False)
+    gravacao_id = db.Column(
+        db.String(36),
+        db.ForeignKey('gravacoes.id', ondelete='CASCADE'),
+        nullable=False,
+    )
+    # Copiados da gravação para agregar sem join
+    user_id = db.Column(db.String(36), nullable=False)
+    radio_id = db.Column(db.String(36), nullable=False)
+    gravado_em = db.Column(db.DateTime(timezone=True))
+    offset_segundos = db.Column(db.Float)
+    exato = db.Column(db.Boolean, nullable=False, default=False)
+    quantidade = db.Column(db.Integer, nullable=False, default=1)
+    ouvido_em = db.Column(db.DateTime(timezone=True))
+
+
+class TagCloudKey(db.Model):
+    """Nomes de tag já materializados em tag_ocorrencias."""
+
+    __tablename__ = 'tag_cloud_chaves'
+
+    tag_key = db.Column(db.String(255), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, pronto
+    atualizado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ), onupdate=lambda: datetime.now(tz=LOCAL_TZ))
@@ -0,0 +1,65 @@
+from app import db
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import uuid
+
+LOCAL_TZ = ZoneInfo("America/Fortaleza")
+
+# pendente -> executando -> concluido | pendente (nova tentativa) | morto (dead-letter)
+TRANSCRIPTION_JOB_ACTIVE_STATUSES = ('pendente', 'executando')
+
+
+class TranscriptionJob(db.Model):
+    __tablename__ = 'transcricao_jobs'
+    __table_args__ = (
+        # No máximo um job ativo por gravação, mesmo com várias réplicas enfileirando
+        db.Index(
+            'ux_transcricao_jobs_ativo',
+            'gravacao_id',
+            unique=True,
+            postgresql_where=db.text("status IN ('pendente', 'executando')"),
+        ),
+        db.Index('ix_transcricao_jobs_fila', 'status', 'prioridade', 'disponivel_em'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    gravacao_id = db.Column(
+        db.String(36),
+        db.ForeignKey('gravacoes.id', ondelete='CASCADE'),
+        nullable=False,
+        index=True,
+    )
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    prioridade = db.Column(db.Integer, nullable=False, default=0)
+    force = db.Column(db.Boolean, nullable=False, default=False)
+    # Preset fixo do job (vazio = escolhido na reserva pela carga da fila)
+    preset = db.Column(db.String(30))
+    # Reprocessamento fora de pico: só substitui o texto se concluir
+    reprocessamento = db.Column(db.Boolean, nullable=False, default=False)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=3)
+    lease_owner = db.Column(db.String(255))
+    lease_expira_em = db.Column(db.DateTime(timezone=True))
+    disponivel_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ))
+    ultimo_erro = db.Column(db.String(500))
+    criado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ))
+    atualizado_em = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(tz=LOCAL_TZ), onupdate=lambda: datetime.now(tz=LOCAL_TZ))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'gravacao_id': self.gravacao_id,
+            'status': self.status,
+            'prioridade': self.prioridade,
+            'force': self.force,
+            'preset': self.preset,
+            'reprocessamento': self.reprocessamento,
+            'tentativas': self.tentativas,
+            'max_tentativas': self.max_tentativas,
+            'lease_owner': self.lease_owner,
+            'lease_expira_em': self.lease_expira_em.isoformat() if self.lease_expira_em else None,
+            'disponivel_em': self.disponivel_em.isoformat() if self.disponivel_em else None,
+            'ultimo_erro': self.ultimo_erro,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None
+        }
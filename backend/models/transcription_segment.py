@@ -0,0 +1,70 @@
+from app import db
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
+
+# Configuração de texto do Postgres usada no índice e nas consultas
+SEARCH_TEXT_CONFIG = 'portuguese'
+
+
+class TranscriptionSegment(db.Model):
+    __tablename__ = 'transcricao_segmentos'
+    __table_args__ = (
+        db.UniqueConstraint('gravacao_id', 'ordem', name='ux_transcricao_segmentos_ordem'),
+        # Busca por intervalo de tempo dentro da gravação
+        db.Index('ix_transcricao_segmentos_tempo', 'gravacao_id', 'inicio'),
+        db.Index('ix_transcricao_segmentos_busca', 'busca', postgresql_using='gin'),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    gravacao_id = db.Column(
+        db.String(36),
+        db.ForeignKey('gravacoes.id', ondelete='CASCADE'),
+        nullable=False,
+    )
+    ordem = db.Column(db.Integer, nullable=False)
+    inicio = db.Column(db.Float, nullable=False, default=0.0)
+    fim = db.Column(db.Float, nullable=False, default=0.0)
+    texto = db.Column(db.Text, nullable=False, default='')
+    # Palavras compactadas como [[inicio, fim, palavra, probabilidade], ...]; só carregadas sob demanda
+    palavras = deferred(db.Column(db.JSON))
+    # Mantido pelo próprio Postgres a partir do texto (coluna gerada)
+    busca = deferred(db.Column(
+        TSVECTOR,
+        db.Computed(f"to_tsvector('{SEARCH_TEXT_CONFIG}', coalesce(texto, ''))", persisted=True),
+    ))
+
+    def to_dict(self, include_words=True):
+        data = {
+            'id': self.id,
+            'start': self.inicio,
+            'end': self.fim,
+            'text': self.texto,
+        }
+        if include_words and self.palavras:
+            data['words'] = unpack_words(self.palavras)
+        return data
+
+
+def pack_words(words):
+    packed = []
+    for word in words or []:
+        if not isinstance(word, dict):
+            continue
+        text = str(word.get('word') or '').strip()
+        if not text:
+            continue
+        packed.append([
+            round(float(word.get('start') or 0), 3),
+            round(float(word.get('end') or 0), 3),
+            text,
+            round(float(word.get('probability') or 0), 3),
+        ])
+    return packed or None
+
+
+def unpack_words(packed):
+    return [
+        {'start': item[0], 'end': item[1], 'word': item[2], 'probability': item[3]}
+        for item in packed or []
+        if isinstance(item, (list, tuple)) and len(item) >= 4
+    ]
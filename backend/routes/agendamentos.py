@@ -10,6 +10,7 @@ from zoneinfo import ZoneInfo
 import csv
 import io
 from datetime import datetime as dt_mod
+from services.alert_service import invalidate_alert_rules
 from services.recording_service import validate_stream_url
 from services.scheduler_service import schedule_agendamento, unschedule_agendamento
 from sqlalchemy.orm import selectinload, load_only
@@ -433,6 +434,7 @@ def create_agendamento():
     
     db.session.add(agendamento)
     db.session.commit()
+    invalidate_alert_rules(user_id)
     
     # Broadcast update
     from services.websocket_service import broadcast_update
@@ -484,6 +486,7 @@ def update_agendamento(agendamento_id):
         agendamento.set_palavras_chave_list(data['palavras_chave'])
 
     db.session.commit()
+    invalidate_alert_rules(agendamento.user_id)
     
     # Broadcast update
     from services.websocket_service import broadcast_update
@@ -513,8 +516,10 @@ def delete_agendamento(agendamento_id):
     if not is_admin and not _agendamento_access_allowed(agendamento, ctx):
         return jsonify({'error': 'Agendamento not found'}), 404
     
+    owner_id = agendamento.user_id
     db.session.delete(agendamento)
     db.session.commit()
+    invalidate_alert_rules(owner_id)
 
     # Remover job agendado, se existir
     unschedule_agendamento(agendamento_id)
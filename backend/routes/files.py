@@ -57,6 +57,8 @@ def get_audio(filename):
     from app import db
     from models.radio import Radio
     from services.audio_access_service import is_audio_stream_allowed
+    from services.audio_cache_service import get_cached_audio, is_audio_cache_enabled, schedule_audio_cache_fill
+    from services.audio_location_service import get_audio_location
     from services.dropbox_service import (
         build_audio_destination,
         build_candidate_audio_paths,
@@ -92,6 +94,16 @@ def get_audio(filename):
                     download_name=os.path.basename(filename),
                 )
 
+        # Já arquivado e reproduzido antes: serve do cache local (Range incluso)
+        cached_path = get_cached_audio(filename) if is_audio_cache_enabled() else None
+        if cached_path:
+            return send_file(
+                cached_path,
+                mimetype=mimetype,
+                as_attachment=download_requested,
+                download_name=os.path.basename(filename),
+            )
+
         dropbox_cfg = get_dropbox_config()
         if not dropbox_cfg.is_ready:
             return jsonify({"error": "Arquivo não encontrado"}), 404
@@ -99,6 +111,12 @@ def get_audio(filename):
         range_header = None if download_requested else request.headers.get("Range")
         candidates = []
 
+        # Caminho registrado no upload: evita tentar cada layout possível no Dropbox
+        if gravacao:
+            location = get_audio_location(gravacao.id)
+            if location and location.dropbox_path:
+                candidates.append(location.dropbox_path)
+
         if dropbox_cfg.audio_layout == "hierarchy" and gravacao:
             radio_obj = getattr(gravacao, "radio", None) or Radio.query.get(gravacao.radio_id)
             original_names = [filename]
@@ -144,6 +162,10 @@ def get_audio(filename):
         except Exception:
             pass
 
+        # Esta requisição segue pelo proxy; o cache é preenchido em segundo
+        # plano para as próximas saírem do disco
+        schedule_audio_cache_fill(filename, unique_candidates)
+
         resp = None
         for remote_path in unique_candidates:
             resp = download_response(remote_path, range_header=range_header)
@@ -183,9 +205,28 @@ def get_audio(filename):
         return jsonify({"error": "Arquivo não encontrado"}), 404
 
 
+@bp.route("/segments/<gravacao_id>/<filename>", methods=["GET"])
+def get_segment(gravacao_id, filename):
+    from models.gravacao import Gravacao
+    from services.audio_access_service import is_audio_stream_allowed
+    from services.recording_segment_service import get_segment_filepath
+
+    # Mesma regra de reprodução do áudio completo
+    gravacao = Gravacao.query.filter(Gravacao.id == gravacao_id).first()
+    if not gravacao:
+        return jsonify({"error": "Arquivo não encontrado"}), 404
+    if not is_audio_stream_allowed(gravacao):
+        return _download_only_response(gravacao)
+
+    segment_path = get_segment_filepath(gravacao_id, filename, storage_path=current_app.config["STORAGE_PATH"])
+    if not segment_path or not os.path.exists(segment_path):
+        return jsonify({"error": "Arquivo não encontrado"}), 404
+    return send_file(segment_path, mimetype=_guess_audio_mimetype(filename))
+
+
 @bp.route("/clips/<filename>", methods=["GET"])
 def get_clip(filename):
     clip_path = os.path.join(current_app.config["STORAGE_PATH"], "clips", filename)
     if not os.path.exists(clip_path):
         return jsonify({"error": "Arquivo não encontrado"}), 404
-    return send_file(clip_path, mimetype="audio/mpeg")
+    return send_file(clip_path, mimetype=_guess_audio_mimetype(filename))
@@ -250,16 +250,7 @@ def get_gravacoes():
 
     gravacoes = gravacoes_query.offset(offset).limit(limit).all()
 
-    # Enriquecer metadados apenas quando necessário para evitar I/O pesado em listas
-    for gravacao in gravacoes:
-        needs_check = (
-            gravacao.status in ("iniciando", "gravando", "processando")
-            or (gravacao.duracao_segundos or 0) <= 0
-            or (gravacao.tamanho_mb or 0) <= 0
-        )
-        if needs_check:
-            hydrate_gravacao_metadata(gravacao, autocommit=True, check_files=True)
-
+    # Duração/tamanho/status são reconciliados em segundo plano (metadata_reconciler)
     payload = [g.to_dict(include_radio=True) for g in gravacoes]
 
     meta = {
@@ -340,9 +331,84 @@ def get_ongoing():
         load_only(*GRAVACAO_LIST_FIELDS),
         selectinload(Gravacao.radio).load_only(*RADIO_LIST_FIELDS),
     ).order_by(Gravacao.criado_em.desc()).all()
-    gravacoes = [hydrate_gravacao_metadata(g, autocommit=True, check_files=False) for g in gravacoes]
     return jsonify([g.to_dict(include_radio=True) for g in gravacoes]), 200
 
+
+@bp.route('/search', methods=['GET'])
+@token_required
+def search_gravacoes():
+    """Busca textual nas transcrições, com os trechos (início/fim) onde o termo aparece."""
+    ctx = get_user_ctx()
+    query_text = (request.args.get('q') or '').strip()
+    if not query_text:
+        return jsonify({'error': 'O parâmetro q é obrigatório'}), 400
+
+    page = _parse_positive_int(request.args.get('page'), 1)
+    per_page = min(_parse_positive_int(request.args.get('per_page'), 10), MAX_PER_PAGE)
+    hits_per_recording = min(_parse_positive_int(request.args.get('hits'), 5), 50)
+
+    data_inicio = _parse_iso_datetime(request.args.get('data_inicio'))
+    data_fim = _parse_iso_datetime(request.args.get('data_fim'))
+    data_filter = request.args.get('data')
+    if data_filter:
+        try:
+            start_date = datetime.strptime(data_filter, '%Y-%m-%d')
+            data_inicio = start_date
+            data_fim = datetime(start_date.year, start_date.month, start_date.day, 23, 59, 59)
+        except Exception:
+            pass
+    elif data_fim is not None and len(request.args.get('data_fim') or '') == 10:
+        # Só a data: inclui o dia inteiro
+        data_fim = datetime(data_fim.year, data_fim.month, data_fim.day, 23, 59, 59)
+
+    from services.transcription_search_service import search_transcriptions
+    total, results = search_transcriptions(
+        query_text,
+        user_id=ctx.get('user_id'),
+        is_admin=ctx.get('is_admin', False),
+        limit=per_page,
+        offset=(page - 1) * per_page,
+        hits_per_recording=hits_per_recording,
+        radio_id=request.args.get('radio_id'),
+        cidade=(request.args.get('cidade') or '').strip() or None,
+        estado=(request.args.get('estado') or '').strip() or None,
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+    )
+
+    gravacoes_by_id = {}
+    if results:
+        gravacoes = Gravacao.query.filter(
+            Gravacao.id.in_([item['gravacao_id'] for item in results])
+        ).options(
+            load_only(*GRAVACAO_LIST_FIELDS),
+            selectinload(Gravacao.radio).load_only(*RADIO_LIST_FIELDS),
+        ).all()
+        gravacoes_by_id = {g.id: g for g in gravacoes}
+
+    items = []
+    for item in results:
+        gravacao = gravacoes_by_id.get(item['gravacao_id'])
+        if gravacao is None:
+            continue
+        items.append({
+            'gravacao': gravacao.to_dict(include_radio=True),
+            'score': item['score'],
+            'total_hits': item['total_hits'],
+            'hits': item['hits'],
+        })
+
+    return jsonify({
+        'items': items,
+        'meta': {
+            'q': query_text,
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'total_pages': (total + per_page - 1) // per_page if total else 0,
+        },
+    }), 200
+
 @bp.route('/<gravacao_id>', methods=['GET'])
 @token_required
 def get_gravacao(gravacao_id):
@@ -354,7 +420,7 @@ def get_gravacao(gravacao_id):
         return jsonify({'error': 'Gravação não encontrada'}), 404
     if not is_admin and not _gravacao_access_allowed(gravacao, ctx):
         return jsonify({'error': 'Gravação não encontrada'}), 404
-    gravacao = hydrate_gravacao_metadata(gravacao, autocommit=True, check_files=True)
+    gravacao = hydrate_gravacao_metadata(gravacao, autocommit=True, check_files=True, update_status=False)
     return jsonify(gravacao.to_dict(include_radio=True)), 200
 
 
@@ -372,8 +438,11 @@ def gravacao_transcricao(gravacao_id):
     if request.method == 'POST':
         data = request.get_json() or {}
         force = bool(data.get('force'))
-        from services.transcription_service import start_transcription
-        start_transcription(gravacao.id, force=force)
+        from services.transcription_queue_service import has_running_transcription_job
+        from services.transcription_service import MANUAL_TRANSCRIPTION_PRIORITY, start_transcription
+        if force and has_running_transcription_job(gravacao.id):
+            return jsonify({'error': 'Transcrição em andamento; interrompa ou aguarde concluir para refazer'}), 409
+        start_transcription(gravacao.id, force=force, priority=MANUAL_TRANSCRIPTION_PRIORITY)
         try:
             db.session.refresh(gravacao)
         except Exception:
@@ -403,11 +472,43 @@ def gravacao_transcricao_segmentos(gravacao_id):
     if not is_admin and not _gravacao_access_allowed(gravacao, ctx):
         return jsonify({'error': 'Gravação não encontrada'}), 404
 
-    from services.transcription_service import get_transcription_segments
-    segments = get_transcription_segments(gravacao.id)
+    from services.transcription_segments_service import get_transcription_segments
+
+    def _seconds_arg(name):
+        value = request.args.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            return None
+
+    include_words = str(request.args.get('palavras', '1')).strip().lower() not in {'0', 'false', 'no', 'nao'}
+    segments = get_transcription_segments(
+        gravacao.id,
+        start=_seconds_arg('inicio'),
+        end=_seconds_arg('fim'),
+        include_words=include_words,
+    )
     return jsonify({'segments': segments}), 200
 
 
+@bp.route('/<gravacao_id>/segmentos-audio', methods=['GET'])
+@token_required
+def gravacao_segmentos_audio(gravacao_id):
+    ctx = get_user_ctx()
+    is_admin = ctx.get('is_admin', False)
+    gravacao = Gravacao.query.filter_by(id=gravacao_id).first()
+    if not gravacao:
+        return jsonify({'error': 'Gravação não encontrada'}), 404
+    if not is_admin and not _gravacao_access_allowed(gravacao, ctx):
+        return jsonify({'error': 'Gravação não encontrada'}), 404
+
+    from services.recording_segment_service import read_segment_manifest
+    segments = read_segment_manifest(gravacao.id)
+    return jsonify({'status': gravacao.status, 'segments': segments}), 200
+
+
 @bp.route('/<gravacao_id>/transcricao/stop', methods=['POST'])
 @token_required
 def gravacao_transcricao_stop(gravacao_id):
@@ -54,6 +54,28 @@ def stop(recording_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/status', methods=['GET'])
+@token_required
+def status():
+    ctx = get_user_ctx()
+    if not ctx.get('is_admin'):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    from services.recording_control_service import list_recording_processes
+    from services.recording_supervisor import get_supervisor_status
+    from services.stream_ingest_service import get_ingest_status
+    from services.transcription_pool import get_transcription_pool_status
+    from services.transcription_queue_service import get_transcription_queue_stats
+
+    return jsonify({
+        'recordings': get_supervisor_status(),
+        # Gravações de todos os processos (API, workers, tools/recording_worker.py)
+        'recording_processes': list_recording_processes(),
+        'ingests': get_ingest_status(),
+        'transcription_pool': get_transcription_pool_status(),
+        'transcription_queue': get_transcription_queue_stats(),
+    }), 200
+
 @bp.route('/process-ai', methods=['POST'])
 @token_required
 def process_ai():
@@ -72,10 +94,12 @@ def process_ai():
     if not gravacao:
         return jsonify({'error': 'Gravacao not found'}), 404
     
-    # Processar com IA (implementar em recording_service)
+    # Clipes gerados em segundo plano; o resultado chega via websocket (gravacao_processed)
     from services.recording_service import process_audio_with_ai
     try:
         result = process_audio_with_ai(gravacao, palavras_chave)
         return jsonify({'message': 'Processing started', 'result': result}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
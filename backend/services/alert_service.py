@@ -0,0 +1,227 @@
+import threading
+import time
+from datetime import timedelta
+
+import requests
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from config import Config
+from models.agendamento import Agendamento
+from models.keyword_alert import AlertWebhookDelivery, KeywordAlert
+from models.tag import Tag
+from services.keyword_matcher import align_words, get_keyword_matcher, match_word_start, normalize_keyword
+from services.websocket_service import broadcast_update
+
+# Regras por (user_id, radio_id): (expira_em, [(palavra, origem, origem_id)])
+_RULES_CACHE = {}
+_RULES_LOCK = threading.Lock()
+
+
+def _load_rules(user_id, radio_id):
+    """Palavras-chave dos agendamentos ativos da rádio e das tags do usuário."""
+    now = time.monotonic()
+    cache_key = (user_id, radio_id)
+    with _RULES_LOCK:
+        cached = _RULES_CACHE.get(cache_key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    rules = []
+    agendamentos = (
+        Agendamento.query
+        .filter(Agendamento.user_id == user_id)
+        .filter(Agendamento.radio_id == radio_id)
+        .filter(Agendamento.status != 'inativo')
+        .filter(Agendamento.palavras_chave.isnot(None))
+        .all()
+    )
+    for agendamento in agendamentos:
+        for palavra in agendamento.get_palavras_chave_list() or []:
+            if str(palavra or '').strip():
+                rules.append((str(palavra).strip(), 'agendamento', agendamento.id))
+    for tag_id, nome in db.session.query(Tag.id, Tag.nome).filter(Tag.user_id == user_id).all():
+        if str(nome or '').strip():
+            rules.append((" ".join(str(nome).split()), 'tag', tag_id))
+
+    ttl = max(0, int(Config.ALERT_RULES_CACHE_SECONDS or 0))
+    with _RULES_LOCK:
+        _RULES_CACHE[cache_key] = (now + ttl, rules)
+    return rules
+
+
+def invalidate_alert_rules(user_id=None):
+    with _RULES_LOCK:
+        if user_id is None:
+            _RULES_CACHE.clear()
+            return
+        for cache_key in [key for key in _RULES_CACHE if key[0] == user_id]:
+            _RULES_CACHE.pop(cache_key, None)
+
+
+def _lock_dedup_key(dedup_key):
+    """Serializa, até o commit, quem avalia a mesma palavra do mesmo usuário/rádio (web e worker)."""
+    db.session.execute(
+        db.text("SELECT pg_advisory_xact_lock(hashtext(:chave))"),
+        {'chave': 'alerta:' + ':'.join(str(part) for part in dedup_key)},
+    )
+
+
+def _already_alerted(dedup_key, gravacao_id, offset_seconds, heard_at, dedup_seconds):
+    """
+    Consulta a própria tabela de alertas (inclusive os ainda não commitados
+    desta avaliação): mesmo ponto da mesma gravação, ou outro alerta a menos
+    de ALERT_DEDUP_SECONDS, antes ou depois. Reavaliar uma gravação (fallback
+    da sessão ao vivo, retranscrição forçada) não repete alertas.
+    """
+    user_id, radio_id, palavra_normalizada = dedup_key
+    same_spot = db.and_(
+        KeywordAlert.gravacao_id == gravacao_id,
+        KeywordAlert.inicio_segundos == offset_seconds,
+    )
+    condition = same_spot
+    if heard_at is not None and dedup_seconds > 0:
+        window = timedelta(seconds=dedup_seconds)
+        condition = db.or_(
+            same_spot,
+            db.and_(KeywordAlert.ouvido_em > heard_at - window, KeywordAlert.ouvido_em < heard_at + window),
+        )
+    query = (
+        KeywordAlert.query
+        .filter(KeywordAlert.user_id == user_id)
+        .filter(KeywordAlert.radio_id == radio_id)
+        .filter(KeywordAlert.palavra_normalizada == palavra_normalizada)
+        .filter(condition)
+    )
+    return db.session.query(query.exists()).scalar()
+
+
+def evaluate_keyword_alerts(gravacao, segments):
+    """
+    Avalia só os segmentos recém-persistidos de uma gravação contra as regras
+    do dono. Erros nunca interrompem a transcrição.
+    """
+    if not Config.ALERTS_ENABLED or not gravacao or not segments:
+        return []
+    try:
+        return _evaluate_keyword_alerts(gravacao, segments)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Falha ao avaliar alertas da gravacao %s", getattr(gravacao, 'id', None))
+        return []
+
+
+def _evaluate_keyword_alerts(gravacao, segments):
+    rules = _load_rules(gravacao.user_id, gravacao.radio_id)
+    if not rules:
+        return []
+    # Agendamento tem precedência sobre tag quando a mesma palavra aparece nos dois
+    sources = {}
+    for palavra, origem, origem_id in rules:
+        sources.setdefault(palavra, (origem, origem_id))
+    matcher = get_keyword_matcher(sources.keys())
+    dedup_seconds = max(0, int(Config.ALERT_DEDUP_SECONDS or 0))
+
+    alerts = []
+    locked_keys = set()
+    for segment in segments:
+        text = (segment or {}).get('text') or ''
+        if not matcher.search(text):
+            continue
+        try:
+            segment_start = float(segment.get('start') or 0)
+        except Exception:
+            segment_start = 0.0
+        spans = align_words(text, segment.get('words'))
+        for match in matcher.find_all(text):
+            palavra = next((key for key in match.keys if sources[key][0] == 'agendamento'), match.keys[0])
+            palavra_normalizada = normalize_keyword(palavra)
+            offset_seconds = match_word_start(spans, match.start)
+            if offset_seconds is None:
+                offset_seconds = segment_start
+            heard_at = gravacao.criado_em + timedelta(seconds=offset_seconds) if gravacao.criado_em else None
+
+            dedup_key = (gravacao.user_id, gravacao.radio_id, palavra_normalizada)
+            if dedup_key not in locked_keys:
+                _lock_dedup_key(dedup_key)
+                locked_keys.add(dedup_key)
+            if _already_alerted(dedup_key, gravacao.id, offset_seconds, heard_at, dedup_seconds):
+                continue
+
+            origem, origem_id = sources[palavra]
+            alert = KeywordAlert(
+                user_id=gravacao.user_id,
+                radio_id=gravacao.radio_id,
+                gravacao_id=gravacao.id,
+                origem=origem,
+                origem_id=origem_id,
+                palavra=palavra,
+                palavra_normalizada=palavra_normalizada,
+                inicio_segundos=offset_seconds,
+                trecho=text,
+                ouvido_em=heard_at,
+            )
+            db.session.add(alert)
+            alerts.append(alert)
+
+    if not alerts:
+        if locked_keys:
+            # Solta os advisory locks
+            db.session.commit()
+        return []
+    db.session.flush()
+    if Config.ALERT_WEBHOOK_URL:
+        for alert in alerts:
+            db.session.add(AlertWebhookDelivery(alerta_id=alert.id))
+    db.session.commit()
+
+    for alert in alerts:
+        broadcast_update(f"user_{alert.user_id}", "keyword_alert", alert.to_dict())
+    return alerts
+
+
+def _claim_next_delivery():
+    delivery = (
+        AlertWebhookDelivery.query
+        .filter(AlertWebhookDelivery.status == 'pendente')
+        .filter(AlertWebhookDelivery.disponivel_em <= func.now())
+        .order_by(AlertWebhookDelivery.disponivel_em.asc(), AlertWebhookDelivery.id.asc())
+        .with_for_update(skip_locked=True, of=AlertWebhookDelivery)
+        .first()
+    )
+    if delivery is None:
+        db.session.rollback()
+    return delivery
+
+
+def deliver_alert_webhooks(limit=50):
+    """
+    Envia os alertas pendentes ao ALERT_WEBHOOK_URL. Cada entrega fica travada
+    (SKIP LOCKED) só durante o POST; falhas voltam para a fila com espera crescente.
+    """
+    url = Config.ALERT_WEBHOOK_URL
+    if not url:
+        return 0
+    timeout = max(1, int(Config.ALERT_WEBHOOK_TIMEOUT_SECONDS or 10))
+    max_attempts = max(1, int(Config.ALERT_WEBHOOK_MAX_ATTEMPTS or 5))
+    sent = 0
+    for _ in range(max(1, int(limit or 1))):
+        delivery = _claim_next_delivery()
+        if delivery is None:
+            break
+        delivery.tentativas = (delivery.tentativas or 0) + 1
+        try:
+            response = requests.post(url, json=delivery.alerta.to_dict(), timeout=timeout)
+            response.raise_for_status()
+            delivery.status = 'enviado'
+            delivery.erro = None
+            sent += 1
+        except Exception as exc:
+            delivery.erro = str(exc)[:500]
+            if delivery.tentativas >= max_attempts:
+                delivery.status = 'erro'
+            else:
+                delivery.disponivel_em = func.now() + timedelta(seconds=30 * (2 ** (delivery.tentativas - 1)))
+        db.session.commit()
+    return sent
@@ -0,0 +1,256 @@
+"""
+Cache em disco (storage/audio_cache) dos áudios já arquivados no Dropbox.
+
+O primeiro acesso segue pelo proxy com Range enquanto o arquivo inteiro é
+baixado em segundo plano; os seguintes (inclusive cada Range do player)
+saem do disco via send_file. O cache é compartilhado entre workers: quem
+cria <chave>.part primeiro (O_EXCL) baixa, os demais continuam pelo proxy
+até o arquivo final aparecer. Passando de AUDIO_CACHE_MAX_MB, os menos
+usados recentemente (mtime, atualizado a cada acerto) são removidos.
+
+Áudio que não cabe no cache (AUDIO_CACHE_MAX_FILE_MB) ou não existe em
+nenhum candidato ganha um <chave>.skip: até AUDIO_CACHE_SKIP_TTL_SECONDS,
+os Range seguintes vão só pelo proxy, sem disparar outro download.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from flask import current_app
+
+from config import Config
+
+PART_SUFFIX = ".part"
+SKIP_SUFFIX = ".skip"
+DOWNLOAD_CHUNK_SIZE = 1024 * 256
+
+_EVICT_LOCK = threading.Lock()
+_FILLING = set()
+_FILLING_LOCK = threading.Lock()
+
+
+def is_audio_cache_enabled():
+    return bool(Config.AUDIO_CACHE_ENABLED) and int(Config.AUDIO_CACHE_MAX_MB or 0) > 0
+
+
+def get_audio_cache_dir():
+    return os.path.join(Config.STORAGE_PATH, "audio_cache")
+
+
+def _cache_path(cache_name):
+    name = os.path.basename(str(cache_name or ""))
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    ext = os.path.splitext(name)[1].lower()[:10]
+    return os.path.join(get_audio_cache_dir(), f"{digest}{ext}")
+
+
+def _fetch_timeout_seconds():
+    return max(30, int(Config.AUDIO_CACHE_FETCH_TIMEOUT_SECONDS or 300))
+
+
+def _touch(path):
+    try:
+        os.utime(path, None)
+    except OSError:
+        return None
+    return path
+
+
+def get_cached_audio(cache_name):
+    """Caminho local do áudio em cache (marcando o uso para o LRU) ou None."""
+    return _touch(_cache_path(cache_name))
+
+
+def _skip_ttl_seconds():
+    return max(0, int(Config.AUDIO_CACHE_SKIP_TTL_SECONDS or 0))
+
+
+def _is_skipped(path):
+    """True se um preenchimento recente concluiu que este áudio não vai para o cache."""
+    skip_path = f"{path}{SKIP_SUFFIX}"
+    try:
+        age = time.time() - os.path.getmtime(skip_path)
+    except OSError:
+        return False
+    if age < _skip_ttl_seconds():
+        return True
+    try:
+        os.remove(skip_path)
+    except OSError:
+        pass
+    return False
+
+
+def _mark_skipped(path):
+    if _skip_ttl_seconds() <= 0:
+        return
+    try:
+        with open(f"{path}{SKIP_SUFFIX}", "wb"):
+            pass
+    except OSError:
+        pass
+
+
+def _claim(part_path):
+    """True se este processo ficou responsável pelo download."""
+    for _ in range(2):
+        try:
+            fd = os.open(part_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            os.close(fd)
+            return True
+        except FileExistsError:
+            try:
+                stale = time.time() - os.path.getmtime(part_path) > _fetch_timeout_seconds()
+            except OSError:
+                continue
+            if not stale:
+                return False
+            # Download abandonado (worker morto): assume o lugar dele
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+    return False
+
+
+def _download_first_available(remote_paths, part_path):
+    """
+    Baixa o primeiro candidato existente para part_path. Retorna "ok", "skip"
+    (nenhum candidato existe ou o arquivo passa de AUDIO_CACHE_MAX_FILE_MB)
+    ou "erro" (falha transitória, vale tentar de novo).
+    """
+    from services.dropbox_service import download_response
+
+    max_file_bytes = int(Config.AUDIO_CACHE_MAX_FILE_MB or 0) * 1024 * 1024
+    for remote_path in remote_paths:
+        resp = download_response(remote_path)
+        try:
+            if resp.status_code in (404, 409):
+                continue
+            if not resp.ok:
+                return "erro"
+            length = int(resp.headers.get("Content-Length") or 0)
+            # Arquivos enormes seguem pelo proxy com Range, sem ocupar o cache
+            if max_file_bytes and length > max_file_bytes:
+                return "skip"
+            with open(part_path, "wb") as fp:
+                for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if chunk:
+                        fp.write(chunk)
+            return "ok"
+        finally:
+            resp.close()
+    return "skip"
+
+
+def schedule_audio_cache_fill(cache_name, remote_paths, app_obj=None):
+    """
+    Preenche o cache em segundo plano; a requisição que encontrou o cache
+    vazio segue pelo proxy sem esperar o download completo.
+    """
+    if not is_audio_cache_enabled() or not remote_paths:
+        return False
+    if app_obj is None:
+        app_obj = current_app._get_current_object()
+    name = os.path.basename(str(cache_name or ""))
+    if _is_skipped(_cache_path(name)):
+        return False
+    with _FILLING_LOCK:
+        if name in _FILLING:
+            return False
+        _FILLING.add(name)
+    threading.Thread(
+        target=_fill_in_background,
+        args=(app_obj, name, list(remote_paths)),
+        daemon=True,
+    ).start()
+    return True
+
+
+def _fill_in_background(app_obj, cache_name, remote_paths):
+    try:
+        with app_obj.app_context():
+            fill_audio_cache(cache_name, remote_paths)
+    except Exception:
+        pass
+    finally:
+        with _FILLING_LOCK:
+            _FILLING.discard(cache_name)
+
+
+def fill_audio_cache(cache_name, remote_paths):
+    """
+    Garante o áudio no cache baixando do Dropbox (primeiro candidato que
+    existir). Retorna o caminho local ou None (não encontrado, grande demais,
+    falha ou download já em andamento em outro worker).
+    """
+    if not is_audio_cache_enabled() or not remote_paths:
+        return None
+    path = _cache_path(cache_name)
+    part_path = f"{path}{PART_SUFFIX}"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if not _claim(part_path):
+        return None
+
+    try:
+        # Outro worker pode ter terminado entre a consulta e a reserva
+        if os.path.exists(path):
+            return _touch(path)
+        result = _download_first_available(remote_paths, part_path)
+        if result != "ok":
+            if result == "skip":
+                _mark_skipped(path)
+            return None
+        os.replace(part_path, path)
+    except Exception as exc:
+        current_app.logger.warning("Falha ao preencher cache de audio %s: %s", cache_name, exc)
+        return None
+    finally:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+
+    evict_audio_cache(keep=path)
+    return path
+
+
+def evict_audio_cache(keep=None):
+    """Remove os arquivos usados há mais tempo até caber em AUDIO_CACHE_MAX_MB."""
+    max_bytes = int(Config.AUDIO_CACHE_MAX_MB or 0) * 1024 * 1024
+    cache_dir = get_audio_cache_dir()
+    if max_bytes <= 0 or not os.path.isdir(cache_dir):
+        return 0
+    with _EVICT_LOCK:
+        entries = []
+        total = 0
+        with os.scandir(cache_dir) as items:
+            for entry in items:
+                if entry.name.endswith(SKIP_SUFFIX):
+                    # Marcadores vencidos saem junto com a limpeza
+                    _is_skipped(entry.path[: -len(SKIP_SUFFIX)])
+                    continue
+                if entry.name.endswith(PART_SUFFIX) or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
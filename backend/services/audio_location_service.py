@@ -0,0 +1,186 @@
+"""
+Índice de localização do áudio das gravações (audio_localizacoes).
+
+Guarda, por gravação, o nome do arquivo em storage/audio, o caminho no
+Dropbox e se existe o marcador .dropbox. É mantido na escrita (início da
+gravação), no upload e na remoção local; resolve_audio_filepath consulta o
+índice em vez de listar o diretório inteiro. tools/reindex_audio_locations.py
+reconstrói tudo a partir do disco quando houver divergência.
+"""
+
+import os
+from types import SimpleNamespace
+
+from flask import has_app_context
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import db
+from config import Config
+from models.audio_location import AudioLocation
+from models.gravacao import Gravacao
+from services.audio_storage_service import extract_audio_filename, get_audio_storage_dir
+
+REINDEX_BATCH = 500
+
+_UNSET = object()
+
+
+def get_audio_location(gravacao_id):
+    if not gravacao_id or not has_app_context():
+        return None
+    try:
+        # Sessão própria: uma falha aqui não pode desfazer a sessão de quem chamou
+        with Session(db.engine) as session:
+            return session.get(AudioLocation, gravacao_id)
+    except Exception:
+        return None
+
+
+def _upsert(values, update_columns):
+    statement = pg_insert(AudioLocation.__table__).values(values)
+    set_ = {column: statement.excluded[column] for column in update_columns}
+    set_["atualizado_em"] = func.now()
+    statement = statement.on_conflict_do_update(
+        index_elements=[AudioLocation.__table__.c.gravacao_id],
+        set_=set_,
+    )
+    # Transação própria: não pode commitar alterações pendentes da sessão de quem chamou
+    with db.engine.begin() as connection:
+        connection.execute(statement)
+
+
+def record_audio_location(gravacao_id, *, filename=_UNSET, dropbox_path=_UNSET, marker=_UNSET):
+    """
+    Atualiza só os campos informados; filename=None indica que não há mais
+    cópia local. Falhas não interrompem quem chamou.
+    """
+    if not gravacao_id or not has_app_context():
+        return
+    values = {"gravacao_id": gravacao_id, "marcador": False}
+    update_columns = []
+    if filename is not _UNSET:
+        values["arquivo_local"] = os.path.basename(filename) if filename else None
+        update_columns.append("arquivo_local")
+    if dropbox_path is not _UNSET:
+        values["dropbox_path"] = str(dropbox_path or "").strip() or None
+        update_columns.append("dropbox_path")
+    if marker is not _UNSET:
+        values["marcador"] = bool(marker)
+        update_columns.append("marcador")
+    if not update_columns:
+        return
+    try:
+        _upsert([values], update_columns)
+    except Exception:
+        pass
+
+
+def forget_local_audio(gravacao_id):
+    """Arquivo local (e marcador) removidos; o caminho no Dropbox continua valendo."""
+    record_audio_location(gravacao_id, filename=None, marker=False)
+
+
+def lookup_local_audio(gravacao_id, *, storage_path=None):
+    """
+    (conhecido, caminho): conhecido=False quando a gravação ainda não está no
+    índice; caminho é None quando o índice diz que não há cópia local.
+    """
+    location = get_audio_location(gravacao_id)
+    if location is None:
+        return False, None
+    if not location.arquivo_local:
+        return True, None
+    return True, os.path.join(get_audio_storage_dir(storage_path=storage_path), location.arquivo_local)
+
+
+def _scan_audio_dir(audio_dir):
+    """
+    Uma única listagem: nomes dos arquivos, {gravacao_id: nome mais recente}
+    e {nome: caminho no Dropbox} dos marcadores.
+    """
+    from services.dropbox_service import get_audio_id_from_filename
+
+    files = set()
+    newest = {}
+    markers = {}
+    if not os.path.isdir(audio_dir):
+        return files, newest, markers
+    with os.scandir(audio_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name or name.startswith("."):
+                continue
+            if name.endswith(".dropbox"):
+                try:
+                    with open(entry.path, "r", encoding="utf-8") as fp:
+                        markers[name[: -len(".dropbox")]] = str(fp.read() or "").strip() or None
+                except Exception:
+                    markers[name[: -len(".dropbox")]] = None
+                continue
+            if not entry.is_file():
+                continue
+            files.add(name)
+            gravacao_id = get_audio_id_from_filename(name)
+            if not gravacao_id:
+                continue
+            mtime = entry.stat().st_mtime
+            current = newest.get(gravacao_id)
+            if current is None or mtime > current[1]:
+                newest[gravacao_id] = (name, mtime)
+    return files, {key: value[0] for key, value in newest.items()}, markers
+
+
+def reindex_audio_locations(*, storage_path=None, dry_run=False):
+    """
+    Reconstrói o índice a partir de storage/audio (uma listagem do diretório
+    para todas as gravações). Caminhos do Dropbox já conhecidos são mantidos
+    quando não há marcador local para substituí-los.
+    """
+    audio_dir = get_audio_storage_dir(storage_path=storage_path or Config.STORAGE_PATH)
+    files, newest, markers = _scan_audio_dir(audio_dir)
+    stats = {"gravacoes": 0, "locais": 0, "marcadores": 0, "sem_arquivo": 0}
+
+    # Lido de uma vez: os commits por lote fechariam um cursor aberto
+    rows = db.session.query(Gravacao.id, Gravacao.arquivo_nome, Gravacao.arquivo_url).order_by(Gravacao.id).all()
+    batch = []
+    for gravacao_id, arquivo_nome, arquivo_url in rows:
+        expected = extract_audio_filename(SimpleNamespace(arquivo_nome=arquivo_nome, arquivo_url=arquivo_url))
+        if expected and expected in files:
+            local_name = expected
+        else:
+            local_name = newest.get(gravacao_id)
+        has_marker = bool(local_name) and local_name in markers
+        stats["gravacoes"] += 1
+        stats["locais"] += 1 if local_name else 0
+        stats["marcadores"] += 1 if has_marker else 0
+        stats["sem_arquivo"] += 0 if local_name else 1
+        batch.append({
+            "gravacao_id": gravacao_id,
+            "arquivo_local": local_name,
+            "dropbox_path": markers.get(local_name) if has_marker else None,
+            "marcador": has_marker,
+        })
+        if len(batch) >= REINDEX_BATCH:
+            _flush_reindex_batch(batch, dry_run)
+            batch = []
+    _flush_reindex_batch(batch, dry_run)
+    return stats
+
+
+def _flush_reindex_batch(batch, dry_run):
+    if not batch or dry_run:
+        return
+    statement = pg_insert(AudioLocation.__table__).values(batch)
+    statement = statement.on_conflict_do_update(
+        index_elements=[AudioLocation.__table__.c.gravacao_id],
+        set_={
+            "arquivo_local": statement.excluded.arquivo_local,
+            "marcador": statement.excluded.marcador,
+            "dropbox_path": func.coalesce(statement.excluded.dropbox_path, AudioLocation.__table__.c.dropbox_path),
+            "atualizado_em": func.now(),
+        },
+    )
+    db.session.execute(statement)
+    db.session.commit()
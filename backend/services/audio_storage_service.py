@@ -24,17 +24,7 @@ def build_audio_filepath(filename, *, storage_path=None):
     return os.path.join(get_audio_storage_dir(storage_path=storage_path), normalized)
 
 
-def resolve_audio_filepath(gravacao, *, storage_path=None):
-    filename = extract_audio_filename(gravacao)
-    filepath = build_audio_filepath(filename, storage_path=storage_path)
-    if filepath and os.path.exists(filepath):
-        return filepath
-
-    gravacao_id = getattr(gravacao, "id", None)
-    audio_dir = get_audio_storage_dir(storage_path=storage_path)
-    if not gravacao_id or not os.path.isdir(audio_dir):
-        return filepath
-
+def _scan_audio_candidates(gravacao_id, audio_dir):
     try:
         candidates = []
         for name in os.listdir(audio_dir):
@@ -47,11 +37,35 @@ def resolve_audio_filepath(gravacao, *, storage_path=None):
                 candidates.append(candidate_path)
     except Exception:
         candidates = []
+    candidates.sort(key=os.path.getmtime, reverse=True)
+    return candidates
 
-    if not candidates:
+
+def resolve_audio_filepath(gravacao, *, storage_path=None):
+    filename = extract_audio_filename(gravacao)
+    filepath = build_audio_filepath(filename, storage_path=storage_path)
+    if filepath and os.path.exists(filepath):
         return filepath
 
-    candidates.sort(key=os.path.getmtime, reverse=True)
+    gravacao_id = getattr(gravacao, "id", None)
+    audio_dir = get_audio_storage_dir(storage_path=storage_path)
+    if not gravacao_id or not os.path.isdir(audio_dir):
+        return filepath
+
+    # O índice (audio_localizacoes) evita listar storage/audio inteiro a cada chamada
+    from services.audio_location_service import lookup_local_audio, record_audio_location
+
+    known, indexed_path = lookup_local_audio(gravacao_id, storage_path=storage_path)
+    if known:
+        if indexed_path and os.path.exists(indexed_path):
+            return indexed_path
+        return filepath
+
+    # Gravação ainda fora do índice: varre uma vez e registra o resultado
+    candidates = _scan_audio_candidates(gravacao_id, audio_dir)
+    record_audio_location(gravacao_id, filename=candidates[0] if candidates else None)
+    if not candidates:
+        return filepath
     return candidates[0]
 
 
@@ -0,0 +1,241 @@
+import math
+import os
+import subprocess
+import threading
+
+from flask import current_app
+
+from app import db
+from config import Config
+from models.clip import Clip
+from models.gravacao import Gravacao
+from services.audio_storage_service import resolve_audio_filepath
+from services.keyword_matcher import align_words, get_keyword_matcher, match_word_end, match_word_start
+from services.transcription_segments_service import get_transcription_segments, load_segment_words
+from services.websocket_service import broadcast_update
+
+# Pedidos pendentes por gravação: {gravacao_id: {palavras}}; o worker drena tudo de uma vez
+_PENDING = {}
+_PENDING_LOCK = threading.Lock()
+_PENDING_EVENT = threading.Event()
+_WORKER = None
+
+
+def _safe_session_remove():
+    try:
+        db.session.remove()
+    except Exception:
+        pass
+
+
+def _clips_dir():
+    path = os.path.join(Config.STORAGE_PATH, "clips")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def find_keyword_hits(gravacao_id, keywords):
+    """
+    [(palavra, inicio, fim)] em segundos para cada ocorrência das palavras-chave,
+    usando o horário das palavras do Whisper (ou do segmento, se não alinhar).
+    """
+    matcher = get_keyword_matcher(keywords)
+    if not matcher:
+        return []
+    segments = [
+        segment for segment in get_transcription_segments(gravacao_id, include_words=False)
+        if matcher.search(segment.get("text") or "")
+    ]
+    words_by_segment = load_segment_words([segment.get("id") for segment in segments])
+    hits = []
+    for segment in segments:
+        text = segment.get("text") or ""
+        segment_start = float(segment.get("start") or 0)
+        segment_end = float(segment.get("end") or segment_start)
+        spans = align_words(text, words_by_segment.get(segment.get("id")))
+        for match in matcher.find_all(text):
+            start = match_word_start(spans, match.start)
+            end = match_word_end(spans, match.end - 1)
+            if start is None:
+                start = segment_start
+            if end is None or end < start:
+                end = max(start, segment_end)
+            for keyword in match.keys:
+                hits.append((keyword, start, end))
+    return hits
+
+
+def merge_keyword_hits(hits, *, duration_seconds=None):
+    """
+    Junta ocorrências próximas da mesma palavra num único clipe:
+    [(palavra, inicio, fim)] com pré/pós-rolagem aplicadas e limitadas à duração.
+    """
+    pre_roll = max(0.0, float(Config.CLIP_PRE_ROLL_SECONDS or 0))
+    post_roll = max(0.0, float(Config.CLIP_POST_ROLL_SECONDS or 0))
+    merge_gap = max(0.0, float(Config.CLIP_MERGE_GAP_SECONDS or 0))
+    max_seconds = max(1.0, float(Config.CLIP_MAX_SECONDS or 120))
+
+    by_keyword = {}
+    for keyword, start, end in hits:
+        window_start = max(0.0, start - pre_roll)
+        window_end = end + post_roll
+        if duration_seconds:
+            window_end = min(float(duration_seconds), window_end)
+        if window_end <= window_start:
+            continue
+        by_keyword.setdefault(keyword, []).append((window_start, window_end))
+
+    merged = []
+    for keyword, windows in by_keyword.items():
+        windows.sort()
+        current_start, current_end = windows[0]
+        for window_start, window_end in windows[1:]:
+            joined_end = max(current_end, window_end)
+            if window_start - current_end <= merge_gap and joined_end - current_start <= max_seconds:
+                current_end = joined_end
+                continue
+            merged.append((keyword, current_start, current_end))
+            current_start, current_end = window_start, window_end
+        merged.append((keyword, current_start, current_end))
+    merged.sort(key=lambda item: (item[1], item[0]))
+    return merged
+
+
+def _build_cut_cmd(source_path, cuts):
+    """Um ffmpeg, várias saídas: cada corte copia os pacotes do trecho (sem recodificar)."""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-y", "-i", source_path]
+    for start, end, output_path in cuts:
+        cmd += [
+            "-map", "0:a:0",
+            "-ss", f"{start:.3f}",
+            "-to", f"{end:.3f}",
+            "-c", "copy",
+            output_path,
+        ]
+    return cmd
+
+
+def cut_clips(source_path, cuts):
+    """cuts: [(inicio, fim, caminho_saida)]. Retorna os caminhos gerados."""
+    batch_size = max(1, int(Config.CLIP_FFMPEG_BATCH or 20))
+    created = []
+    for index in range(0, len(cuts), batch_size):
+        batch = cuts[index:index + batch_size]
+        try:
+            result = subprocess.run(
+                _build_cut_cmd(source_path, batch),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=max(60, 30 * len(batch)),
+            )
+        except Exception as exc:
+            current_app.logger.warning("Falha ao cortar clipes de %s: %s", source_path, exc)
+            continue
+        if result.returncode != 0:
+            current_app.logger.warning(
+                "ffmpeg falhou ao cortar clipes de %s: %s",
+                source_path,
+                (result.stderr or b"").decode("utf-8", "ignore")[-500:],
+            )
+        created.extend(path for _, _, path in batch if os.path.exists(path) and os.path.getsize(path) > 0)
+    return created
+
+
+def _remove_previous_clips(gravacao_id, keywords):
+    clips_dir = _clips_dir()
+    previous = Clip.query.filter(Clip.gravacao_id == gravacao_id, Clip.palavra_chave.in_(list(keywords))).all()
+    for clip in previous:
+        filename = (clip.arquivo_url or "").rsplit("/", 1)[-1]
+        if filename:
+            try:
+                os.remove(os.path.join(clips_dir, filename))
+            except OSError:
+                pass
+        db.session.delete(clip)
+
+
+def extract_keyword_clips(gravacao_id, keywords):
+    """Gera (ou regenera) os clipes das palavras-chave de uma gravação."""
+    gravacao = Gravacao.query.get(gravacao_id)
+    if gravacao is None:
+        return []
+    keywords = sorted({str(keyword).strip() for keyword in keywords or [] if str(keyword or "").strip()})
+    if not keywords:
+        return []
+    source_path = resolve_audio_filepath(gravacao)
+    if not source_path or not os.path.exists(source_path):
+        current_app.logger.warning("Clipes: audio local indisponivel para gravacao %s", gravacao_id)
+        return []
+
+    windows = merge_keyword_hits(
+        find_keyword_hits(gravacao_id, keywords),
+        duration_seconds=gravacao.duracao_segundos,
+    )
+    ext = os.path.splitext(source_path)[1] or ".mp3"
+    clips_dir = _clips_dir()
+
+    _remove_previous_clips(gravacao_id, keywords)
+    pending = []
+    for keyword, start, end in windows:
+        clip = Clip(
+            gravacao_id=gravacao_id,
+            palavra_chave=keyword,
+            inicio_segundos=int(math.floor(start)),
+            fim_segundos=int(math.ceil(end)),
+        )
+        db.session.add(clip)
+        db.session.flush()
+        filename = f"{gravacao_id}_{clip.id}{ext}"
+        pending.append((clip, start, end, os.path.join(clips_dir, filename)))
+
+    created = set(cut_clips(source_path, [(start, end, path) for _, start, end, path in pending]))
+    clips = []
+    for clip, _, _, path in pending:
+        if path in created:
+            clip.arquivo_url = f"/api/files/clips/{os.path.basename(path)}"
+            clips.append(clip)
+        else:
+            db.session.delete(clip)
+    db.session.commit()
+
+    broadcast_update(f"user_{gravacao.user_id}", "gravacao_processed", {
+        "gravacao": gravacao.to_dict(),
+        "clips": [clip.to_dict() for clip in clips],
+    })
+    return clips
+
+
+def _clip_worker_loop(app_obj):
+    while True:
+        _PENDING_EVENT.wait()
+        with _PENDING_LOCK:
+            batch = dict(_PENDING)
+            _PENDING.clear()
+            _PENDING_EVENT.clear()
+        for gravacao_id, keywords in batch.items():
+            with app_obj.app_context():
+                try:
+                    clips = extract_keyword_clips(gravacao_id, keywords)
+                    current_app.logger.info("Clipes: %s gerados para gravacao %s", len(clips), gravacao_id)
+                except Exception:
+                    db.session.rollback()
+                    current_app.logger.exception("Falha ao gerar clipes da gravacao %s", gravacao_id)
+                finally:
+                    _safe_session_remove()
+
+
+def enqueue_clip_extraction(gravacao_id, keywords, app_obj=None):
+    """Agenda a geração em segundo plano; pedidos da mesma gravação são agrupados."""
+    global _WORKER
+    keywords = {str(keyword).strip() for keyword in keywords or [] if str(keyword or "").strip()}
+    if not keywords:
+        return 0
+    if app_obj is None:
+        app_obj = current_app._get_current_object()
+    with _PENDING_LOCK:
+        _PENDING.setdefault(gravacao_id, set()).update(keywords)
+        if _WORKER is None or not _WORKER.is_alive():
+            _WORKER = threading.Thread(target=_clip_worker_loop, args=(app_obj,), name="clip-worker", daemon=True)
+            _WORKER.start()
+        _PENDING_EVENT.set()
+    return len(keywords)
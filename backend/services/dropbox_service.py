@@ -1,9 +1,12 @@
 import json
+import mmap
 import os
 import posixpath
 import re
 import time
 import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from threading import Lock
@@ -12,6 +15,8 @@ from urllib.parse import unquote, urlparse
 from zoneinfo import ZoneInfo
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 DROPBOX_API_BASE = "https://api.dropboxapi.com/2"
@@ -20,12 +25,27 @@ DROPBOX_OAUTH_TOKEN_URL = "https://api.dropboxapi.com/oauth2/token"
 
 MAX_SIMPLE_UPLOAD_BYTES = 150 * 1024 * 1024
 DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# Sessões concorrentes: blocos múltiplos de 4 MiB (exceto o último)
+CONCURRENT_CHUNK_ALIGN = 4 * 1024 * 1024
+# Acima disso o arquivo sobe em blocos paralelos em vez de um único POST
+CONCURRENT_UPLOAD_MIN_BYTES = 32 * 1024 * 1024
+MAX_FINISH_BATCH_ENTRIES = 1000
 TOKEN_EXPIRY_SKEW_SECONDS = 60
 LOCAL_TZ = ZoneInfo("America/Fortaleza")
 
 _TOKEN_CACHE = {}
 _TOKEN_CACHE_LOCK = Lock()
 
+# Uma Session (pool keep-alive) por host do Dropbox, compartilhada entre threads
+_HTTP_SESSIONS = {}
+_HTTP_SESSIONS_LOCK = Lock()
+
+# Pastas remotas sabidamente existentes (path_lower -> expira_em), para não
+# repetir create_folder a cada upload no mesmo radio/data
+KNOWN_FOLDER_CACHE_SIZE = 4096
+_KNOWN_FOLDERS = OrderedDict()
+_KNOWN_FOLDERS_LOCK = Lock()
+
 
 @dataclass(frozen=True)
 class DropboxConfig:
@@ -49,6 +69,14 @@ class DropboxError(RuntimeError):
     pass
 
 
+class DropboxRateLimitError(DropboxError):
+    """429/503 do Dropbox; retry_after em segundos (header Retry-After ou corpo do erro)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 def _as_bool(value, default: bool = False) -> bool:
     if value is None:
         return default
@@ -368,7 +396,8 @@ def _refresh_access_token(cfg: DropboxConfig) -> str:
     if cfg.app_secret:
         data["client_secret"] = cfg.app_secret
 
-    resp = requests.post(
+    resp = _http_request(
+        "POST",
         DROPBOX_OAUTH_TOKEN_URL,
         data=data,
         timeout=(10, 30),
@@ -406,16 +435,75 @@ def get_access_token(*, token: Optional[str] = None, force_refresh: bool = False
     )
 
 
+def _get_int_setting(name: str, default: int) -> int:
+    try:
+        from flask import current_app
+
+        value = (getattr(current_app, "config", {}) or {}).get(name)
+    except Exception:
+        value = None
+    if value is None:
+        value = os.getenv(name)
+    try:
+        return int(value) if value not in (None, "") else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _get_http_pool_size() -> int:
+    configured = _get_int_setting("DROPBOX_HTTP_POOL_SIZE", 0)
+    if configured > 0:
+        return configured
+    # Workers de envio + downloads simultâneos de reprodução
+    return max(10, _get_int_setting("DROPBOX_UPLOAD_WORKERS", 2) * 2 + 8)
+
+
+def _build_http_session() -> requests.Session:
+    pool_size = _get_http_pool_size()
+    # Só falhas de conexão são repetidas: o corpo ainda não foi enviado, então
+    # vale até para uploads com arquivo em stream. 429/5xx ficam com quem chamou.
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=0.3,
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _get_http_session(url: str) -> requests.Session:
+    host = urlparse(url).netloc
+    with _HTTP_SESSIONS_LOCK:
+        session = _HTTP_SESSIONS.get(host)
+        if session is None:
+            session = _build_http_session()
+            _HTTP_SESSIONS[host] = session
+        return session
+
+
+def _http_request(method: str, url: str, **kwargs) -> requests.Response:
+    return _get_http_session(url).request(method, url, **kwargs)
+
+
 def _dropbox_request(method: str, url: str, *, token: Optional[str] = None, timeout=(10, 30), **kwargs):
     resolved_token = get_access_token(token=token)
     headers = dict(kwargs.pop("headers", {}) or {})
     headers["Authorization"] = f"Bearer {resolved_token}"
-    resp = requests.request(method, url, headers=headers, timeout=timeout, **kwargs)
+    resp = _http_request(method, url, headers=headers, timeout=timeout, **kwargs)
     if resp.status_code == 401 and token is None:
         refreshed_token = get_access_token(force_refresh=True)
         if refreshed_token != resolved_token:
+            resp.close()
             headers["Authorization"] = f"Bearer {refreshed_token}"
-            resp = requests.request(method, url, headers=headers, timeout=timeout, **kwargs)
+            resp = _http_request(method, url, headers=headers, timeout=timeout, **kwargs)
     return resp
 
 
@@ -498,6 +586,17 @@ def _headers(token: str, api_arg: dict, *, content: bool) -> dict:
     }
 
 
+def _get_retry_after(resp: requests.Response, detail) -> Optional[float]:
+    raw = resp.headers.get("Retry-After")
+    error = detail.get("error") if isinstance(detail, dict) else None
+    if raw is None and isinstance(error, dict):
+        raw = error.get("retry_after")
+    try:
+        return max(0.0, float(raw)) if raw is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
 def _raise_for_response(resp: requests.Response, *, action: str) -> None:
     if resp.ok:
         return
@@ -505,7 +604,10 @@ def _raise_for_response(resp: requests.Response, *, action: str) -> None:
         detail = resp.json()
     except Exception:
         detail = resp.text
-    raise DropboxError(f"Erro do Dropbox na operacao '{action}' (status={resp.status_code}): {detail}")
+    message = f"Erro do Dropbox na operacao '{action}' (status={resp.status_code}): {detail}"
+    if resp.status_code == 429 or (resp.status_code == 503 and "Retry-After" in resp.headers):
+        raise DropboxRateLimitError(message, retry_after=_get_retry_after(resp, detail))
+    raise DropboxError(message)
 
 
 def upload_file(
@@ -525,13 +627,33 @@ def upload_file(
         _ensure_folder(remote_dir, token=resolved_token)
 
     size = os.path.getsize(local_path)
-    if size <= MAX_SIMPLE_UPLOAD_BYTES:
-        return _upload_simple(local_path, remote_path, token=resolved_token, timeout=timeout)
-    return _upload_session(local_path, remote_path, token=resolved_token, timeout=timeout, chunk_size=chunk_size)
+    concurrency = _get_int_setting("DROPBOX_UPLOAD_CHUNK_CONCURRENCY", 4)
+    try:
+        if concurrency > 1 and size > CONCURRENT_UPLOAD_MIN_BYTES:
+            return _upload_session_concurrent(
+                local_path,
+                remote_path,
+                token=resolved_token,
+                timeout=timeout,
+                chunk_size=chunk_size,
+                concurrency=concurrency,
+            )
+        if size <= MAX_SIMPLE_UPLOAD_BYTES:
+            return _upload_simple(local_path, remote_path, token=resolved_token, timeout=timeout)
+        return _upload_session(local_path, remote_path, token=resolved_token, timeout=timeout, chunk_size=chunk_size)
+    except DropboxError as exc:
+        # Pasta pode ter sido removida/movida fora daqui: próxima tentativa recria
+        if _is_path_error(exc):
+            forget_folder(remote_dir)
+        raise
+
+
+def _commit_info(remote_path: str) -> dict:
+    return {"path": remote_path, "mode": "overwrite", "autorename": False, "mute": True, "strict_conflict": False}
 
 
 def _upload_simple(local_path: str, remote_path: str, *, token: str, timeout: Tuple[int, int]) -> dict:
-    api_arg = {"path": remote_path, "mode": "overwrite", "autorename": False, "mute": True, "strict_conflict": False}
+    api_arg = _commit_info(remote_path)
     with open(local_path, "rb") as fp:
         resp = _dropbox_request(
             "POST",
@@ -553,7 +675,7 @@ def _upload_session(
     timeout: Tuple[int, int],
     chunk_size: int,
 ) -> dict:
-    commit = {"path": remote_path, "mode": "overwrite", "autorename": False, "mute": True, "strict_conflict": False}
+    commit = _commit_info(remote_path)
     file_size = os.path.getsize(local_path)
 
     with open(local_path, "rb") as fp:
@@ -628,6 +750,153 @@ def _upload_session(
         return finish_resp.json()
 
 
+def _upload_session_concurrent(
+    local_path: str,
+    remote_path: str,
+    *,
+    token: str,
+    timeout: Tuple[int, int],
+    chunk_size: int,
+    concurrency: int,
+) -> dict:
+    """
+    Sessão concorrente do Dropbox: os blocos (lidos de um mmap do arquivo)
+    sobem em paralelo, cada um com o próprio offset; o último fecha a sessão.
+    """
+    chunk_size = max(CONCURRENT_CHUNK_ALIGN, chunk_size // CONCURRENT_CHUNK_ALIGN * CONCURRENT_CHUNK_ALIGN)
+    file_size = os.path.getsize(local_path)
+    if file_size <= 0:
+        raise DropboxError(f"Arquivo vazio: {local_path}")
+
+    start_resp = _dropbox_request(
+        "POST",
+        f"{DROPBOX_CONTENT_BASE}/files/upload_session/start",
+        token=token,
+        headers=_headers(token, {"close": False, "session_type": "concurrent"}, content=True),
+        data=b"",
+        timeout=timeout,
+    )
+    _raise_for_response(start_resp, action="upload_session/start")
+    session_id = start_resp.json().get("session_id")
+    if not session_id:
+        raise DropboxError("Dropbox nao retornou session_id")
+
+    offsets = list(range(0, file_size, chunk_size))
+    with open(local_path, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+
+        def _append(offset: int) -> None:
+            end = min(offset + chunk_size, file_size)
+            resp = _dropbox_request(
+                "POST",
+                f"{DROPBOX_CONTENT_BASE}/files/upload_session/append_v2",
+                token=token,
+                headers=_headers(
+                    token,
+                    {"cursor": {"session_id": session_id, "offset": offset}, "close": end >= file_size},
+                    content=True,
+                ),
+                data=mapped[offset:end],
+                timeout=timeout,
+            )
+            _raise_for_response(resp, action="upload_session/append_v2")
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(concurrency, len(offsets))),
+            thread_name_prefix="dropbox-chunk",
+        ) as executor:
+            # list() propaga a primeira falha
+            list(executor.map(_append, offsets))
+
+    finish_resp = _dropbox_request(
+        "POST",
+        f"{DROPBOX_CONTENT_BASE}/files/upload_session/finish",
+        token=token,
+        headers=_headers(
+            token,
+            {"cursor": {"session_id": session_id, "offset": file_size}, "commit": _commit_info(remote_path)},
+            content=True,
+        ),
+        data=b"",
+        timeout=timeout,
+    )
+    _raise_for_response(finish_resp, action="upload_session/finish")
+    return finish_resp.json()
+
+
+def upload_files_batch(
+    items,
+    *,
+    token: Optional[str] = None,
+    timeout: Tuple[int, int] = (10, 300),
+) -> list:
+    """
+    Envia vários arquivos pequenos e confirma todos num único
+    upload_session/finish_batch_v2. items: [(local_path, remote_path)].
+    Retorna, na mesma ordem, o metadata de cada arquivo ou a DropboxError dele.
+    """
+    resolved_token = get_access_token(token=token)
+    results = [None] * len(items)
+    pending = []
+    for index, (local_path, remote_path) in enumerate(items):
+        try:
+            if not local_path or not os.path.exists(local_path):
+                raise DropboxError(f"Arquivo local nao encontrado: {local_path}")
+            if os.path.getsize(local_path) > MAX_SIMPLE_UPLOAD_BYTES:
+                results[index] = upload_file(local_path, remote_path, token=resolved_token, timeout=timeout)
+                continue
+            remote_dir = posixpath.dirname(remote_path or "")
+            if remote_dir and remote_dir != "/":
+                _ensure_folder(remote_dir, token=resolved_token)
+            with open(local_path, "rb") as fp:
+                start_resp = _dropbox_request(
+                    "POST",
+                    f"{DROPBOX_CONTENT_BASE}/files/upload_session/start",
+                    token=resolved_token,
+                    headers=_headers(resolved_token, {"close": True}, content=True),
+                    data=fp,
+                    timeout=timeout,
+                )
+            _raise_for_response(start_resp, action="upload_session/start")
+            session_id = start_resp.json().get("session_id")
+            if not session_id:
+                raise DropboxError("Dropbox nao retornou session_id")
+            pending.append((index, {
+                "cursor": {"session_id": session_id, "offset": os.path.getsize(local_path)},
+                "commit": _commit_info(remote_path),
+            }))
+        except DropboxError as exc:
+            results[index] = exc
+
+    for batch_start in range(0, len(pending), MAX_FINISH_BATCH_ENTRIES):
+        batch = pending[batch_start:batch_start + MAX_FINISH_BATCH_ENTRIES]
+        resp = _dropbox_request(
+            "POST",
+            f"{DROPBOX_API_BASE}/files/upload_session/finish_batch_v2",
+            token=resolved_token,
+            headers={"Content-Type": "application/json"},
+            json={"entries": [entry for _, entry in batch]},
+            timeout=timeout,
+        )
+        try:
+            _raise_for_response(resp, action="upload_session/finish_batch_v2")
+        except DropboxError as exc:
+            for index, _ in batch:
+                results[index] = exc
+            continue
+        entries = (resp.json() or {}).get("entries") or []
+        for (index, entry), outcome in zip(batch, entries):
+            if outcome.get(".tag") == "success":
+                results[index] = outcome
+            else:
+                results[index] = DropboxError(
+                    f"Erro do Dropbox na operacao 'upload_session/finish_batch_v2' "
+                    f"({entry['commit']['path']}): {outcome.get('failure') or outcome}"
+                )
+        for index, _ in batch[len(entries):]:
+            results[index] = DropboxError("Dropbox nao retornou resultado para o arquivo no finish_batch_v2")
+    return results
+
+
 def download_response(
     remote_path: str,
     *,
@@ -682,6 +951,8 @@ def list_folder_entries(
         json=payload,
         timeout=timeout,
     )
+    if resp.status_code == 409:
+        forget_folder(path)
     _raise_for_response(resp, action="list_folder")
     data = resp.json() or {}
     entries.extend(data.get("entries") or [])
@@ -700,6 +971,9 @@ def list_folder_entries(
         data = resp.json() or {}
         entries.extend(data.get("entries") or [])
         cursor = data.get("cursor")
+    remember_folders(
+        [path] + [entry.get("path_lower") for entry in entries if entry.get(".tag") == "folder"]
+    )
     return entries
 
 
@@ -719,7 +993,11 @@ def move_file(
         json={"from_path": from_path, "to_path": to_path, "autorename": autorename},
         timeout=timeout,
     )
+    forget_folder(from_path)
+    if resp.status_code == 409:
+        forget_folder(posixpath.dirname(to_path))
     _raise_for_response(resp, action="move")
+    remember_folders([posixpath.dirname(to_path)])
     return resp.json()
 
 
@@ -737,20 +1015,85 @@ def delete_file(
         json={"path": path},
         timeout=timeout,
     )
+    forget_folder(path)
     _raise_for_response(resp, action="delete")
     return resp.json()
 
 
+def _folder_key(path: Optional[str]) -> str:
+    normalized = str(path or "").strip().rstrip("/")
+    if normalized and not normalized.startswith("/"):
+        normalized = f"/{normalized}"
+    return normalized.lower()
+
+
+def _is_known_folder(path: str) -> bool:
+    key = _folder_key(path)
+    if not key:
+        return True
+    with _KNOWN_FOLDERS_LOCK:
+        expires_at = _KNOWN_FOLDERS.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            _KNOWN_FOLDERS.pop(key, None)
+            return False
+        _KNOWN_FOLDERS.move_to_end(key)
+        return True
+
+
+def remember_folders(paths) -> None:
+    """Marca pastas como existentes (ex.: vindas de list_folder)."""
+    ttl = _get_int_setting("DROPBOX_FOLDER_CACHE_SECONDS", 3600)
+    if ttl <= 0:
+        return
+    expires_at = time.monotonic() + ttl
+    with _KNOWN_FOLDERS_LOCK:
+        for path in paths:
+            key = _folder_key(path)
+            if not key:
+                continue
+            _KNOWN_FOLDERS[key] = expires_at
+            _KNOWN_FOLDERS.move_to_end(key)
+        while len(_KNOWN_FOLDERS) > KNOWN_FOLDER_CACHE_SIZE:
+            _KNOWN_FOLDERS.popitem(last=False)
+
+
+def forget_folder(path: Optional[str]) -> None:
+    """Esquece a pasta e tudo abaixo dela (apagada/movida ou erro de caminho)."""
+    key = _folder_key(path)
+    with _KNOWN_FOLDERS_LOCK:
+        if not key:
+            _KNOWN_FOLDERS.clear()
+            return
+        prefix = f"{key}/"
+        for known in [item for item in _KNOWN_FOLDERS if item == key or item.startswith(prefix)]:
+            _KNOWN_FOLDERS.pop(known, None)
+
+
+def _is_path_error(exc: Exception) -> bool:
+    message = str(exc)
+    return "status=409" in message or "status=404" in message
+
+
 def _ensure_folder(path: str, *, token: str, timeout: Tuple[int, int] = (10, 30)) -> None:
     normalized = str(path or "").strip()
     if not normalized or normalized == "/":
         return
     if not normalized.startswith("/"):
         normalized = f"/{normalized}"
+    if _is_known_folder(normalized):
+        return
 
     parts = [part for part in normalized.strip("/").split("/") if part]
-    current = ""
-    for part in parts:
+    # Começa abaixo do ancestral mais profundo já conhecido
+    start = 0
+    for index in range(len(parts) - 1, 0, -1):
+        if _is_known_folder("/" + "/".join(parts[:index])):
+            start = index
+            break
+    current = "/" + "/".join(parts[:start]) if start else ""
+    for part in parts[start:]:
         current = f"{current}/{part}"
         resp = _dropbox_request(
             "POST",
@@ -761,12 +1104,14 @@ def _ensure_folder(path: str, *, token: str, timeout: Tuple[int, int] = (10, 30)
             timeout=timeout,
         )
         if resp.ok:
+            remember_folders([current])
             continue
         if resp.status_code == 409:
             try:
                 data = resp.json() or {}
                 summary = str(data.get("error_summary") or "")
                 if "conflict" in summary and "folder" in summary:
+                    remember_folders([current])
                     continue
             except Exception:
                 pass
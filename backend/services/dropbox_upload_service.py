@@ -0,0 +1,359 @@
+"""
+Fila de envio de áudios ao Dropbox (dropbox_uploads), separada da finalização
+da gravação e do scheduler.
+
+A finalização e a limpeza só enfileiram; DROPBOX_UPLOAD_WORKERS threads
+reservam os envios com FOR UPDATE SKIP LOCKED e sobem em paralelo. Falhas
+voltam para a fila com espera exponencial; 429/503 do Dropbox respeitam o
+retry_after informado e não contam como tentativa.
+"""
+
+import itertools
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db
+from config import Config
+from models.dropbox_upload import DropboxUpload
+from models.gravacao import Gravacao
+from models.radio import Radio
+from services.audio_location_service import record_audio_location
+from services.audio_storage_service import get_dropbox_marker_path, write_dropbox_marker
+
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+_UPLOAD_WORKERS = []
+_UPLOAD_WORKER_LOCK = threading.Lock()
+_UPLOAD_WORKER_IDS = itertools.count()
+_UPLOAD_WAKE = threading.Event()
+
+
+def _safe_session_remove():
+    try:
+        db.session.remove()
+    except Exception:
+        pass
+
+
+def _get_lease_seconds():
+    return max(60, int(Config.DROPBOX_UPLOAD_LEASE_SECONDS or 1800))
+
+
+def _get_max_attempts():
+    return max(1, int(Config.DROPBOX_UPLOAD_MAX_ATTEMPTS or 6))
+
+
+def _backoff_seconds(attempts):
+    return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+
+
+def enqueue_dropbox_upload(gravacao_id, filepath, *, delete_local=False):
+    """
+    Coloca (ou recoloca) o arquivo da gravação na fila. Um envio em andamento
+    não é interrompido; arquivados voltam para a fila (o arquivo pode ter mudado).
+    """
+    if not gravacao_id or not filepath:
+        return False
+    values = {
+        "gravacao_id": gravacao_id,
+        "status": "pendente",
+        "arquivo_local": filepath,
+        "apagar_local": bool(delete_local),
+        "tentativas": 0,
+        "disponivel_em": func.now(),
+        "ultimo_erro": None,
+    }
+    statement = pg_insert(DropboxUpload.__table__).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[DropboxUpload.__table__.c.gravacao_id],
+        set_={
+            "status": statement.excluded.status,
+            "arquivo_local": statement.excluded.arquivo_local,
+            "apagar_local": statement.excluded.apagar_local,
+            "tentativas": statement.excluded.tentativas,
+            "disponivel_em": statement.excluded.disponivel_em,
+            "ultimo_erro": statement.excluded.ultimo_erro,
+            "atualizado_em": func.now(),
+        },
+        where=DropboxUpload.__table__.c.status != "enviando",
+    )
+    try:
+        db.session.execute(statement)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Falha ao enfileirar envio ao Dropbox da gravacao %s", gravacao_id)
+        return False
+    _UPLOAD_WAKE.set()
+    return True
+
+
+def start_dropbox_upload_workers(app_obj=None):
+    """Inicia os workers locais que consomem a fila de envio ao Dropbox."""
+    if not Config.DROPBOX_UPLOAD_ENABLED:
+        return 0
+    if app_obj is None:
+        app_obj = current_app._get_current_object()
+    max_workers = max(1, int(Config.DROPBOX_UPLOAD_WORKERS or 2))
+    with _UPLOAD_WORKER_LOCK:
+        _UPLOAD_WORKERS[:] = [worker for worker in _UPLOAD_WORKERS if worker.is_alive()]
+        while len(_UPLOAD_WORKERS) < max_workers:
+            index = next(_UPLOAD_WORKER_IDS)
+            worker = threading.Thread(
+                target=_upload_worker,
+                args=(app_obj, f"{socket.gethostname()}:{os.getpid()}:{index}"),
+                name=f"dropbox-upload-{index}",
+                daemon=True,
+            )
+            _UPLOAD_WORKERS.append(worker)
+            worker.start()
+        return len(_UPLOAD_WORKERS)
+
+
+def _claim_next_upload(worker_id):
+    now = func.now()
+    upload = (
+        DropboxUpload.query.filter(
+            or_(
+                and_(DropboxUpload.status == "pendente", DropboxUpload.disponivel_em <= now),
+                and_(DropboxUpload.status == "enviando", DropboxUpload.lease_expira_em < now),
+            )
+        )
+        .order_by(DropboxUpload.disponivel_em.asc())
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if upload is None:
+        db.session.rollback()
+        return None
+    upload.status = "enviando"
+    upload.tentativas = (upload.tentativas or 0) + 1
+    upload.lease_owner = worker_id
+    upload.lease_expira_em = now + timedelta(seconds=_get_lease_seconds())
+    db.session.commit()
+    return {
+        "gravacao_id": upload.gravacao_id,
+        "arquivo_local": upload.arquivo_local,
+        "apagar_local": bool(upload.apagar_local),
+        "tentativas": upload.tentativas,
+    }
+
+
+def _owned_upload_query(gravacao_id, worker_id):
+    return DropboxUpload.query.filter(
+        DropboxUpload.gravacao_id == gravacao_id,
+        DropboxUpload.status == "enviando",
+        DropboxUpload.lease_owner == worker_id,
+    )
+
+
+def _heartbeat_upload(gravacao_id, worker_id):
+    """Renova o lease; False indica que o envio foi perdido para outro worker."""
+    try:
+        updated = _owned_upload_query(gravacao_id, worker_id).update(
+            {DropboxUpload.lease_expira_em: func.now() + timedelta(seconds=_get_lease_seconds())},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        return updated > 0
+    except Exception:
+        db.session.rollback()
+        return True
+
+
+def _run_lease_heartbeat(app_obj, gravacao_id, worker_id, stop_event):
+    interval = max(5, _get_lease_seconds() // 3)
+    while not stop_event.wait(interval):
+        try:
+            with app_obj.app_context():
+                try:
+                    if not _heartbeat_upload(gravacao_id, worker_id):
+                        current_app.logger.warning(
+                            "Lease do envio ao Dropbox da gravacao %s perdido por %s", gravacao_id, worker_id
+                        )
+                        return
+                finally:
+                    _safe_session_remove()
+        except Exception:
+            pass
+
+
+def _build_remote_path(job, dropbox_cfg):
+    from services.dropbox_service import build_audio_destination
+
+    gravacao = db.session.get(Gravacao, job["gravacao_id"])
+    if gravacao is None:
+        return None
+    radio_obj = getattr(gravacao, "radio", None) or db.session.get(Radio, gravacao.radio_id)
+    remote_path, _ = build_audio_destination(
+        gravacao,
+        radio=radio_obj,
+        original_filename=os.path.basename(job["arquivo_local"]),
+        base_path=dropbox_cfg.audio_path,
+        layout=dropbox_cfg.audio_layout,
+    )
+    return remote_path
+
+
+def _finish_local_copy(gravacao, filepath, remote_path, delete_local):
+    """Marcador ou remoção da cópia local depois do envio, e atualização do índice."""
+    try:
+        file_size_mb = round(os.path.getsize(filepath) / (1024 * 1024), 2)
+        if (gravacao.tamanho_mb or 0) != file_size_mb:
+            gravacao.tamanho_mb = file_size_mb
+    except Exception:
+        pass
+
+    # Transcrição ainda precisa do arquivo: mantém com marcador; a limpeza pós-transcrição remove
+    if Config.TRANSCRIBE_ENABLED and gravacao.transcricao_status != "concluido":
+        delete_local = False
+
+    if delete_local:
+        try:
+            os.remove(filepath)
+        except Exception:
+            pass
+        try:
+            marker_path = get_dropbox_marker_path(filepath)
+            if marker_path and os.path.exists(marker_path):
+                os.remove(marker_path)
+        except Exception:
+            pass
+        record_audio_location(gravacao.id, filename=None, dropbox_path=remote_path, marker=False)
+        return
+
+    marker_written = False
+    try:
+        write_dropbox_marker(filepath, remote_path)
+        marker_written = True
+    except Exception:
+        pass
+    record_audio_location(gravacao.id, filename=filepath, dropbox_path=remote_path, marker=marker_written)
+
+
+def _mark_upload_failed(gravacao_id, worker_id, exc, *, retry_after=None):
+    upload = db.session.get(DropboxUpload, gravacao_id)
+    if upload is None or upload.lease_owner != worker_id:
+        db.session.rollback()
+        return
+    upload.ultimo_erro = str(exc)[:500]
+    upload.lease_owner = None
+    upload.lease_expira_em = None
+    if retry_after is not None:
+        # Limite de taxa não é falha do arquivo: devolve a tentativa
+        upload.tentativas = max(0, (upload.tentativas or 1) - 1)
+        delay = max(1, int(retry_after))
+        upload.status = "pendente"
+    elif (upload.tentativas or 0) >= _get_max_attempts():
+        upload.status = "erro"
+        delay = 0
+    else:
+        upload.status = "pendente"
+        delay = _backoff_seconds(upload.tentativas or 1)
+    upload.disponivel_em = func.now() + timedelta(seconds=delay)
+    db.session.commit()
+
+
+def _process_upload(app_obj, worker_id, job):
+    from services.dropbox_service import DropboxRateLimitError, get_dropbox_config, upload_file
+
+    gravacao_id = job["gravacao_id"]
+    filepath = job["arquivo_local"]
+    try:
+        with app_obj.app_context():
+            dropbox_cfg = get_dropbox_config()
+            if not dropbox_cfg.is_ready:
+                raise RuntimeError("Dropbox nao configurado")
+            if not os.path.exists(filepath):
+                raise FileNotFoundError(f"Arquivo local nao encontrado: {filepath}")
+            remote_path = _build_remote_path(job, dropbox_cfg)
+            if remote_path is None:
+                # Gravação removida: o CASCADE já levou a linha da fila
+                return
+            token = dropbox_cfg.access_token
+            _safe_session_remove()
+
+            # Sem sessão do banco aberta durante o envio; o lease é renovado em paralelo
+            stop_heartbeat = threading.Event()
+            threading.Thread(
+                target=_run_lease_heartbeat,
+                args=(app_obj, gravacao_id, worker_id, stop_heartbeat),
+                daemon=True,
+            ).start()
+            try:
+                upload_file(filepath, remote_path, token=token)
+            finally:
+                stop_heartbeat.set()
+
+            # Trava a linha: outro worker não reserva o envio enquanto a cópia local é tratada
+            upload = _owned_upload_query(gravacao_id, worker_id).with_for_update().first()
+            if upload is None:
+                # Lease perdido: quem reservou depois cuida do arquivo local
+                current_app.logger.warning(
+                    "Envio ao Dropbox da gravacao %s reservado por outro worker; mantendo arquivo local",
+                    gravacao_id,
+                )
+                db.session.rollback()
+                return
+            gravacao = db.session.get(Gravacao, gravacao_id)
+            if gravacao is None:
+                db.session.rollback()
+                return
+            _finish_local_copy(gravacao, filepath, remote_path, job["apagar_local"])
+            upload.status = "arquivado"
+            upload.dropbox_path = remote_path
+            upload.ultimo_erro = None
+            upload.lease_owner = None
+            upload.lease_expira_em = None
+            db.session.commit()
+    except DropboxRateLimitError as exc:
+        with app_obj.app_context():
+            retry_after = exc.retry_after if exc.retry_after is not None else _backoff_seconds(job["tentativas"])
+            current_app.logger.warning(
+                "Dropbox limitou envio da gravacao %s; nova tentativa em %ss", gravacao_id, retry_after
+            )
+            _mark_upload_failed(gravacao_id, worker_id, exc, retry_after=retry_after)
+    except Exception as exc:
+        with app_obj.app_context():
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+            current_app.logger.warning("Falha ao enviar gravacao %s ao Dropbox: %s", gravacao_id, exc)
+            _mark_upload_failed(gravacao_id, worker_id, exc)
+    finally:
+        with app_obj.app_context():
+            _safe_session_remove()
+
+
+def _upload_worker(app_obj, worker_id):
+    poll_seconds = max(1, int(Config.DROPBOX_UPLOAD_POLL_SECONDS or 10))
+    while True:
+        job = None
+        try:
+            with app_obj.app_context():
+                job = _claim_next_upload(worker_id)
+        except Exception:
+            job = None
+            with app_obj.app_context():
+                try:
+                    db.session.rollback()
+                    current_app.logger.exception("Falha ao reservar envio ao Dropbox")
+                except Exception:
+                    pass
+        finally:
+            with app_obj.app_context():
+                _safe_session_remove()
+
+        if job is None:
+            _UPLOAD_WAKE.wait(poll_seconds)
+            _UPLOAD_WAKE.clear()
+            continue
+        _process_upload(app_obj, worker_id, job)
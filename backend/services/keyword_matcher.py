@@ -0,0 +1,214 @@
+"""
+Casamento de várias palavras-chave de uma vez (Aho-Corasick).
+
+O texto e as palavras-chave são comparados sem acento, sem diferença de
+maiúsculas e com espaços colapsados; as posições devolvidas são do texto
+original. Usado pela nuvem de tags, pelos clipes e pelos alertas.
+"""
+
+import threading
+import unicodedata
+from collections import OrderedDict, deque, namedtuple
+
+MATCHER_CACHE_SIZE = 16
+
+KeywordMatch = namedtuple("KeywordMatch", ["keys", "start", "end", "text"])
+
+_MATCHER_CACHE = OrderedDict()
+_MATCHER_CACHE_LOCK = threading.Lock()
+
+
+def _fold_char(char):
+    decomposed = unicodedata.normalize("NFKD", char)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def fold_text(text):
+    """
+    (texto_normalizado, posicoes) onde posicoes[i] é o índice no texto original
+    do caractere normalizado i. Sequências de espaço viram um único espaço.
+    """
+    folded = []
+    positions = []
+    previous_space = True
+    for index, char in enumerate(str(text or "")):
+        if char.isspace():
+            if not previous_space:
+                folded.append(" ")
+                positions.append(index)
+            previous_space = True
+            continue
+        previous_space = False
+        for folded_char in _fold_char(char):
+            folded.append(folded_char)
+            positions.append(index)
+    return "".join(folded), positions
+
+
+def normalize_keyword(value):
+    return fold_text(value)[0].strip()
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class KeywordMatcher:
+    """Autômato imutável para um conjunto de palavras-chave."""
+
+    def __init__(self, keywords):
+        # chave normalizada -> chaves originais (ex.: 'saude' e 'saúde' casam juntas)
+        self.keys_by_pattern = {}
+        for key in keywords or []:
+            pattern = normalize_keyword(key)
+            if pattern:
+                self.keys_by_pattern.setdefault(pattern, []).append(key)
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [()]
+        for pattern in self.keys_by_pattern:
+            self._add(pattern)
+        self._build_failure_links()
+
+    def __bool__(self):
+        return bool(self.keys_by_pattern)
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append(())
+            state = next_state
+        self._outputs[state] = self._outputs[state] + (pattern,)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def _scan(self, folded):
+        """Gera (inicio, fim, padrao) no texto normalizado, respeitando limites de palavra."""
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        state = 0
+        length = len(folded)
+        for index, char in enumerate(folded):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not outputs[state]:
+                continue
+            end = index + 1
+            if end < length and _is_word_char(folded[end]) and _is_word_char(folded[index]):
+                continue
+            for pattern in outputs[state]:
+                start = end - len(pattern)
+                if start > 0 and _is_word_char(folded[start - 1]) and _is_word_char(folded[start]):
+                    continue
+                yield start, end, pattern
+
+    def search(self, text):
+        """True se alguma palavra-chave aparece no texto."""
+        if not self.keys_by_pattern or not text:
+            return False
+        folded, _ = fold_text(text)
+        for _ in self._scan(folded):
+            return True
+        return False
+
+    def find_all(self, text):
+        """
+        Ocorrências em ordem de posição. Em cada posição de início vale só a
+        palavra-chave mais longa (como 'saúde pública' antes de 'saúde').
+        """
+        if not self.keys_by_pattern or not text:
+            return []
+        text = str(text)
+        folded, positions = fold_text(text)
+        longest = {}
+        for start, end, pattern in self._scan(folded):
+            current = longest.get(start)
+            if current is None or end > current[0]:
+                longest[start] = (end, pattern)
+        matches = []
+        for start in sorted(longest):
+            end, pattern = longest[start]
+            original_start = positions[start]
+            original_end = positions[end - 1] + 1
+            matches.append(KeywordMatch(
+                keys=tuple(self.keys_by_pattern[pattern]),
+                start=original_start,
+                end=original_end,
+                text=text[original_start:original_end],
+            ))
+        return matches
+
+
+def get_keyword_matcher(keywords):
+    """Autômato em cache pelo conjunto de palavras-chave (a 'versão' do conjunto)."""
+    cache_key = frozenset(key for key in keywords or [] if key)
+    with _MATCHER_CACHE_LOCK:
+        matcher = _MATCHER_CACHE.get(cache_key)
+        if matcher is not None:
+            _MATCHER_CACHE.move_to_end(cache_key)
+            return matcher
+    matcher = KeywordMatcher(sorted(cache_key))
+    with _MATCHER_CACHE_LOCK:
+        _MATCHER_CACHE[cache_key] = matcher
+        while len(_MATCHER_CACHE) > MATCHER_CACHE_SIZE:
+            _MATCHER_CACHE.popitem(last=False)
+    return matcher
+
+
+def align_words(text, words):
+    """[(inicio_char, fim_char, inicio_segundos, fim_segundos)] das palavras do Whisper no texto do segmento."""
+    folded, positions = fold_text(text)
+    spans = []
+    cursor = 0
+    for word in words or []:
+        token = normalize_keyword((word or {}).get("word"))
+        if not token:
+            continue
+        found = folded.find(token, cursor)
+        if found < 0:
+            continue
+        try:
+            start_seconds = float((word or {}).get("start") or 0)
+            end_seconds = float((word or {}).get("end") or start_seconds)
+        except Exception:
+            continue
+        cursor = found + len(token)
+        spans.append((positions[found], positions[cursor - 1] + 1, start_seconds, end_seconds))
+    return spans
+
+
+def _span_at(spans, char_offset):
+    for span in spans:
+        if span[1] > char_offset:
+            return span if span[0] <= char_offset else None
+    return None
+
+
+def match_word_start(spans, char_offset):
+    """Horário da palavra que contém a posição; None se ela não foi alinhada."""
+    span = _span_at(spans, char_offset)
+    return span[2] if span else None
+
+
+def match_word_end(spans, char_offset):
+    """Fim (segundos) da palavra que contém a posição; None se ela não foi alinhada."""
+    span = _span_at(spans, char_offset)
+    return span[3] if span else None
@@ -0,0 +1,378 @@
+import subprocess
+import threading
+
+from flask import current_app, has_app_context
+
+from app import db
+from config import Config
+from models.gravacao import Gravacao
+from services.stream_ingest_service import EncoderSink, attach_sink, detach_sink
+
+LIVE_SAMPLE_RATE = 16000
+LIVE_SAMPLE_WIDTH = 2
+LIVE_READ_BYTES = LIVE_SAMPLE_RATE * LIVE_SAMPLE_WIDTH
+
+_LIVE_SESSIONS = {}
+_LIVE_SESSIONS_LOCK = threading.Lock()
+
+
+def _live_sink_key(gravacao_id):
+    return f"{gravacao_id}:live"
+
+
+def _get_window_seconds():
+    try:
+        return max(10, int(Config.TRANSCRIBE_LIVE_WINDOW_SECONDS or 30))
+    except Exception:
+        return 30
+
+
+def _get_overlap_seconds(window_seconds):
+    try:
+        overlap = max(0, int(Config.TRANSCRIBE_LIVE_OVERLAP_SECONDS or 5))
+    except Exception:
+        overlap = 5
+    return min(overlap, window_seconds // 2)
+
+
+def _log_exception(message):
+    if not has_app_context():
+        return
+    try:
+        current_app.logger.exception(message)
+    except Exception:
+        pass
+
+
+def _log_warning(message):
+    if not has_app_context():
+        return
+    try:
+        current_app.logger.warning(message)
+    except Exception:
+        pass
+
+
+def _shift_segment_payload(payload, offset_seconds):
+    """Segmento relativo à janela para o tempo da gravação."""
+    shifted = dict(payload, start=payload["start"] + offset_seconds, end=payload["end"] + offset_seconds)
+    if payload.get("words"):
+        shifted["words"] = [
+            dict(word, start=word["start"] + offset_seconds, end=word["end"] + offset_seconds)
+            for word in payload["words"]
+        ]
+    return shifted
+
+
+def is_live_transcription_active(gravacao_id):
+    with _LIVE_SESSIONS_LOCK:
+        return gravacao_id in _LIVE_SESSIONS
+
+
+class LiveTranscriptionSession:
+    """
+    Transcreve uma gravação em andamento a partir do PCM do ingest.
+
+    Um ffmpeg reamostra o PCM para 16 kHz mono; o áudio acumula numa janela
+    deslizante e, a cada janela cheia, só os segmentos que terminam antes da
+    área de sobreposição são confirmados. O restante volta a ser transcrito
+    na janela seguinte, com contexto completo.
+
+    Uma thread só lê o reamostrador, para que uma janela lenta não segure o
+    ingest (que descartaria o sink); o áudio recebido durante a inferência
+    entra todo na janela seguinte. Com TRANSCRIBE_POOL_ENABLED a inferência
+    vai para o pool de processos, sem carregar o modelo neste processo.
+    """
+
+    def __init__(self, gravacao_id, *, duration_seconds, app_obj=None):
+        self.gravacao_id = gravacao_id
+        self.duration_seconds = duration_seconds
+        self.app_obj = app_obj
+        self.window_seconds = _get_window_seconds()
+        self.overlap_seconds = _get_overlap_seconds(self.window_seconds)
+        self.buffer = bytearray()
+        self.buffer_offset = 0.0
+        self.parts = []
+        self.segments_payload = []
+        self.sink = None
+        self._pending = bytearray()
+        self._pending_cond = threading.Condition()
+        self._reader_done = False
+
+    def _build_resampler_args(self):
+        output_args = []
+        audio_filter = (Config.TRANSCRIBE_AUDIO_FILTER or "").strip()
+        # loudnorm em tempo real precisa de todo o áudio; no modo ao vivo só filtros de banda.
+        if audio_filter and "loudnorm" not in audio_filter:
+            output_args += ["-af", audio_filter]
+        output_args += [
+            "-ac",
+            "1",
+            "-ar",
+            str(LIVE_SAMPLE_RATE),
+            "-f",
+            "s16le",
+            "pipe:1",
+        ]
+        return output_args
+
+    def attach(self, radio):
+        self.sink = EncoderSink(
+            _live_sink_key(self.gravacao_id),
+            self._build_resampler_args(),
+            duration_seconds=self.duration_seconds,
+            stdout=subprocess.PIPE,
+        )
+        attach_sink(radio, self.sink)
+        # Leitura começa já: o modelo pode levar segundos para carregar.
+        threading.Thread(target=self._read_pcm, daemon=True).start()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def _read_pcm(self):
+        stdout = self.sink.process.stdout
+        try:
+            while True:
+                chunk = stdout.read1(LIVE_READ_BYTES)
+                if not chunk:
+                    break
+                with self._pending_cond:
+                    self._pending.extend(chunk)
+                    self._pending_cond.notify()
+        except Exception:
+            pass
+        finally:
+            with self._pending_cond:
+                self._reader_done = True
+                self._pending_cond.notify()
+
+    def _wait_for_window(self, window_bytes):
+        """Move o PCM recebido para a janela; False quando o reamostrador terminou."""
+        with self._pending_cond:
+            while len(self.buffer) + len(self._pending) < window_bytes and not self._reader_done:
+                self._pending_cond.wait()
+            self.buffer.extend(self._pending)
+            self._pending.clear()
+            return not self._reader_done
+
+    def _buffered_seconds(self):
+        return len(self.buffer) / float(LIVE_SAMPLE_RATE * LIVE_SAMPLE_WIDTH)
+
+    def _build_window_runner(self):
+        """Inferência de uma janela: (pcm, kwargs) -> [(payload, fim_do_segmento)]."""
+        from services.transcription_pool import (
+            build_segment_payload,
+            get_transcription_pool,
+            is_pool_enabled,
+        )
+
+        if is_pool_enabled():
+            pool = get_transcription_pool()
+
+            def run_in_pool(pcm, kwargs):
+                job = pool.submit(None, kwargs, pcm=pcm)
+                segments, _ = job.results()
+                return list(segments)
+
+            return run_in_pool
+
+        from services.transcription_audio import pcm_to_float32
+        from services.transcription_service import _load_model
+
+        model = _load_model()
+
+        def run_local(pcm, kwargs):
+            segments, _ = model.transcribe(pcm_to_float32(pcm), **kwargs)
+            return [
+                (build_segment_payload(segment), float(getattr(segment, "end", 0) or 0))
+                for segment in segments
+            ]
+
+        return run_local
+
+    def _transcribe_window(self, runner, transcribe_kwargs, *, final):
+        if not self.buffer:
+            return []
+        kwargs = dict(transcribe_kwargs)
+        if self.parts:
+            # Continuidade entre janelas: o fim do texto já confirmado vira prompt.
+            kwargs["initial_prompt"] = " ".join(self.parts)[-200:]
+        segments = runner(bytes(self.buffer), kwargs)
+
+        window_seconds = self._buffered_seconds()
+        commit_limit = window_seconds if final else window_seconds - self.overlap_seconds
+        committed = []
+        committed_until = 0.0
+        for payload, segment_end in segments:
+            if segment_end > commit_limit:
+                break
+            committed_until = segment_end
+            if payload:
+                committed.append(_shift_segment_payload(payload, self.buffer_offset))
+
+        if final:
+            committed_until = window_seconds
+        elif committed_until <= 0:
+            # Janela sem fala confirmada: avança até a sobreposição para não crescer sem limite.
+            committed_until = max(0.0, commit_limit)
+
+        drop_bytes = int(committed_until * LIVE_SAMPLE_RATE) * LIVE_SAMPLE_WIDTH
+        del self.buffer[:drop_bytes]
+        self.buffer_offset += drop_bytes / float(LIVE_SAMPLE_RATE * LIVE_SAMPLE_WIDTH)
+        return committed
+
+    def _publish(self, gravacao, new_segments, *, final):
+        from services.alert_service import evaluate_keyword_alerts
+        from services.tag_cloud_service import refresh_tag_occurrences_for_gravacao
+        from services.transcription_segments_service import append_transcription_segments
+        from services.transcription_service import _commit_transcription
+
+        if new_segments:
+            self.parts.extend(segment["text"] for segment in new_segments)
+            self.segments_payload.extend(new_segments)
+            append_transcription_segments(gravacao.id, new_segments)
+            evaluate_keyword_alerts(gravacao, new_segments)
+
+        texto = " ".join(self.parts).strip()
+        if final:
+            if not texto:
+                return False
+            _commit_transcription(
+                gravacao,
+                status="concluido",
+                texto=texto,
+                idioma=Config.TRANSCRIBE_LANGUAGE,
+                modelo=Config.TRANSCRIBE_MODEL,
+                progresso=100,
+                cancelada=False,
+            )
+            refresh_tag_occurrences_for_gravacao(gravacao.id)
+            return True
+
+        progresso = None
+        if self.duration_seconds:
+            progresso = max(1, min(99, int((self.buffer_offset / self.duration_seconds) * 100)))
+        _commit_transcription(
+            gravacao,
+            status="processando",
+            texto=texto if new_segments else None,
+            modelo=Config.TRANSCRIBE_MODEL,
+            progresso=progresso,
+        )
+        return True
+
+    def _recording_in_progress(self):
+        try:
+            gravacao = db.session.get(Gravacao, self.gravacao_id, populate_existing=True)
+        except Exception:
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+            return False
+        return gravacao is not None and gravacao.status in ("iniciando", "gravando")
+
+    def run(self):
+        ctx = self.app_obj.app_context() if self.app_obj else None
+        if ctx:
+            ctx.push()
+        completed = False
+        try:
+            from services.transcription_segments_service import reset_transcription_segments
+            from services.transcription_service import _build_transcribe_kwargs, _commit_transcription
+
+            gravacao = Gravacao.query.get(self.gravacao_id)
+            if not gravacao:
+                return
+            reset_transcription_segments(gravacao.id)
+            _commit_transcription(
+                gravacao,
+                status="processando",
+                erro=None,
+                modelo=Config.TRANSCRIBE_MODEL,
+                progresso=0,
+                cancelada=False,
+            )
+            runner = self._build_window_runner()
+            transcribe_kwargs = _build_transcribe_kwargs(gravacao)
+            transcribe_kwargs["condition_on_previous_text"] = False
+            window_bytes = self.window_seconds * LIVE_SAMPLE_RATE * LIVE_SAMPLE_WIDTH
+
+            while self._wait_for_window(window_bytes):
+                new_segments = self._transcribe_window(runner, transcribe_kwargs, final=False)
+                self._publish(gravacao, new_segments, final=False)
+                try:
+                    db.session.refresh(gravacao)
+                    if gravacao.transcricao_cancelada:
+                        _commit_transcription(
+                            gravacao,
+                            status="interrompido",
+                            progresso=gravacao.transcricao_progresso or 0,
+                            cancelada=True,
+                        )
+                        completed = True
+                        return
+                except Exception:
+                    pass
+
+            if self.sink.end_reason not in ("janela", "parado"):
+                # Sink descartado pelo ingest ou upstream caiu: o texto parcial não conclui a gravação
+                _log_warning(
+                    f"Transcricao ao vivo da gravacao {self.gravacao_id} interrompida "
+                    f"({self.sink.end_reason or 'desconhecido'}); usando o arquivo completo"
+                )
+                return
+            new_segments = self._transcribe_window(runner, transcribe_kwargs, final=True)
+            completed = self._publish(gravacao, new_segments, final=True)
+        except Exception as exc:
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+            _log_exception(f"Falha na transcricao ao vivo da gravacao {self.gravacao_id}: {exc}")
+        finally:
+            try:
+                if self.sink is not None and self.sink.process.poll() is None:
+                    self.sink.process.kill()
+            except Exception:
+                pass
+            with _LIVE_SESSIONS_LOCK:
+                if _LIVE_SESSIONS.get(self.gravacao_id) is self:
+                    _LIVE_SESSIONS.pop(self.gravacao_id, None)
+            if not completed and not self._recording_in_progress():
+                # Sem texto ou com falha: a transcrição completa do arquivo assume.
+                # Com a gravação ainda aberta, quem enfileira é a finalização dela.
+                try:
+                    from services.transcription_service import start_transcription
+
+                    start_transcription(self.gravacao_id, force=True)
+                except Exception:
+                    _log_exception(f"Falha ao enfileirar transcricao completa {self.gravacao_id}")
+            try:
+                db.session.remove()
+            except Exception:
+                pass
+            if ctx:
+                ctx.pop()
+
+
+def start_live_transcription(radio, gravacao, *, duration_seconds, app_obj=None):
+    if not (Config.TRANSCRIBE_ENABLED and Config.TRANSCRIBE_LIVE_ENABLED and Config.RECORDING_SHARED_INGEST):
+        return False
+    session = LiveTranscriptionSession(gravacao.id, duration_seconds=duration_seconds, app_obj=app_obj)
+    with _LIVE_SESSIONS_LOCK:
+        if gravacao.id in _LIVE_SESSIONS:
+            return True
+        _LIVE_SESSIONS[gravacao.id] = session
+    try:
+        session.attach(radio)
+    except Exception:
+        with _LIVE_SESSIONS_LOCK:
+            _LIVE_SESSIONS.pop(gravacao.id, None)
+        _log_exception(f"Falha ao iniciar transcricao ao vivo {gravacao.id}")
+        return False
+    return True
+
+
+def stop_live_transcription(radio_id, gravacao_id):
+    """Encerra a janela ao vivo; a sessão confirma o áudio já recebido."""
+    detach_sink(radio_id, _live_sink_key(gravacao_id))
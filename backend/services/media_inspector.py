@@ -0,0 +1,230 @@
+"""
+Leitura direta de cabeçalhos de áudio (sem ffprobe) para os formatos que o
+próprio sistema grava: mp3 (Xing/Info/VBRI ou CBR), ogg/opus/vorbis (granule
+da última página) e flac (STREAMINFO). Lê poucos KB do início e do fim do
+arquivo; qualquer coisa fora do esperado retorna None para cair no ffprobe.
+"""
+
+import os
+import struct
+
+HEAD_BYTES = 64 * 1024
+TAIL_BYTES = 64 * 1024
+
+_MP3_BITRATES = {
+    # (versão MPEG 1?, layer) -> kbps por índice
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG 1
+    2: (22050, 24000, 16000),  # MPEG 2
+    0: (11025, 12000, 8000),   # MPEG 2.5
+}
+
+
+def _read_head_tail(path):
+    size = os.path.getsize(path)
+    with open(path, "rb") as fp:
+        head = fp.read(HEAD_BYTES)
+        if size > HEAD_BYTES:
+            fp.seek(max(0, size - TAIL_BYTES))
+            tail = fp.read(TAIL_BYTES)
+        else:
+            tail = head
+    return size, head, tail
+
+
+def _id3v2_size(data):
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    flags = data[5]
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return 10 + size + (10 if flags & 0x10 else 0)
+
+
+def _parse_mp3_frame_header(data, offset):
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version_bits == 3
+    layer = 4 - layer_bits
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    channels = 1 if ((b3 >> 6) & 0x03) == 3 else 2
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if (layer == 2 or mpeg1) else 576
+        frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return {
+        "mpeg1": mpeg1,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "samples_per_frame": samples_per_frame,
+        "frame_length": frame_length,
+    }
+
+
+def _inspect_mp3(size, head, tail):
+    offset = _id3v2_size(head)
+    if offset >= len(head):
+        return None
+    audio_start = offset
+    header = None
+    # Procura o primeiro quadro válido seguido de outro quadro válido (evita falso sync)
+    while offset < len(head) - 4:
+        candidate = _parse_mp3_frame_header(head, offset)
+        if candidate:
+            following = offset + candidate["frame_length"]
+            if following + 4 > len(head) or _parse_mp3_frame_header(head, following):
+                header = candidate
+                audio_start = offset
+                break
+        offset += 1
+    if header is None:
+        return None
+
+    audio_end = size - (128 if tail[-128:-125] == b"TAG" else 0)
+    duration = None
+    bitrate = header["bitrate"]
+
+    side_info = (32 if header["channels"] == 2 else 17) if header["mpeg1"] else (17 if header["channels"] == 2 else 9)
+    xing_offset = audio_start + 4 + side_info
+    tag = head[xing_offset:xing_offset + 4]
+    if tag in (b"Xing", b"Info") and xing_offset + 12 <= len(head):
+        flags = struct.unpack(">I", head[xing_offset + 4:xing_offset + 8])[0]
+        if flags & 0x01:
+            frames = struct.unpack(">I", head[xing_offset + 8:xing_offset + 12])[0]
+            if frames:
+                duration = frames * header["samples_per_frame"] / float(header["sample_rate"])
+    elif head[audio_start + 36:audio_start + 40] == b"VBRI" and audio_start + 54 <= len(head):
+        frames = struct.unpack(">I", head[audio_start + 50:audio_start + 54])[0]
+        if frames:
+            duration = frames * header["samples_per_frame"] / float(header["sample_rate"])
+
+    if duration is None:
+        # CBR (ou Xing ainda não preenchido durante a gravação): tamanho / bitrate
+        duration = max(0, audio_end - audio_start) * 8 / float(bitrate)
+    elif duration > 0:
+        bitrate = int(max(0, audio_end - audio_start) * 8 / duration)
+
+    return {
+        "duration": duration,
+        "format": "mp3",
+        "codec": "mp3",
+        "bitrate": bitrate,
+        "channels": header["channels"],
+        "sample_rate": header["sample_rate"],
+    }
+
+
+def _last_ogg_granule(tail):
+    index = tail.rfind(b"OggS")
+    while index >= 0:
+        if index + 14 <= len(tail) and tail[index + 4] == 0:
+            granule = struct.unpack("<q", tail[index + 6:index + 14])[0]
+            if granule >= 0:
+                return granule
+        index = tail.rfind(b"OggS", 0, index)
+    return None
+
+
+def _inspect_ogg(size, head, tail):
+    if head[:4] != b"OggS" or len(head) < 28:
+        return None
+    segments = head[26]
+    packet = head[27 + segments:27 + segments + 64]
+    if packet[:8] == b"OpusHead" and len(packet) >= 19:
+        codec = "opus"
+        channels = packet[9]
+        pre_skip = struct.unpack("<H", packet[10:12])[0]
+        sample_rate = struct.unpack("<I", packet[12:16])[0] or 48000
+        granule_rate = 48000
+    elif packet[:7] == b"\x01vorbis" and len(packet) >= 16:
+        codec = "vorbis"
+        channels = packet[11]
+        sample_rate = struct.unpack("<I", packet[12:16])[0]
+        pre_skip = 0
+        granule_rate = sample_rate
+    else:
+        return None
+    granule = _last_ogg_granule(tail)
+    if not granule or not granule_rate:
+        return None
+    duration = max(0, granule - pre_skip) / float(granule_rate)
+    return {
+        "duration": duration,
+        "format": "ogg",
+        "codec": codec,
+        "bitrate": int(size * 8 / duration) if duration > 0 else None,
+        "channels": channels,
+        "sample_rate": sample_rate,
+    }
+
+
+def _inspect_flac(size, head, tail):
+    offset = _id3v2_size(head)
+    if head[offset:offset + 4] != b"fLaC":
+        return None
+    block = head[offset + 4:offset + 8 + 34]
+    if len(block) < 38 or (block[0] & 0x7F) != 0:
+        return None
+    info = block[4:]
+    packed = int.from_bytes(info[10:18], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x07) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    if not sample_rate or not total_samples:
+        return None
+    duration = total_samples / float(sample_rate)
+    return {
+        "duration": duration,
+        "format": "flac",
+        "codec": "flac",
+        "bitrate": int(size * 8 / duration) if duration > 0 else None,
+        "channels": channels,
+        "sample_rate": sample_rate,
+    }
+
+
+_INSPECTORS = {
+    ".mp3": _inspect_mp3,
+    ".opus": _inspect_ogg,
+    ".ogg": _inspect_ogg,
+    ".oga": _inspect_ogg,
+    ".flac": _inspect_flac,
+}
+
+
+def inspect_audio_header(path):
+    """Mesmo formato do probe via ffprobe, ou None se o formato não for reconhecido."""
+    inspector = _INSPECTORS.get(os.path.splitext(path or "")[1].lower())
+    if inspector is None:
+        return None
+    try:
+        size, head, tail = _read_head_tail(path)
+        if not size:
+            return None
+        info = inspector(size, head, tail)
+    except (OSError, ValueError, struct.error, IndexError, ZeroDivisionError):
+        return None
+    if not info or not info.get("duration"):
+        return None
+    return info
@@ -0,0 +1,233 @@
+"""
+Metadados de mídia (duração, codec, bitrate, canais, tamanho) com cache.
+
+Formatos conhecidos são lidos direto do cabeçalho (media_inspector); o
+ffprobe fica para o resto. O resultado fica em midia_probes, identificado
+por (caminho, tamanho, mtime): enquanto o arquivo não muda, nada é relido.
+Um cache em memória evita até a consulta ao banco nos acessos repetidos.
+"""
+
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import db
+from config import Config
+from models.media_probe import MediaProbe
+from services.media_inspector import inspect_audio_header
+
+MEMORY_CACHE_SIZE = 1024
+
+_MEMORY_CACHE = OrderedDict()
+_MEMORY_LOCK = threading.Lock()
+
+
+def _log_warning(message, *args):
+    if has_app_context():
+        current_app.logger.warning(message, *args)
+
+
+def _file_identity(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _run_ffprobe(path):
+    timeout = max(5, int(Config.MEDIA_PROBE_TIMEOUT_SECONDS or 15))
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe",
+                "-v", "error",
+                "-select_streams", "a:0",
+                "-show_entries", "format=duration,bit_rate,format_name:stream=codec_name,channels,sample_rate,bit_rate",
+                "-of", "json",
+                path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout,
+        )
+    except Exception as exc:
+        _log_warning("ffprobe falhou para %s: %s", path, exc)
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        data = json.loads(result.stdout or b"{}")
+    except ValueError:
+        return None
+    fmt = data.get("format") or {}
+    stream = (data.get("streams") or [{}])[0] or {}
+    duration = _to_float(fmt.get("duration"))
+    if duration is None and not stream:
+        return None
+    return {
+        "duration": duration,
+        "format": fmt.get("format_name"),
+        "codec": stream.get("codec_name"),
+        "bitrate": _to_int(stream.get("bit_rate")) or _to_int(fmt.get("bit_rate")),
+        "channels": _to_int(stream.get("channels")),
+        "sample_rate": _to_int(stream.get("sample_rate")),
+    }
+
+
+def _probe_file(path):
+    # mp3/ogg/opus/flac gravados pelo sistema: cabeçalho basta; ffprobe só para o resto
+    return inspect_audio_header(path) or _run_ffprobe(path)
+
+
+def _memory_get(key):
+    with _MEMORY_LOCK:
+        info = _MEMORY_CACHE.get(key)
+        if info is not None:
+            _MEMORY_CACHE.move_to_end(key)
+        return info
+
+
+def _memory_put(key, info):
+    with _MEMORY_LOCK:
+        _MEMORY_CACHE[key] = info
+        _MEMORY_CACHE.move_to_end(key)
+        while len(_MEMORY_CACHE) > MEMORY_CACHE_SIZE:
+            _MEMORY_CACHE.popitem(last=False)
+
+
+def _load_cached_rows(identities):
+    if not identities or not has_app_context():
+        return {}
+    # Sessão própria: a de quem chamou pode ter alterações pendentes
+    try:
+        with Session(db.engine) as session:
+            rows = session.query(MediaProbe).filter(MediaProbe.caminho.in_(list(identities.keys()))).all()
+    except Exception:
+        return {}
+    found = {}
+    for row in rows:
+        size, mtime = identities[row.caminho]
+        if row.tamanho_bytes == size and row.modificado_em == mtime:
+            found[row.caminho] = row.to_info()
+    return found
+
+
+def _store_rows(entries):
+    if not entries or not has_app_context():
+        return
+    values = [
+        {
+            "caminho": path,
+            "tamanho_bytes": info["size_bytes"],
+            "modificado_em": mtime,
+            "duracao_segundos": info.get("duration"),
+            "formato": (info.get("format") or "")[:100] or None,
+            "codec": (info.get("codec") or "")[:50] or None,
+            "bitrate": info.get("bitrate"),
+            "canais": info.get("channels"),
+            "sample_rate": info.get("sample_rate"),
+        }
+        for path, mtime, info in entries
+    ]
+    statement = pg_insert(MediaProbe.__table__).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[MediaProbe.__table__.c.caminho],
+        set_={
+            column: statement.excluded[column]
+            for column in (
+                "tamanho_bytes", "modificado_em", "duracao_segundos", "formato",
+                "codec", "bitrate", "canais", "sample_rate",
+            )
+        },
+    )
+    # Transação própria: não pode commitar (nem desfazer) a sessão de quem chamou
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(statement)
+    except Exception:
+        pass
+
+
+def probe_media_batch(paths):
+    """
+    {caminho: info | None} para vários arquivos: uma consulta ao cache para
+    todos e, só para os que mudaram, leitura do cabeçalho ou ffprobe em
+    paralelo (MEDIA_PROBE_WORKERS).
+    """
+    results = {}
+    identities = {}
+    for path in paths or []:
+        if not path or path in results:
+            continue
+        identity = _file_identity(path)
+        if identity is None:
+            results[path] = None
+            continue
+        info = _memory_get((path,) + identity)
+        if info is not None:
+            results[path] = info
+            continue
+        identities[path] = identity
+
+    for path, info in _load_cached_rows(identities).items():
+        results[path] = info
+        _memory_put((path,) + identities.pop(path), info)
+
+    if not identities:
+        return results
+
+    missing = list(identities.keys())
+    workers = max(1, min(len(missing), int(Config.MEDIA_PROBE_WORKERS or 4)))
+    if workers == 1:
+        probed = [_probe_file(path) for path in missing]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media-probe") as executor:
+            probed = list(executor.map(_probe_file, missing))
+
+    to_store = []
+    for path, info in zip(missing, probed):
+        if info is None:
+            results[path] = None
+            continue
+        size, mtime = identities[path]
+        info["size_bytes"] = size
+        results[path] = info
+        _memory_put((path, size, mtime), info)
+        to_store.append((path, mtime, info))
+    _store_rows(to_store)
+    return results
+
+
+def probe_media(path):
+    return probe_media_batch([path]).get(path)
+
+
+def probe_duration_seconds(path):
+    """Duração em segundos (arredondada); None se não for possível obter."""
+    info = probe_media(path)
+    duration = (info or {}).get("duration")
+    if not duration:
+        return None
+    return int(round(duration))
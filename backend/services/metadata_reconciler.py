@@ -0,0 +1,104 @@
+"""
+Reconciliação periódica de duração/tamanho das gravações.
+
+Roda no scheduler (fora das requisições) e atualiza em lote as gravações em
+andamento ou sem metadados, para que os endpoints de listagem sejam só leitura.
+O status não muda aqui: concluir uma gravação passa pela finalização do
+supervisor ou por recover_orphan_recordings.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_
+
+from app import db
+from config import Config
+from models.gravacao import LOCAL_TZ, Gravacao
+from services.audio_storage_service import resolve_audio_filepath
+from services.media_probe_service import probe_media_batch
+from services.recording_service import hydrate_gravacao_metadata
+from services.websocket_service import broadcast_update
+
+IN_PROGRESS_STATUSES = ("iniciando", "gravando", "processando")
+
+# gravacao_id -> (tamanho, mtime) do arquivo na última passada
+_LAST_SEEN = {}
+_LAST_SEEN_LOCK = threading.Lock()
+
+
+def _file_identity(filepath):
+    try:
+        stat = os.stat(filepath)
+    except (OSError, TypeError):
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+def _candidate_query(now):
+    lookback = now - timedelta(hours=max(1, int(Config.METADATA_RECONCILE_LOOKBACK_HOURS or 72)))
+    missing_metadata = or_(
+        Gravacao.duracao_segundos.is_(None),
+        Gravacao.duracao_segundos <= 0,
+        Gravacao.tamanho_mb.is_(None),
+        Gravacao.tamanho_mb <= 0,
+    )
+    return Gravacao.query.filter(
+        or_(
+            Gravacao.status.in_(IN_PROGRESS_STATUSES),
+            db.and_(
+                missing_metadata,
+                Gravacao.status != "erro",
+                Gravacao.criado_em >= lookback,
+            ),
+        )
+    ).order_by(Gravacao.criado_em.desc())
+
+
+def reconcile_gravacao_metadata(limit=None):
+    """Uma passada do reconciliador; retorna quantas gravações mudaram."""
+    limit = max(1, int(limit or Config.METADATA_RECONCILE_BATCH or 200))
+    now = datetime.now(tz=LOCAL_TZ)
+    gravacoes = _candidate_query(now).limit(limit).all()
+    if not gravacoes:
+        return 0
+
+    filepaths = {gravacao.id: resolve_audio_filepath(gravacao) for gravacao in gravacoes}
+    pending = []
+    with _LAST_SEEN_LOCK:
+        # Só interessa lembrar de quem ainda é candidato
+        for gravacao_id in set(_LAST_SEEN) - set(filepaths):
+            _LAST_SEEN.pop(gravacao_id, None)
+        for gravacao in gravacoes:
+            identity = _file_identity(filepaths[gravacao.id])
+            # Arquivo igual à última passada: nada a fazer
+            if _LAST_SEEN.get(gravacao.id, False) == identity:
+                continue
+            _LAST_SEEN[gravacao.id] = identity
+            pending.append(gravacao)
+    if not pending:
+        return 0
+
+    # Duração dos arquivos que mudaram de uma vez só; o hydrate lê do cache
+    probe_media_batch([
+        filepaths[gravacao.id]
+        for gravacao in pending
+        if (gravacao.duracao_segundos or 0) <= 0 and filepaths[gravacao.id]
+    ])
+
+    changed = []
+    for gravacao in pending:
+        hydrate_gravacao_metadata(gravacao, autocommit=False, check_files=True, update_status=False)
+        if db.session.is_modified(gravacao):
+            changed.append(gravacao)
+    if not changed:
+        db.session.rollback()
+        return 0
+    db.session.commit()
+
+    for gravacao in changed:
+        broadcast_update(f"user_{gravacao.user_id}", "gravacao_updated", gravacao.to_dict())
+    current_app.logger.debug("Reconciliador: %s gravacoes atualizadas", len(changed))
+    return len(changed)
@@ -0,0 +1,195 @@
+"""
+Controle das gravações entre processos (gravacao_processos).
+
+O supervisor é local ao processo que iniciou o ffmpeg. Cada gravação
+supervisionada ganha uma linha com o dono (host:pid) e um heartbeat; uma
+thread de controle por processo renova o heartbeat e atende pedidos de
+parada feitos por outros processos (outro worker do gunicorn, a API com o
+gravador em tools/recording_worker.py). Linha sem heartbeat há mais de
+OWNER_STALE_SECONDS é de processo morto: a gravação é órfã.
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db
+from models.gravacao import Gravacao
+from models.recording_process import RecordingProcess
+
+CONTROL_POLL_SECONDS = 5
+OWNER_STALE_SECONDS = 60
+
+_CONTROL_THREAD = None
+_CONTROL_LOCK = threading.Lock()
+
+_TABLE = RecordingProcess.__table__
+
+
+def get_process_owner_id():
+    # Calculado a cada chamada: o gunicorn faz fork depois de importar o app
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _fresh_since():
+    return func.now() - timedelta(seconds=OWNER_STALE_SECONDS)
+
+
+def claim_recording(gravacao_id, *, pid=None, app_obj=None):
+    """Registra este processo como dono da gravação e liga a thread de controle."""
+    statement = pg_insert(_TABLE).values(
+        gravacao_id=gravacao_id,
+        owner=get_process_owner_id(),
+        pid=pid,
+        parar_solicitado=False,
+        heartbeat_em=func.now(),
+        iniciado_em=func.now(),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[_TABLE.c.gravacao_id],
+        set_={
+            "owner": statement.excluded.owner,
+            "pid": statement.excluded.pid,
+            "parar_solicitado": False,
+            "heartbeat_em": func.now(),
+            "iniciado_em": func.now(),
+        },
+    )
+    try:
+        # Transação própria: não commita a sessão de quem iniciou a gravação
+        with db.engine.begin() as connection:
+            connection.execute(statement)
+    except Exception:
+        current_app.logger.exception("Falha ao registrar dono da gravacao %s", gravacao_id)
+        return False
+    if app_obj is not None:
+        _ensure_control_loop(app_obj)
+    return True
+
+
+def release_recording(gravacao_id, *, any_owner=False):
+    """Remove o registro ao finalizar; any_owner para limpar o de um processo morto."""
+    statement = delete(_TABLE).where(_TABLE.c.gravacao_id == gravacao_id)
+    if not any_owner:
+        statement = statement.where(_TABLE.c.owner == get_process_owner_id())
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(statement)
+    except Exception:
+        pass
+
+
+def get_remote_owner(gravacao_id):
+    """Dono vivo da gravação em outro processo, ou None."""
+    statement = select(_TABLE.c.owner).where(
+        _TABLE.c.gravacao_id == gravacao_id,
+        _TABLE.c.owner != get_process_owner_id(),
+        _TABLE.c.heartbeat_em >= _fresh_since(),
+    )
+    try:
+        with db.engine.connect() as connection:
+            return connection.execute(statement).scalar()
+    except Exception:
+        return None
+
+
+def request_recording_stop(gravacao_id):
+    """Pede a parada ao processo dono; False se nenhum outro processo vivo grava."""
+    statement = (
+        update(_TABLE)
+        .where(
+            _TABLE.c.gravacao_id == gravacao_id,
+            _TABLE.c.owner != get_process_owner_id(),
+            _TABLE.c.heartbeat_em >= _fresh_since(),
+        )
+        .values(parar_solicitado=True)
+    )
+    try:
+        with db.engine.begin() as connection:
+            return connection.execute(statement).rowcount > 0
+    except Exception:
+        current_app.logger.exception("Falha ao pedir parada da gravacao %s", gravacao_id)
+        return False
+
+
+def list_recording_processes():
+    owner = get_process_owner_id()
+    with db.engine.connect() as connection:
+        rows = connection.execute(
+            select(_TABLE, (_TABLE.c.heartbeat_em >= _fresh_since()).label("vivo"))
+            .order_by(_TABLE.c.iniciado_em.asc())
+        ).all()
+    return [
+        {
+            "gravacao_id": row.gravacao_id,
+            "owner": row.owner,
+            "pid": row.pid,
+            "parar_solicitado": row.parar_solicitado,
+            "heartbeat_em": row.heartbeat_em.isoformat() if row.heartbeat_em else None,
+            "iniciado_em": row.iniciado_em.isoformat() if row.iniciado_em else None,
+            "vivo": bool(row.vivo),
+            "local": row.owner == owner,
+        }
+        for row in rows
+    ]
+
+
+def _control_tick():
+    from services.recording_service import stop_local_recording
+    from services.recording_supervisor import get_supervisor_status
+
+    local_ids = [job["gravacao_id"] for job in get_supervisor_status()]
+    if not local_ids:
+        return
+    owner = get_process_owner_id()
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(_TABLE)
+            .where(_TABLE.c.gravacao_id.in_(local_ids), _TABLE.c.owner == owner)
+            .values(heartbeat_em=func.now())
+        )
+        stop_ids = connection.execute(
+            select(_TABLE.c.gravacao_id).where(
+                _TABLE.c.gravacao_id.in_(local_ids),
+                _TABLE.c.owner == owner,
+                _TABLE.c.parar_solicitado.is_(True),
+            )
+        ).scalars().all()
+    for gravacao_id in stop_ids:
+        gravacao = db.session.get(Gravacao, gravacao_id)
+        if gravacao is not None:
+            current_app.logger.info("Parada da gravacao %s pedida por outro processo", gravacao_id)
+            stop_local_recording(gravacao)
+
+
+def _control_loop(app_obj):
+    while True:
+        time.sleep(CONTROL_POLL_SECONDS)
+        try:
+            with app_obj.app_context():
+                try:
+                    _control_tick()
+                finally:
+                    db.session.remove()
+        except Exception:
+            pass
+
+
+def _ensure_control_loop(app_obj):
+    global _CONTROL_THREAD
+    with _CONTROL_LOCK:
+        if _CONTROL_THREAD is not None and _CONTROL_THREAD.is_alive():
+            return
+        _CONTROL_THREAD = threading.Thread(
+            target=_control_loop,
+            args=(app_obj,),
+            name="recording-control",
+            daemon=True,
+        )
+        _CONTROL_THREAD.start()
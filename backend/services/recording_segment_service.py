@@ -0,0 +1,119 @@
+import csv
+import os
+import shutil
+import threading
+
+from config import Config
+
+SEGMENT_MANIFEST_NAME = "manifest.csv"
+SEGMENT_FILENAME_PREFIX = "seg_"
+SEGMENT_MUXERS = {"mp3": "mp3", "opus": "ogg", "flac": "flac"}
+
+
+def get_segment_seconds():
+    try:
+        return max(0, int(Config.RECORDING_SEGMENT_SECONDS or 0))
+    except Exception:
+        return 0
+
+
+def get_segments_dir(gravacao_id, *, storage_path=None):
+    if not gravacao_id:
+        return None
+    base_path = storage_path or Config.STORAGE_PATH
+    return os.path.join(base_path, "segments", os.path.basename(str(gravacao_id)))
+
+
+def get_segment_manifest_path(gravacao_id, *, storage_path=None):
+    segments_dir = get_segments_dir(gravacao_id, storage_path=storage_path)
+    if not segments_dir:
+        return None
+    return os.path.join(segments_dir, SEGMENT_MANIFEST_NAME)
+
+
+def build_segment_url(gravacao_id, filename):
+    return f"/api/files/segments/{gravacao_id}/{filename}"
+
+
+def build_segmented_output_args(filepath, gravacao_id, *, output_format, segment_seconds):
+    """
+    Saída via muxer tee: o áudio é codificado uma vez e gravado tanto no arquivo
+    completo quanto em segmentos de duração fixa com manifesto CSV, que o ffmpeg
+    só atualiza quando cada segmento é fechado.
+    """
+    segments_dir = get_segments_dir(gravacao_id)
+    os.makedirs(segments_dir, exist_ok=True)
+    muxer = SEGMENT_MUXERS.get(output_format, "mp3")
+    pattern = os.path.join(segments_dir, f"{SEGMENT_FILENAME_PREFIX}%05d.{output_format}")
+    manifest_path = get_segment_manifest_path(gravacao_id)
+    segment_slave = (
+        f"[f=segment:segment_time={int(segment_seconds)}:segment_format={muxer}"
+        f":segment_list={manifest_path}:segment_list_type=csv:reset_timestamps=1]{pattern}"
+    )
+    return ["-f", "tee", f"[f={muxer}]{filepath}|{segment_slave}"]
+
+
+def read_segment_manifest(gravacao_id, *, storage_path=None):
+    manifest_path = get_segment_manifest_path(gravacao_id, storage_path=storage_path)
+    if not manifest_path or not os.path.exists(manifest_path):
+        return []
+    segments_dir = os.path.dirname(manifest_path)
+    segments = []
+    try:
+        with open(manifest_path, "r", encoding="utf-8", newline="") as fp:
+            for row in csv.reader(fp):
+                if len(row) < 3:
+                    continue
+                filename = os.path.basename(row[0].strip())
+                try:
+                    start = float(row[1])
+                    end = float(row[2])
+                except (TypeError, ValueError):
+                    continue
+                if not filename or not os.path.exists(os.path.join(segments_dir, filename)):
+                    continue
+                segments.append({
+                    "index": len(segments),
+                    "filename": filename,
+                    "start": start,
+                    "end": end,
+                    "url": build_segment_url(gravacao_id, filename),
+                })
+    except Exception:
+        return []
+    return segments
+
+
+def get_segment_filepath(gravacao_id, filename, *, storage_path=None):
+    segments_dir = get_segments_dir(gravacao_id, storage_path=storage_path)
+    name = os.path.basename(str(filename or "").strip())
+    if not segments_dir or not name or name == SEGMENT_MANIFEST_NAME:
+        return None
+    return os.path.join(segments_dir, name)
+
+
+def remove_segments(gravacao_id, *, storage_path=None):
+    segments_dir = get_segments_dir(gravacao_id, storage_path=storage_path)
+    if not segments_dir or not os.path.isdir(segments_dir):
+        return
+    shutil.rmtree(segments_dir, ignore_errors=True)
+
+
+class SegmentWatcher:
+    """Entrega ao callback apenas os segmentos concluídos desde a última leitura."""
+
+    def __init__(self, gravacao_id, on_segments):
+        self.gravacao_id = gravacao_id
+        self.on_segments = on_segments
+        self._seen = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            segments = read_segment_manifest(self.gravacao_id)
+            new_segments = segments[self._seen:]
+            if not new_segments:
+                return []
+            self._seen = len(segments)
+        self.on_segments(new_segments)
+        return new_segments
@@ -3,7 +3,6 @@ import subprocess
 import threading
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from typing import Dict
 
 import requests
 
@@ -12,15 +11,34 @@ from app import db
 from config import Config
 from models.gravacao import Gravacao
 from models.radio import Radio
-from services.audio_storage_service import resolve_audio_filepath, write_dropbox_marker
+from services.audio_location_service import record_audio_location
+from services.audio_storage_service import resolve_audio_filepath
+from services.media_probe_service import probe_duration_seconds
+from services.recording_control_service import (
+    claim_recording,
+    get_remote_owner,
+    release_recording,
+    request_recording_stop,
+)
+from services.recording_segment_service import (
+    SegmentWatcher,
+    build_segmented_output_args,
+    get_segment_seconds,
+    remove_segments,
+)
+from services.recording_supervisor import (
+    is_recording_active,
+    stop_supervised_recording,
+    supervise_recording,
+)
 from services.websocket_service import broadcast_update
 
 LOCAL_TZ = ZoneInfo("America/Fortaleza")
 MIN_RECORD_SECONDS = 10  # evita gravação zero em caso de input faltando
+ORPHAN_MIN_DURATION_RATIO = 0.9  # órfã com menos que isso do previsto foi truncada
 ALLOWED_BITRATES = {96, 128}
 ALLOWED_FORMATS = {'mp3', 'opus', 'flac'}
 ALLOWED_AUDIO_MODES = {'mono', 'stereo'}
-ACTIVE_PROCESSES: Dict[str, subprocess.Popen] = {}
 
 def _safe_session_remove(app_obj=None):
     """Fecha a sessão do SQLAlchemy com contexto ativo."""
@@ -133,29 +151,6 @@ def _get_audio_filepath(gravacao):
     return resolve_audio_filepath(gravacao)
 
 
-def _probe_duration_seconds(filepath):
-    """Obtém duração real via ffprobe; retorna None se falhar."""
-    if not filepath or not os.path.exists(filepath):
-        return None
-    try:
-        out = subprocess.check_output(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-show_entries",
-                "format=duration",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                filepath,
-            ],
-            stderr=subprocess.STDOUT,
-        )
-        return int(round(float(out.strip())))
-    except Exception:
-        return None
-
-
 def _file_size_mb(filepath):
     """Obtém tamanho do arquivo em MB (duas casas)."""
     if not filepath or not os.path.exists(filepath):
@@ -166,12 +161,15 @@ def _file_size_mb(filepath):
         return None
 
 
-def hydrate_gravacao_metadata(gravacao, *, autocommit=False, check_files=True):
+def hydrate_gravacao_metadata(gravacao, *, autocommit=False, check_files=True, update_status=True):
     """
     Garante que duração, tamanho e status estejam consistentes com o arquivo físico.
     - Lê o arquivo em disco (se existir) para preencher duracao_segundos/minutos e tamanho_mb.
     - Se o tempo previsto já passou e ainda está marcado como gravando/iniciando, marca como concluído.
     - check_files=False evita I/O de disco/ffprobe (útil para listas/estatísticas).
+    - update_status=False só preenche duração/tamanho: a mudança de status fica com a
+      finalização do supervisor e com recover_orphan_recordings (upload, transcrição,
+      checagem de arquivo truncado).
     Retorna o objeto (já ajustado).
     """
     if not gravacao:
@@ -190,7 +188,7 @@ def hydrate_gravacao_metadata(gravacao, *, autocommit=False, check_files=True):
     # Duração real (evita ffprobe se já existe duração salva)
     real_duration = None
     if check_files and (gravacao.duracao_segundos or 0) <= 0:
-        real_duration = _probe_duration_seconds(filepath)
+        real_duration = probe_duration_seconds(filepath)
         if real_duration:
             gravacao.duracao_segundos = real_duration
             gravacao.duracao_minutos = max(1, round(real_duration / 60))
@@ -202,7 +200,7 @@ def hydrate_gravacao_metadata(gravacao, *, autocommit=False, check_files=True):
     )
     if expected_duration <= 0:
         expected_duration = MIN_RECORD_SECONDS
-    if gravacao.criado_em and gravacao.status in ("iniciando", "gravando"):
+    if update_status and gravacao.criado_em and gravacao.status in ("iniciando", "gravando"):
         try:
             expected_end = gravacao.criado_em + timedelta(seconds=expected_duration + 5)
             now = datetime.now(tz=gravacao.criado_em.tzinfo or LOCAL_TZ)
@@ -228,7 +226,7 @@ def _finalizar_gravacao(gravacao, status, filepath=None, duration_seconds=None,
         pass
 
     # Preferir duração real do arquivo, se existir
-    real_duration = _probe_duration_seconds(filepath) or duration_seconds
+    real_duration = probe_duration_seconds(filepath) or duration_seconds
     if real_duration:
         gravacao.duracao_segundos = real_duration
         gravacao.duracao_minutos = max(1, round(real_duration / 60))
@@ -258,10 +256,12 @@ def _finalizar_gravacao(gravacao, status, filepath=None, duration_seconds=None,
         except Exception:
             pass
 
-    # Arquivar para Dropbox (opcional). Mantém URLs iguais (/api/files/audio/<arquivo>)
+    # Arquivar para Dropbox (opcional). Mantém URLs iguais (/api/files/audio/<arquivo>).
+    # Só enfileira: o envio fica com os workers de dropbox_upload_service.
     try:
         if status == 'concluido':
-            from services.dropbox_service import build_audio_destination, get_dropbox_config, upload_file
+            from services.dropbox_service import get_dropbox_config
+            from services.dropbox_upload_service import enqueue_dropbox_upload, start_dropbox_upload_workers
 
             dropbox_cfg = get_dropbox_config()
             if (
@@ -270,42 +270,95 @@ def _finalizar_gravacao(gravacao, status, filepath=None, duration_seconds=None,
                 and filepath
                 and os.path.exists(filepath)
             ):
-                radio_obj = None
-                try:
-                    radio_obj = Radio.query.get(gravacao.radio_id)
-                except Exception:
-                    radio_obj = None
-
-                remote_path, _ = build_audio_destination(
-                    gravacao,
-                    radio=radio_obj,
-                    original_filename=os.path.basename(filepath),
-                    base_path=dropbox_cfg.audio_path,
+                enqueue_dropbox_upload(
+                    gravacao.id,
+                    filepath,
+                    delete_local=dropbox_cfg.delete_local_after_upload,
                 )
-                upload_file(filepath, remote_path, token=dropbox_cfg.access_token)
-
-                should_delete_local = dropbox_cfg.delete_local_after_upload and dropbox_cfg.local_retention_days <= 0
-                if Config.TRANSCRIBE_ENABLED and gravacao.transcricao_status != 'concluido':
-                    should_delete_local = False
-
-                if not should_delete_local:
-                    try:
-                        write_dropbox_marker(filepath, remote_path)
-                    except Exception:
-                        pass
-
-                if should_delete_local:
-                    try:
-                        os.remove(filepath)
-                    except Exception:
-                        pass
+                start_dropbox_upload_workers()
     except Exception as exc:
         try:
-            current_app.logger.exception(f"Falha ao arquivar gravação no Dropbox: {exc}")
+            current_app.logger.exception(f"Falha ao enfileirar gravação para o Dropbox: {exc}")
         except Exception:
             pass
 
 
+def _build_direct_input_args(stream_url):
+    """Comando ffmpeg que lê o stream diretamente (um pull por gravação)."""
+    ffmpeg_cmd = [
+        'ffmpeg',
+        '-hide_banner',
+        '-loglevel',
+        'error',
+        '-nostdin',
+        '-y',
+    ]
+    if Config.FFMPEG_THREADS and Config.FFMPEG_THREADS > 0:
+        ffmpeg_cmd += ['-threads', str(Config.FFMPEG_THREADS)]
+    if str(stream_url).lower().startswith(('http://', 'https://')):
+        ffmpeg_cmd += [
+            '-reconnect',
+            '1',
+            '-reconnect_streamed',
+            '1',
+            '-reconnect_delay_max',
+            '5',
+            '-user_agent',
+            'Mozilla/5.0',
+        ]
+    ffmpeg_cmd += ['-i', stream_url]
+    return ffmpeg_cmd
+
+
+def _build_output_args(
+    filepath,
+    *,
+    output_format,
+    bitrate_kbps,
+    channels,
+    duration_seconds,
+    gravacao_id=None,
+    segment_seconds=0,
+):
+    """Argumentos de saída (duração, codec e arquivo) comuns aos dois modos de captura."""
+    output_args = ['-t', str(duration_seconds), '-ac', str(channels)]
+    if output_format == 'opus':
+        output_args += ['-c:a', 'libopus', '-b:a', f'{bitrate_kbps}k', '-vbr', 'on']
+    elif output_format == 'flac':
+        output_args += ['-c:a', 'flac', '-compression_level', '5']
+    else:
+        output_args += ['-acodec', 'libmp3lame', '-b:a', f'{bitrate_kbps}k']
+    if segment_seconds and gravacao_id:
+        output_args = ['-map', '0:a'] + output_args + build_segmented_output_args(
+            filepath,
+            gravacao_id,
+            output_format=output_format,
+            segment_seconds=segment_seconds,
+        )
+    else:
+        output_args.append(filepath)
+    return output_args
+
+
+def _build_segment_listener(gravacao_id, user_id, app_obj):
+    """Publica segmentos concluídos enquanto a gravação ainda está em andamento."""
+
+    def on_segments(segments):
+        ctx = app_obj.app_context() if app_obj else None
+        if ctx:
+            ctx.push()
+        try:
+            broadcast_update(f'user_{user_id}', 'gravacao_segments', {
+                'gravacao_id': gravacao_id,
+                'segments': segments,
+            })
+        finally:
+            if ctx:
+                ctx.pop()
+
+    return SegmentWatcher(gravacao_id, on_segments)
+
+
 def start_recording(gravacao, *, duration_seconds=None, agendamento=None, block=False):
     """Inicia gravação de um stream de rádio.
 
@@ -361,55 +414,37 @@ def start_recording(gravacao, *, duration_seconds=None, agendamento=None, block=
     gravacao.arquivo_nome = filename
     gravacao.arquivo_url = f"/api/files/audio/{filename}"
     db.session.commit()
+    record_audio_location(gravacao.id, filename=filename, dropbox_path=None, marker=False)
 
     # Guardar stderr para inspecionar falhas do ffmpeg (evita arquivo 0 bytes silencioso)
     ffmpeg_process = None
+    segment_seconds = get_segment_seconds()
+    output_args = _build_output_args(
+        filepath,
+        output_format=output_format,
+        bitrate_kbps=bitrate_kbps,
+        channels=channels,
+        duration_seconds=duration_seconds,
+        gravacao_id=gravacao.id,
+        segment_seconds=segment_seconds,
+    )
     try:
-        stream_url = radio.stream_url
-        ffmpeg_cmd = [
-            'ffmpeg',
-            '-hide_banner',
-            '-loglevel',
-            'error',
-            '-nostdin',
-            '-y',
-        ]
-        if Config.FFMPEG_THREADS and Config.FFMPEG_THREADS > 0:
-            ffmpeg_cmd += ['-threads', str(Config.FFMPEG_THREADS)]
-        if str(stream_url).lower().startswith(('http://', 'https://')):
-            ffmpeg_cmd += [
-                '-reconnect',
-                '1',
-                '-reconnect_streamed',
-                '1',
-                '-reconnect_delay_max',
-                '5',
-                '-user_agent',
-                'Mozilla/5.0',
-            ]
-        ffmpeg_cmd += [
-            '-i',
-            stream_url,
-            '-t',
-            str(duration_seconds),
-        ]
-
-        ffmpeg_cmd += ['-ac', str(channels)]
-        if output_format == 'opus':
-            ffmpeg_cmd += ['-c:a', 'libopus', '-b:a', f'{bitrate_kbps}k', '-vbr', 'on']
-        elif output_format == 'flac':
-            ffmpeg_cmd += ['-c:a', 'flac', '-compression_level', '5']
+        if Config.RECORDING_SHARED_INGEST:
+            from services.stream_ingest_service import attach_recording
+
+            # Um único pull/decodificação por rádio, distribuído entre gravações simultâneas.
+            ffmpeg_process = attach_recording(
+                radio,
+                gravacao.id,
+                output_args,
+                duration_seconds=duration_seconds,
+            )
         else:
-            ffmpeg_cmd += ['-acodec', 'libmp3lame', '-b:a', f'{bitrate_kbps}k']
-
-        ffmpeg_cmd.append(filepath)
-
-        ffmpeg_process = subprocess.Popen(
-            ffmpeg_cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.PIPE,
-        )
-        ACTIVE_PROCESSES[gravacao.id] = ffmpeg_process
+            ffmpeg_process = subprocess.Popen(
+                _build_direct_input_args(radio.stream_url) + output_args,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
     except Exception as exc:
         _finalizar_gravacao(gravacao, 'erro', filepath, duration_seconds, agendamento)
         raise exc
@@ -421,45 +456,54 @@ def start_recording(gravacao, *, duration_seconds=None, agendamento=None, block=
     except Exception:
         app_obj = None
 
-    def wait_and_finalize():
+    if Config.RECORDING_SHARED_INGEST and Config.TRANSCRIBE_LIVE_ENABLED:
+        from services.live_transcription_service import start_live_transcription
+
+        start_live_transcription(radio, gravacao, duration_seconds=duration_seconds, app_obj=app_obj)
+
+    gravacao_id = gravacao.id
+    agendamento_id = getattr(agendamento, 'id', None)
+    finalized = threading.Event()
+
+    def finalize(return_code, timed_out, stderr_output, stop_requested=False):
         if app_obj:
             ctx = app_obj.app_context()
             ctx.push()
         else:
             ctx = None
+        # Recarrega na sessão desta thread; a instância original pertence à requisição.
+        gravacao_obj = gravacao
+        agendamento_obj = agendamento
         try:
-            # Timeout de segurança: duração solicitada + 20s
-            try:
-                return_code = ffmpeg_process.wait(timeout=duration_seconds + 20)
-                timed_out = False
-            except subprocess.TimeoutExpired:
-                ffmpeg_process.terminate()
-                return_code = -1
-                timed_out = True
-            stderr_output = b''
             try:
-                if ffmpeg_process.stderr:
-                    stderr_output = ffmpeg_process.stderr.read()
+                gravacao_obj = Gravacao.query.get(gravacao_id) or gravacao
+                if agendamento_id:
+                    from models.agendamento import Agendamento
+
+                    agendamento_obj = Agendamento.query.get(agendamento_id) or agendamento
             except Exception:
                 pass
 
             file_exists = filepath and os.path.exists(filepath)
             file_size = os.path.getsize(filepath) if file_exists else 0
-            real_duration = _probe_duration_seconds(filepath)
+            real_duration = probe_duration_seconds(filepath)
             min_seconds = min(duration_seconds, MIN_RECORD_SECONDS)
             expected_bytes = int((bitrate_kbps * 1000 / 8) * min_seconds)
             min_ok_bytes = max(8 * 1024, int(expected_bytes * 0.1))
             duration_ok = real_duration is not None and real_duration >= MIN_RECORD_SECONDS
             file_ok = file_exists and (duration_ok or (real_duration is None and file_size >= min_ok_bytes))
 
-            if return_code == 0 and file_ok:
-                _finalizar_gravacao(gravacao, 'concluido', filepath, duration_seconds, agendamento)
+            # Parada manual encerra o ffmpeg por sinal; o arquivo parcial é válido.
+            if (return_code == 0 or stop_requested) and file_ok:
+                _finalizar_gravacao(gravacao_obj, 'concluido', filepath, duration_seconds, agendamento_obj)
+                if segment_seconds and not Config.RECORDING_SEGMENT_KEEP:
+                    remove_segments(gravacao_id)
             else:
                 # Logar erro para depurar streams que nÇ¬o gravam
                 msg = (
-                    f"ffmpeg failed for gravacao {gravacao.id} "
+                    f"ffmpeg failed for gravacao {gravacao_id} "
                     f"(return_code={return_code}, exists={file_exists}, size={file_size}, "
-                    f"duration={real_duration}, timed_out={timed_out})"
+                    f"duration={real_duration}, timed_out={timed_out}, stopped={stop_requested})"
                 )
                 try:
                     if stderr_output:
@@ -467,69 +511,107 @@ def start_recording(gravacao, *, duration_seconds=None, agendamento=None, block=
                     current_app.logger.error(msg)
                 except Exception:
                     pass
-                _finalizar_gravacao(gravacao, 'erro', filepath, duration_seconds, agendamento)
+                _finalizar_gravacao(gravacao_obj, 'erro', filepath, duration_seconds, agendamento_obj)
         except Exception:
-            _finalizar_gravacao(gravacao, 'erro', filepath, duration_seconds, agendamento)
+            _finalizar_gravacao(gravacao_obj, 'erro', filepath, duration_seconds, agendamento_obj)
         finally:
-            ACTIVE_PROCESSES.pop(gravacao.id, None)
+            release_recording(gravacao_id)
             if ctx:
                 ctx.pop()
             _safe_session_remove(app_obj)
+            finalized.set()
+
+    # Registrado antes do supervisor para que o finalize sempre remova o registro;
+    # outros processos pedem a parada por aqui e não tratam a gravação como órfã.
+    claim_recording(gravacao_id, pid=getattr(ffmpeg_process, 'pid', None), app_obj=app_obj)
+
+    # Timeout de segurança: duração solicitada + 20s
+    supervise_recording(
+        gravacao_id,
+        ffmpeg_process,
+        timeout_seconds=duration_seconds + 20,
+        on_exit=finalize,
+        on_tick=_build_segment_listener(gravacao_id, gravacao.user_id, app_obj) if segment_seconds else None,
+        tick_seconds=Config.RECORDING_SEGMENT_POLL_SECONDS,
+    )
 
     if block:
-        wait_and_finalize()
-    else:
-        threading.Thread(target=wait_and_finalize, daemon=True).start()
+        finalized.wait()
 
     return ffmpeg_process
 
 
+def stop_local_recording(gravacao):
+    """Para a gravação supervisionada neste processo; False se ela não roda aqui."""
+    if not is_recording_active(gravacao.id):
+        return False
+    if Config.RECORDING_SHARED_INGEST:
+        # Fechar o stdin do encoder finaliza o arquivo normalmente.
+        from services.live_transcription_service import stop_live_transcription
+        from services.stream_ingest_service import detach_sink
+
+        detach_sink(gravacao.radio_id, gravacao.id)
+        stop_live_transcription(gravacao.radio_id, gravacao.id)
+    # O supervisor finaliza (status, upload, transcrição) quando o ffmpeg sair.
+    return stop_supervised_recording(gravacao.id)
+
+
 def stop_recording(gravacao):
-    """Para gravação em andamento manualmente."""
-    filepath = _get_audio_filepath(gravacao)
+    """Para gravação em andamento manualmente, em qualquer processo."""
+    if stop_local_recording(gravacao):
+        return
+    if request_recording_stop(gravacao.id):
+        # O ffmpeg roda em outro processo: o dono para e finaliza pelo supervisor dele.
+        return
 
-    proc = ACTIVE_PROCESSES.pop(gravacao.id, None)
-    if proc:
-        try:
-            proc.terminate()
-        except Exception:
-            pass
+    # Sem dono vivo: gravação órfã, finalizada aqui.
+    _finalizar_gravacao(gravacao, 'concluido', filepath=_get_audio_filepath(gravacao))
+    release_recording(gravacao.id, any_owner=True)
 
-    _finalizar_gravacao(gravacao, 'concluido', filepath=filepath)
 
 
+def recover_orphan_recordings():
+    """
+    Finaliza gravações que ficaram em 'gravando' sem processo supervisionado
+    (ex.: worker reiniciado no meio da gravação) depois do fim previsto, para
+    que status, upload e transcrição sigam o caminho normal.
+    """
+    recovered = 0
+    gravacoes = Gravacao.query.filter(Gravacao.status.in_(('iniciando', 'gravando'))).all()
+    for gravacao in gravacoes:
+        if is_recording_active(gravacao.id) or not gravacao.criado_em:
+            continue
+        if get_remote_owner(gravacao.id):
+            # Supervisionada por outro processo vivo (heartbeat recente)
+            continue
+        expected_duration = gravacao.duracao_segundos or ((gravacao.duracao_minutos or 0) * 60)
+        try:
+            expected_end = gravacao.criado_em + timedelta(seconds=max(expected_duration, MIN_RECORD_SECONDS) + 30)
+            if datetime.now(tz=gravacao.criado_em.tzinfo or LOCAL_TZ) < expected_end:
+                continue
+        except Exception:
+            continue
+        filepath = _get_audio_filepath(gravacao)
+        file_ok = bool(filepath and os.path.exists(filepath) and os.path.getsize(filepath) >= 8 * 1024)
+        if file_ok and expected_duration > 0:
+            # Encoder morto no meio (worker reciclado): arquivo curto não é gravação concluída
+            real_duration = probe_duration_seconds(filepath) or 0
+            file_ok = real_duration >= expected_duration * ORPHAN_MIN_DURATION_RATIO
+            if not file_ok:
+                current_app.logger.warning(
+                    f"Gravacao orfa {gravacao.id} truncada: {real_duration:.0f}s de {expected_duration}s previstos"
+                )
+        _finalizar_gravacao(gravacao, 'concluido' if file_ok else 'erro', filepath)
+        release_recording(gravacao.id, any_owner=True)
+        recovered += 1
+    return recovered
+
 
 def process_audio_with_ai(gravacao, palavras_chave):
-    """Processa áudio com IA para gerar clipes"""
-    from models.clip import Clip
-    
-    # Atualizar status
-    gravacao.status = 'processando'
-    db.session.commit()
-    
-    # Exemplo: criar clipes baseados em palavras-chave
-    clips = []
-    for palavra in palavras_chave:
-        # Mock: criar clipe de exemplo
-        clip = Clip(
-            gravacao_id=gravacao.id,
-            palavra_chave=palavra,
-            inicio_segundos=0,
-            fim_segundos=30,
-            arquivo_url=None  # Será gerado pelo processamento
-        )
-        db.session.add(clip)
-        clips.append(clip)
-    
-    db.session.commit()
-    
-    gravacao.status = 'concluido'
-    db.session.commit()
-    
-    # Broadcast update
-    broadcast_update(f'user_{gravacao.user_id}', 'gravacao_processed', {
-        'gravacao': gravacao.to_dict(),
-        'clips': [c.to_dict() for c in clips]
-    })
-    
-    return {'clips_created': len(clips)}
+    """Agenda a geração dos clipes das palavras-chave a partir da transcrição."""
+    from services.clip_service import enqueue_clip_extraction
+
+    if gravacao.transcricao_status != 'concluido':
+        raise ValueError('Transcricao ainda nao concluida para esta gravacao')
+    queued = enqueue_clip_extraction(gravacao.id, palavras_chave)
+    return {'keywords_queued': queued}
@@ -0,0 +1,273 @@
+import os
+import selectors
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from config import Config
+
+STDERR_MAX_BYTES = 64 * 1024
+KILL_GRACE_SECONDS = 10
+LOOP_TICK_SECONDS = 1.0
+
+
+class RecordingJob:
+    def __init__(self, gravacao_id, process, *, timeout_seconds, on_exit, on_tick=None, tick_seconds=None):
+        self.gravacao_id = gravacao_id
+        self.process = process
+        self.started_at = time.time()
+        self.deadline = self.started_at + max(1, int(timeout_seconds or 0))
+        self.on_exit = on_exit
+        self.stderr = bytearray()
+        self.timed_out = False
+        self.stop_requested = False
+        self.terminated_at = None
+        self.on_tick = on_tick
+        self.tick_seconds = max(1, int(tick_seconds or 5))
+        self.next_tick_at = self.started_at + self.tick_seconds
+        self.tick_pending = False
+
+    def to_dict(self):
+        return {
+            "gravacao_id": self.gravacao_id,
+            "pid": getattr(self.process, "pid", None),
+            "elapsed_seconds": int(time.time() - self.started_at),
+            "remaining_seconds": max(0, int(self.deadline - time.time())),
+            "stop_requested": self.stop_requested,
+            "timed_out": self.timed_out,
+        }
+
+
+class RecordingSupervisor:
+    """Dono único dos processos ffmpeg de gravação.
+
+    Um só loop (selectors) drena o stderr de todos os filhos, reaproveita os
+    processos encerrados e aplica o timeout de segurança; a finalização
+    (ffprobe, banco, Dropbox) roda num pool pequeno para não travar o loop.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, RecordingJob] = {}
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread: Optional[threading.Thread] = None
+        self._finalizers = ThreadPoolExecutor(
+            max_workers=max(1, int(Config.RECORDING_FINALIZE_WORKERS or 4)),
+            thread_name_prefix="recording-finalize",
+        )
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="recording-supervisor", daemon=True)
+            self._thread.start()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def register(
+        self,
+        gravacao_id,
+        process,
+        *,
+        timeout_seconds,
+        on_exit: Callable,
+        on_tick: Optional[Callable] = None,
+        tick_seconds=None,
+    ):
+        job = RecordingJob(
+            gravacao_id,
+            process,
+            timeout_seconds=timeout_seconds,
+            on_exit=on_exit,
+            on_tick=on_tick,
+            tick_seconds=tick_seconds,
+        )
+        with self._lock:
+            previous = self._jobs.get(gravacao_id)
+            self._jobs[gravacao_id] = job
+            stderr = getattr(process, "stderr", None)
+            if stderr is not None:
+                try:
+                    os.set_blocking(stderr.fileno(), False)
+                    self._selector.register(stderr, selectors.EVENT_READ, job)
+                except Exception:
+                    pass
+        if previous is not None and previous.process.poll() is None:
+            self._terminate(previous)
+        self._ensure_loop()
+        self._wake()
+        return job
+
+    def stop(self, gravacao_id):
+        """Encerra a gravação; a finalização segue pelo caminho normal do loop."""
+        with self._lock:
+            job = self._jobs.get(gravacao_id)
+        if job is None:
+            return False
+        job.stop_requested = True
+        self._terminate(job)
+        self._wake()
+        return True
+
+    def is_active(self, gravacao_id):
+        with self._lock:
+            return gravacao_id in self._jobs
+
+    def status(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs]
+
+    def _terminate(self, job):
+        if job.terminated_at is not None:
+            return
+        job.terminated_at = time.time()
+        try:
+            if job.process.poll() is None:
+                job.process.terminate()
+        except Exception:
+            pass
+
+    def _drain(self, job, fileobj):
+        try:
+            data = os.read(fileobj.fileno(), 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            with self._lock:
+                try:
+                    self._selector.unregister(fileobj)
+                except Exception:
+                    pass
+            return
+        job.stderr.extend(data)
+        if len(job.stderr) > STDERR_MAX_BYTES:
+            del job.stderr[: len(job.stderr) - STDERR_MAX_BYTES]
+
+    def _loop(self):
+        while True:
+            try:
+                events = self._selector.select(timeout=LOOP_TICK_SECONDS)
+            except Exception:
+                events = []
+                time.sleep(LOOP_TICK_SECONDS)
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        while os.read(self._wake_r, 512):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                self._drain(key.data, key.fileobj)
+            self._reap()
+
+    def _reap(self):
+        now = time.time()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            return_code = job.process.poll()
+            if return_code is None:
+                if now >= job.deadline and job.terminated_at is None:
+                    job.timed_out = True
+                    self._terminate(job)
+                elif job.terminated_at is not None and now - job.terminated_at >= KILL_GRACE_SECONDS:
+                    try:
+                        job.process.kill()
+                    except Exception:
+                        pass
+                elif job.on_tick is not None and now >= job.next_tick_at and not job.tick_pending:
+                    job.next_tick_at = now + job.tick_seconds
+                    job.tick_pending = True
+                    self._finalizers.submit(self._run_tick, job)
+                continue
+            with self._lock:
+                if self._jobs.get(job.gravacao_id) is job:
+                    self._jobs.pop(job.gravacao_id, None)
+                stderr = getattr(job.process, "stderr", None)
+                if stderr is not None:
+                    try:
+                        self._selector.unregister(stderr)
+                    except Exception:
+                        pass
+            if stderr is not None:
+                try:
+                    while True:
+                        remaining = os.read(stderr.fileno(), 4096)
+                        if not remaining:
+                            break
+                        job.stderr.extend(remaining)
+                except (BlockingIOError, OSError):
+                    pass
+                if len(job.stderr) > STDERR_MAX_BYTES:
+                    del job.stderr[: len(job.stderr) - STDERR_MAX_BYTES]
+                try:
+                    stderr.close()
+                except Exception:
+                    pass
+            return_code = -1 if job.timed_out else return_code
+            self._finalizers.submit(
+                job.on_exit,
+                return_code,
+                job.timed_out,
+                bytes(job.stderr),
+                job.stop_requested,
+            )
+
+    def _run_tick(self, job):
+        try:
+            job.on_tick()
+        except Exception:
+            pass
+        finally:
+            job.tick_pending = False
+
+
+_SUPERVISOR: Optional[RecordingSupervisor] = None
+_SUPERVISOR_LOCK = threading.Lock()
+
+
+def get_supervisor() -> RecordingSupervisor:
+    global _SUPERVISOR
+    if _SUPERVISOR is not None:
+        return _SUPERVISOR
+    with _SUPERVISOR_LOCK:
+        if _SUPERVISOR is None:
+            _SUPERVISOR = RecordingSupervisor()
+    return _SUPERVISOR
+
+
+def supervise_recording(gravacao_id, process, *, timeout_seconds, on_exit, on_tick=None, tick_seconds=None):
+    return get_supervisor().register(
+        gravacao_id,
+        process,
+        timeout_seconds=timeout_seconds,
+        on_exit=on_exit,
+        on_tick=on_tick,
+        tick_seconds=tick_seconds,
+    )
+
+
+def stop_supervised_recording(gravacao_id):
+    return get_supervisor().stop(gravacao_id)
+
+
+def is_recording_active(gravacao_id):
+    return get_supervisor().is_active(gravacao_id)
+
+
+def get_supervisor_status():
+    return get_supervisor().status()
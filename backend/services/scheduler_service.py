@@ -11,15 +11,17 @@ from flask import current_app, has_app_context
 from app import db
 from config import Config
 from models.agendamento import Agendamento
+from models.dropbox_upload import DROPBOX_UPLOAD_ACTIVE_STATUSES, DropboxUpload
 from models.gravacao import Gravacao
 from models.radio import Radio
+from services.audio_location_service import forget_local_audio
 from services.audio_storage_service import (
     get_dropbox_marker_path,
     resolve_audio_filepath,
-    write_dropbox_marker,
 )
-from services.dropbox_service import build_audio_destination, get_dropbox_config, upload_file
-from services.recording_service import start_recording, validate_stream_url
+from services.dropbox_service import get_dropbox_config
+from services.dropbox_upload_service import enqueue_dropbox_upload, start_dropbox_upload_workers
+from services.recording_service import recover_orphan_recordings, start_recording, validate_stream_url
 from services.websocket_service import broadcast_update
 
 LOCAL_TZ = ZoneInfo("America/Fortaleza")
@@ -74,17 +76,41 @@ def init_scheduler(app=None):
             agendamentos = Agendamento.query.filter_by(status='agendado').all()
             for agendamento in agendamentos:
                 schedule_agendamento(agendamento)
-            if app_obj.config.get("TRANSCRIBE_ENABLED") and app_obj.config.get("TRANSCRIBE_RECOVERY_ENABLED", True):
-                recover_pending_transcriptions_job()
+            if app_obj.config.get("TRANSCRIBE_ENABLED") and app_obj.config.get("TRANSCRIBE_WORKER_ENABLED", True):
+                start_transcription_workers_job()
+            # Gravações que ficaram em fila/processando sem job (sessão ao vivo ou worker perdidos)
+            if app_obj.config.get("TRANSCRIBE_ENABLED"):
                 scheduler.add_job(
-                    recover_pending_transcriptions_job,
-                    IntervalTrigger(
-                        seconds=max(
-                            15,
-                            int(app_obj.config.get("TRANSCRIBE_RECOVERY_INTERVAL_SECONDS") or 45),
-                        )
-                    ),
-                    id="transcribe_recovery",
+                    backfill_transcription_jobs_job,
+                    IntervalTrigger(minutes=5),
+                    id="transcription_backfill",
+                    replace_existing=True,
+                )
+            # Envios ao Dropbox pendentes (inclusive de antes do restart) seguem pela fila
+            if app_obj.config.get("DROPBOX_UPLOAD_ENABLED"):
+                start_dropbox_upload_workers(app_obj)
+            # Gravações órfãs (processo perdido com o worker) seguem para finalização normal
+            recover_orphan_recordings_job()
+            scheduler.add_job(
+                recover_orphan_recordings_job,
+                IntervalTrigger(minutes=5),
+                id="recording_orphans",
+                replace_existing=True,
+            )
+            # Duração/tamanho/status das gravações em andamento, fora das requisições de listagem
+            if app_obj.config.get("METADATA_RECONCILE_ENABLED", True):
+                scheduler.add_job(
+                    reconcile_gravacao_metadata_job,
+                    IntervalTrigger(seconds=max(5, int(app_obj.config.get("METADATA_RECONCILE_SECONDS") or 30))),
+                    id="gravacao_metadata_reconcile",
+                    replace_existing=True,
+                )
+            # Entrega dos alertas de palavra-chave ao webhook (fila em alertas_webhook)
+            if app_obj.config.get("ALERTS_ENABLED") and app_obj.config.get("ALERT_WEBHOOK_URL"):
+                scheduler.add_job(
+                    deliver_alert_webhooks_job,
+                    IntervalTrigger(seconds=max(5, int(app_obj.config.get("ALERT_WEBHOOK_POLL_SECONDS") or 15))),
+                    id="alert_webhooks",
                     replace_existing=True,
                 )
             # Job periÛdico para limpar agendamentos travados em execuÓÐo
@@ -108,21 +134,117 @@ def init_scheduler(app=None):
         _safe_session_remove(app_obj)
 
 
-def recover_pending_transcriptions_job():
+def recover_orphan_recordings_job():
+    app_obj = _capture_scheduler_app()
+    if not app_obj:
+        return
+
+    try:
+        with app_obj.app_context():
+            recover_orphan_recordings()
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        try:
+            print(f"recover_orphan_recordings_job falhou: {e}")
+        except Exception:
+            pass
+    finally:
+        _safe_session_remove(app_obj)
+
+
+def reconcile_gravacao_metadata_job():
+    app_obj = _capture_scheduler_app()
+    if not app_obj:
+        return
+
+    try:
+        with app_obj.app_context():
+            from services.metadata_reconciler import reconcile_gravacao_metadata
+
+            reconcile_gravacao_metadata()
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        try:
+            print(f"reconcile_gravacao_metadata_job falhou: {e}")
+        except Exception:
+            pass
+    finally:
+        _safe_session_remove(app_obj)
+
+
+def deliver_alert_webhooks_job():
+    app_obj = _capture_scheduler_app()
+    if not app_obj:
+        return
+
+    try:
+        with app_obj.app_context():
+            from services.alert_service import deliver_alert_webhooks
+
+            deliver_alert_webhooks()
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        try:
+            print(f"deliver_alert_webhooks_job falhou: {e}")
+        except Exception:
+            pass
+    finally:
+        _safe_session_remove(app_obj)
+
+
+def backfill_transcription_jobs_job():
     app_obj = _capture_scheduler_app()
     if not app_obj:
         return
 
     try:
         with app_obj.app_context():
-            from services.transcription_service import recover_pending_transcriptions
+            from services.transcription_service import backfill_transcription_jobs
+
+            backfill_transcription_jobs()
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        try:
+            print(f"backfill_transcription_jobs_job falhou: {e}")
+        except Exception:
+            pass
+    finally:
+        _safe_session_remove(app_obj)
+
+
+def start_transcription_workers_job():
+    app_obj = _capture_scheduler_app()
+    if not app_obj:
+        return
 
-            recover_pending_transcriptions(
-                limit=max(1, int(app_obj.config.get("TRANSCRIBE_RECOVERY_BATCH_SIZE") or 5))
+    try:
+        with app_obj.app_context():
+            from services.transcription_service import (
+                backfill_transcription_jobs,
+                start_transcription_workers,
             )
+
+            backfill_transcription_jobs()
+            start_transcription_workers(app_obj)
     except Exception as e:
         try:
-            print(f"recover_pending_transcriptions_job falhou: {e}")
+            db.session.rollback()
+        except Exception:
+            pass
+        try:
+            print(f"start_transcription_workers_job falhou: {e}")
         except Exception:
             pass
     finally:
@@ -207,6 +329,13 @@ def cleanup_local_audio_archived():
                 .filter(Gravacao.criado_em <= cutoff)
                 .all()
             )
+            queued_ids = {
+                gravacao_id
+                for (gravacao_id,) in db.session.query(DropboxUpload.gravacao_id)
+                .filter(DropboxUpload.status.in_(DROPBOX_UPLOAD_ACTIVE_STATUSES))
+                .all()
+            }
+            enqueued = 0
 
             for gravacao in gravacoes:
                 file_path = resolve_audio_filepath(gravacao)
@@ -224,49 +353,17 @@ def cleanup_local_audio_archived():
                             os.remove(marker_path)
                         except Exception:
                             pass
+                        forget_local_audio(gravacao.id)
                     continue
 
-                radio_obj = getattr(gravacao, "radio", None)
-                if radio_obj is None:
-                    try:
-                        radio_obj = Radio.query.get(gravacao.radio_id)
-                    except Exception:
-                        radio_obj = None
-
-                try:
-                    remote_path, _ = build_audio_destination(
-                        gravacao,
-                        radio=radio_obj,
-                        original_filename=os.path.basename(file_path),
-                        base_path=dropbox_cfg.audio_path,
-                        layout=dropbox_cfg.audio_layout,
-                    )
-                    upload_file(file_path, remote_path, token=dropbox_cfg.access_token)
-                    write_dropbox_marker(file_path, remote_path)
-
-                    try:
-                        file_size_mb = round(os.path.getsize(file_path) / (1024 * 1024), 2)
-                        if (gravacao.tamanho_mb or 0) != file_size_mb:
-                            gravacao.tamanho_mb = file_size_mb
-                            db.session.commit()
-                    except Exception:
-                        db.session.rollback()
+                # Envio fica com os workers da fila (dropbox_upload_service)
+                if gravacao.id in queued_ids:
+                    continue
+                if enqueue_dropbox_upload(gravacao.id, file_path, delete_local=dropbox_cfg.delete_local_after_upload):
+                    enqueued += 1
 
-                    if dropbox_cfg.delete_local_after_upload:
-                        try:
-                            os.remove(file_path)
-                        except Exception:
-                            pass
-                        try:
-                            if marker_path and os.path.exists(marker_path):
-                                os.remove(marker_path)
-                        except Exception:
-                            pass
-                except Exception as exc:
-                    try:
-                        print(f"Falha ao arquivar audio {gravacao.id}: {exc}")
-                    except Exception:
-                        pass
+            if enqueued:
+                start_dropbox_upload_workers(app_obj)
     except Exception as e:
         try:
             print(f"cleanup_local_audio_archived falhou: {e}")
@@ -0,0 +1,384 @@
+import os
+import subprocess
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import current_app, has_app_context
+
+from config import Config
+
+INGEST_SAMPLE_FORMAT = "s16le"
+INGEST_SAMPLE_WIDTH = 2
+INGEST_READ_SECONDS = 0.1
+INGEST_MAX_PENDING_SECONDS = 30
+
+_INGESTS: Dict[str, "StreamIngest"] = {}
+_INGESTS_LOCK = threading.Lock()
+
+
+def _log_warning(message):
+    if not has_app_context():
+        return
+    try:
+        current_app.logger.warning(message)
+    except Exception:
+        pass
+
+
+def get_ingest_sample_rate():
+    try:
+        return max(8000, int(Config.RECORDING_INGEST_SAMPLE_RATE or 44100))
+    except Exception:
+        return 44100
+
+
+def get_ingest_channels():
+    try:
+        return 1 if int(Config.RECORDING_INGEST_CHANNELS or 2) == 1 else 2
+    except Exception:
+        return 2
+
+
+def get_ingest_bytes_per_second():
+    return get_ingest_sample_rate() * get_ingest_channels() * INGEST_SAMPLE_WIDTH
+
+
+def build_pcm_input_args():
+    """Argumentos ffmpeg para ler o PCM distribuído pelo ingest via stdin."""
+    return [
+        "-f",
+        INGEST_SAMPLE_FORMAT,
+        "-ar",
+        str(get_ingest_sample_rate()),
+        "-ac",
+        str(get_ingest_channels()),
+        "-i",
+        "pipe:0",
+    ]
+
+
+class IngestSink:
+    """Consumidor de PCM de um ingest, com janela própria em bytes.
+
+    Subclasses implementam `_write` e `_close`. `feed` devolve False quando o
+    sink terminou (janela esgotada ou consumidor indisponível) e deve ser
+    removido do ingest; `end_reason` guarda o motivo ("janela", "descartado",
+    "parado" quando removido por detach_sink ou "upstream" quando o decoder caiu).
+    """
+
+    def __init__(self, key, *, duration_seconds=None):
+        self.key = key
+        self.remaining_bytes = None
+        if duration_seconds:
+            frame_bytes = get_ingest_channels() * INGEST_SAMPLE_WIDTH
+            total = int(float(duration_seconds) * get_ingest_bytes_per_second())
+            self.remaining_bytes = total - (total % frame_bytes)
+        self.closed = False
+        self.end_reason = None
+
+    def _finish(self, reason):
+        if self.end_reason is None:
+            self.end_reason = reason
+        return False
+
+    def feed(self, chunk):
+        if self.closed:
+            return False
+        if self.remaining_bytes is not None:
+            if self.remaining_bytes <= 0:
+                return self._finish("janela")
+            chunk = chunk[: self.remaining_bytes]
+            self.remaining_bytes -= len(chunk)
+        try:
+            ok = self._write(chunk)
+        except Exception:
+            ok = False
+        if not ok:
+            return self._finish("descartado")
+        if self.remaining_bytes is not None and self.remaining_bytes <= 0:
+            return self._finish("janela")
+        return True
+
+    def close(self, reason=None):
+        if self.closed:
+            return
+        self.closed = True
+        if reason:
+            self._finish(reason)
+        try:
+            self._close()
+        except Exception:
+            pass
+
+    def _write(self, chunk):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class EncoderSink(IngestSink):
+    """Sink que codifica o PCM em arquivo através de um ffmpeg próprio.
+
+    O stdin do encoder é não bloqueante: bytes que o encoder ainda não leu
+    ficam num buffer local, e um encoder travado é descartado quando o buffer
+    excede INGEST_MAX_PENDING_SECONDS, sem atrasar os demais sinks da rádio.
+    O fechamento nunca bloqueia a thread de leitura do ingest: o restante do
+    buffer é entregue por uma thread própria, ou jogado fora se o sink foi
+    descartado por travamento.
+    """
+
+    def __init__(self, key, output_args, *, duration_seconds=None, stdout=subprocess.DEVNULL):
+        super().__init__(key, duration_seconds=duration_seconds)
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+        ]
+        if Config.FFMPEG_THREADS and Config.FFMPEG_THREADS > 0:
+            cmd += ["-threads", str(Config.FFMPEG_THREADS)]
+        cmd += build_pcm_input_args()
+        cmd += list(output_args)
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=stdout,
+            stderr=subprocess.PIPE,
+        )
+        os.set_blocking(self.process.stdin.fileno(), False)
+        self._pending = bytearray()
+        self._max_pending = get_ingest_bytes_per_second() * INGEST_MAX_PENDING_SECONDS
+
+    def _flush_pending(self):
+        fd = self.process.stdin.fileno()
+        while self._pending:
+            try:
+                written = os.write(fd, self._pending)
+            except BlockingIOError:
+                return True
+            except (BrokenPipeError, OSError):
+                return False
+            if written <= 0:
+                return True
+            del self._pending[:written]
+        return True
+
+    def _write(self, chunk):
+        if self.process.poll() is not None:
+            return False
+        self._pending.extend(chunk)
+        if not self._flush_pending():
+            return False
+        if len(self._pending) > self._max_pending:
+            _log_warning(f"Encoder do ingest sem consumir PCM, descartando sink {self.key}")
+            return False
+        return True
+
+    def _close(self):
+        if self.end_reason == "descartado":
+            # Encoder travado: o arquivo fecha com o que já foi consumido
+            self._pending.clear()
+        if self._pending and self.process.poll() is None:
+            threading.Thread(target=self._drain_and_close, daemon=True).start()
+            return
+        self._close_stdin()
+
+    def _drain_and_close(self):
+        deadline = time.monotonic() + INGEST_MAX_PENDING_SECONDS
+        while self._pending and self.process.poll() is None and time.monotonic() < deadline:
+            if not self._flush_pending():
+                break
+            if self._pending:
+                time.sleep(INGEST_READ_SECONDS)
+        self._pending.clear()
+        self._close_stdin()
+
+    def _close_stdin(self):
+        try:
+            self.process.stdin.close()
+        except Exception:
+            pass
+
+
+class StreamIngest:
+    """Uma conexão/decodificação por rádio distribuída para vários sinks."""
+
+    def __init__(self, radio_id, stream_url):
+        self.radio_id = radio_id
+        self.stream_url = stream_url
+        self._sinks: Dict[str, IngestSink] = {}
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._reader: Optional[threading.Thread] = None
+        self.alive = False
+
+    def _build_decoder_cmd(self):
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-nostdin",
+        ]
+        if Config.FFMPEG_THREADS and Config.FFMPEG_THREADS > 0:
+            cmd += ["-threads", str(Config.FFMPEG_THREADS)]
+        if str(self.stream_url).lower().startswith(("http://", "https://")):
+            cmd += [
+                "-reconnect",
+                "1",
+                "-reconnect_streamed",
+                "1",
+                "-reconnect_delay_max",
+                "5",
+                "-user_agent",
+                "Mozilla/5.0",
+            ]
+        cmd += [
+            "-i",
+            self.stream_url,
+            "-vn",
+            "-f",
+            INGEST_SAMPLE_FORMAT,
+            "-ar",
+            str(get_ingest_sample_rate()),
+            "-ac",
+            str(get_ingest_channels()),
+            "pipe:1",
+        ]
+        return cmd
+
+    def start(self):
+        self._process = subprocess.Popen(
+            self._build_decoder_cmd(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.alive = True
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    def add_sink(self, sink):
+        with self._lock:
+            previous = self._sinks.pop(sink.key, None)
+            self._sinks[sink.key] = sink
+        if previous is not None:
+            previous.close()
+
+    def remove_sink(self, key, reason=None):
+        with self._lock:
+            sink = self._sinks.pop(key, None)
+        if sink is not None:
+            sink.close(reason)
+        _release_ingest_if_idle(self)
+
+    def sink_count(self):
+        with self._lock:
+            return len(self._sinks)
+
+    def stop(self):
+        self.alive = False
+        proc = self._process
+        if proc and proc.poll() is None:
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+
+    def _read_loop(self):
+        read_size = max(4096, int(get_ingest_bytes_per_second() * INGEST_READ_SECONDS))
+        stdout = self._process.stdout
+        try:
+            while True:
+                chunk = stdout.read1(read_size) if hasattr(stdout, "read1") else stdout.read(read_size)
+                if not chunk:
+                    break
+                with self._lock:
+                    sinks = list(self._sinks.values())
+                finished = [sink.key for sink in sinks if not sink.feed(chunk)]
+                for key in finished:
+                    self.remove_sink(key)
+                if not self.alive:
+                    break
+        except Exception:
+            pass
+        finally:
+            self.alive = False
+            with _INGESTS_LOCK:
+                if _INGESTS.get(self.radio_id) is self:
+                    _INGESTS.pop(self.radio_id, None)
+            with self._lock:
+                sinks = list(self._sinks.values())
+                self._sinks.clear()
+            for sink in sinks:
+                sink.close("upstream")
+            self.stop()
+            try:
+                self._process.wait(timeout=5)
+            except Exception:
+                pass
+
+
+def _release_ingest_if_idle(ingest):
+    with _INGESTS_LOCK:
+        if ingest.sink_count() > 0:
+            return
+        if _INGESTS.get(ingest.radio_id) is ingest:
+            _INGESTS.pop(ingest.radio_id, None)
+    ingest.stop()
+
+
+def attach_sink(radio, sink):
+    """Anexa um sink ao ingest da rádio, abrindo a conexão se necessário."""
+    with _INGESTS_LOCK:
+        ingest = _INGESTS.get(radio.id)
+        if ingest is not None and (not ingest.alive or ingest.stream_url != radio.stream_url):
+            _INGESTS.pop(radio.id, None)
+            ingest = None
+        if ingest is None:
+            ingest = StreamIngest(radio.id, radio.stream_url)
+            ingest.start()
+            _INGESTS[radio.id] = ingest
+        ingest.add_sink(sink)
+    return ingest
+
+
+def detach_sink(radio_id, key):
+    with _INGESTS_LOCK:
+        ingest = _INGESTS.get(radio_id)
+    if ingest is not None:
+        ingest.remove_sink(key, "parado")
+
+
+def attach_recording(radio, gravacao_id, output_args, *, duration_seconds):
+    """Inicia um encoder para a gravação alimentado pelo ingest compartilhado.
+
+    Retorna o processo do encoder, que termina sozinho quando a janela da
+    gravação se esgota (ou quando o upstream cai).
+    """
+    sink = EncoderSink(gravacao_id, output_args, duration_seconds=duration_seconds)
+    try:
+        attach_sink(radio, sink)
+    except Exception:
+        sink.close()
+        try:
+            sink.process.kill()
+        except Exception:
+            pass
+        raise
+    return sink.process
+
+
+def get_ingest_status():
+    with _INGESTS_LOCK:
+        ingests = list(_INGESTS.values())
+    return [
+        {
+            "radio_id": ingest.radio_id,
+            "alive": ingest.alive,
+            "sinks": ingest.sink_count(),
+        }
+        for ingest in ingests
+    ]
@@ -0,0 +1,388 @@
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models.gravacao import LOCAL_TZ, Gravacao
+from models.radio import Radio
+from models.tag import Tag
+from models.tag_occurrence import TagCloudKey, TagOccurrence
+from services.keyword_matcher import align_words, get_keyword_matcher, match_word_start
+from services.transcription_segments_service import get_transcription_segments, load_segment_words
+
+SAMPLE_OCCURRENCES_PER_TAG = 5
+# Chave "pendente" há mais tempo que isso sem thread local é reprocessada
+STALE_KEY_MINUTES = 15
+REFRESH_BATCH_SIZE = 200
+
+_REFRESHING_KEYS = set()
+_REFRESHING_LOCK = threading.Lock()
+
+
+def normalize_tag_name(value):
+    return " ".join(str(value or "").strip().split())
+
+
+def normalize_tag_key(value):
+    return normalize_tag_name(value).lower()
+
+
+def _build_row(key, gravacao, *, offset_seconds=None, count=1, exact=False):
+    heard_at = None
+    if gravacao.criado_em is not None and offset_seconds is not None:
+        try:
+            heard_at = gravacao.criado_em + timedelta(seconds=float(offset_seconds))
+        except Exception:
+            heard_at = None
+    return {
+        'tag_key': key,
+        'gravacao_id': gravacao.id,
+        'user_id': gravacao.user_id,
+        'radio_id': gravacao.radio_id,
+        'gravado_em': gravacao.criado_em,
+        'offset_segundos': float(offset_seconds) if offset_seconds is not None else None,
+        'exato': bool(exact and offset_seconds is not None),
+        'quantidade': int(count or 1),
+        'ouvido_em': heard_at,
+    }
+
+
+def _compute_gravacao_rows(gravacao, keys, matcher):
+    """Por segmento (com o horário da palavra) ou só pelo texto quando não há segmentos."""
+    text = gravacao.transcricao_texto or ''
+    if not matcher.search(text):
+        return []
+
+    segments = get_transcription_segments(gravacao.id, include_words=False)
+    if not segments:
+        counts = Counter()
+        for match in matcher.find_all(text):
+            for key in match.keys:
+                if key in keys:
+                    counts[key] += 1
+        return [_build_row(key, gravacao, count=count) for key, count in counts.items()]
+
+    segments = [segment for segment in segments if matcher.search(segment.get('text') or '')]
+    words_by_segment = load_segment_words([segment.get('id') for segment in segments])
+    rows = []
+    for segment in segments:
+        segment_text = segment.get('text') or ''
+        try:
+            start_seconds = float(segment.get('start') or 0)
+        except Exception:
+            start_seconds = 0.0
+        spans = align_words(segment_text, words_by_segment.get(segment.get('id')))
+        for match in matcher.find_all(segment_text):
+            word_start = match_word_start(spans, match.start)
+            for key in match.keys:
+                if key not in keys:
+                    continue
+                if word_start is None:
+                    rows.append(_build_row(key, gravacao, offset_seconds=start_seconds))
+                else:
+                    rows.append(_build_row(key, gravacao, offset_seconds=word_start, exact=True))
+    return rows
+
+
+def _write_gravacao_rows(gravacao_id, keys, rows):
+    # Serializa escritas da mesma gravação entre processos (conclusão x reprocessamento da chave)
+    db.session.execute(db.text("SELECT pg_advisory_xact_lock(hashtext(:gravacao_id))"), {'gravacao_id': gravacao_id})
+    TagOccurrence.query.filter(
+        TagOccurrence.gravacao_id == gravacao_id,
+        TagOccurrence.tag_key.in_(list(keys)),
+    ).delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(TagOccurrence), rows)
+
+
+def refresh_tag_occurrences_for_gravacao(gravacao_id):
+    """Rematerializa as ocorrências de todas as tags conhecidas numa gravação concluída."""
+    try:
+        keys = {key for (key,) in db.session.query(TagCloudKey.tag_key).all()}
+        if not keys:
+            return 0
+        gravacao = Gravacao.query.get(gravacao_id)
+        rows = []
+        if gravacao is not None and gravacao.transcricao_status == 'concluido':
+            rows = _compute_gravacao_rows(gravacao, keys, get_keyword_matcher(keys))
+        _write_gravacao_rows(gravacao_id, keys, rows)
+        db.session.commit()
+        return len(rows)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Falha ao materializar tags da gravacao %s", gravacao_id)
+        return 0
+
+
+def refresh_tag_occurrences_for_key(key):
+    """
+    Reconstrói as ocorrências de um nome de tag em todo o histórico. As linhas
+    novas são calculadas antes e trocadas numa única transação, para a tag
+    não aparecer vazia durante a reconstrução.
+    """
+    key = normalize_tag_key(key)
+    if not key:
+        return 0
+    keys = {key}
+    matcher = get_keyword_matcher(keys)
+    scan_started = datetime.now(tz=LOCAL_TZ)
+
+    # Só o texto passa pelo autômato; a gravação inteira é carregada para quem casou.
+    candidate_ids = []
+    text_query = (
+        db.session.query(Gravacao.id, Gravacao.transcricao_texto)
+        .filter(Gravacao.transcricao_status == 'concluido')
+        .filter(Gravacao.transcricao_texto.isnot(None))
+        .filter(Gravacao.transcricao_texto != '')
+        .execution_options(yield_per=REFRESH_BATCH_SIZE)
+    )
+    for gravacao_id, texto in text_query:
+        if matcher.search(texto):
+            candidate_ids.append(gravacao_id)
+
+    rows = []
+    for start in range(0, len(candidate_ids), REFRESH_BATCH_SIZE):
+        for gravacao in Gravacao.query.filter(Gravacao.id.in_(candidate_ids[start:start + REFRESH_BATCH_SIZE])).all():
+            rows.extend(_compute_gravacao_rows(gravacao, keys, matcher))
+        db.session.expunge_all()
+
+    # Gravações concluídas durante a varredura já foram materializadas por
+    # refresh_tag_occurrences_for_gravacao (a chave existe): mantém essas linhas
+    keep_ids = {
+        gravacao_id
+        for (gravacao_id,) in db.session.query(TagOccurrence.gravacao_id)
+        .join(Gravacao, Gravacao.id == TagOccurrence.gravacao_id)
+        .filter(TagOccurrence.tag_key == key, Gravacao.atualizado_em >= scan_started)
+        .distinct()
+    }
+    rows = [row for row in rows if row['gravacao_id'] not in keep_ids]
+    TagOccurrence.query.filter(
+        TagOccurrence.tag_key == key,
+        TagOccurrence.gravacao_id.notin_(list(keep_ids)),
+    ).delete(synchronize_session=False)
+    for start in range(0, len(rows), REFRESH_BATCH_SIZE):
+        db.session.execute(insert(TagOccurrence), rows[start:start + REFRESH_BATCH_SIZE])
+
+    record = TagCloudKey.query.get(key)
+    if record is not None:
+        record.status = 'pronto'
+    db.session.commit()
+    return len(rows)
+
+
+def _refresh_keys_worker(app_obj, keys):
+    with app_obj.app_context():
+        try:
+            for key in keys:
+                try:
+                    count = refresh_tag_occurrences_for_key(key)
+                    current_app.logger.info("Nuvem de tags: '%s' materializada (%s ocorrencias)", key, count)
+                except Exception:
+                    db.session.rollback()
+                    current_app.logger.exception("Falha ao materializar a tag '%s'", key)
+        finally:
+            with _REFRESHING_LOCK:
+                _REFRESHING_KEYS.difference_update(keys)
+            try:
+                db.session.remove()
+            except Exception:
+                pass
+
+
+def schedule_tag_key_refresh(keys, app_obj=None):
+    """Marca as chaves como pendentes e reconstrói em segundo plano."""
+    keys = {normalize_tag_key(key) for key in keys or []} - {''}
+    if not keys:
+        return
+    if app_obj is None:
+        app_obj = current_app._get_current_object()
+    for key in keys:
+        record = TagCloudKey.query.get(key)
+        if record is None:
+            db.session.add(TagCloudKey(tag_key=key, status='pendente'))
+        else:
+            record.status = 'pendente'
+            record.atualizado_em = datetime.now(tz=LOCAL_TZ)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+    with _REFRESHING_LOCK:
+        keys = keys - _REFRESHING_KEYS
+        _REFRESHING_KEYS.update(keys)
+    if not keys:
+        return
+    threading.Thread(
+        target=_refresh_keys_worker,
+        args=(app_obj, sorted(keys)),
+        name="tag-cloud-refresh",
+        daemon=True,
+    ).start()
+
+
+def ensure_tag_keys_materialized(keys, app_obj=None):
+    """Agenda chaves nunca materializadas (ou presas em 'pendente'); retorna as que ainda não estão prontas."""
+    keys = set(keys or [])
+    if not keys:
+        return set()
+    records = {record.tag_key: record for record in TagCloudKey.query.filter(TagCloudKey.tag_key.in_(list(keys))).all()}
+    stale_before = datetime.now(tz=LOCAL_TZ) - timedelta(minutes=STALE_KEY_MINUTES)
+    with _REFRESHING_LOCK:
+        running = set(_REFRESHING_KEYS)
+    missing = set()
+    pending = set()
+    for key in keys:
+        record = records.get(key)
+        if record is None:
+            missing.add(key)
+        elif record.status != 'pronto':
+            pending.add(key)
+            if key not in running and record.atualizado_em and record.atualizado_em < stale_before:
+                missing.add(key)
+    if missing:
+        schedule_tag_key_refresh(missing, app_obj)
+    return missing | pending
+
+
+def drop_tag_key_if_unused(key):
+    key = normalize_tag_key(key)
+    if not key:
+        return
+    if any(normalize_tag_key(nome) == key for (nome,) in db.session.query(Tag.nome).all()):
+        return
+    try:
+        TagOccurrence.query.filter(TagOccurrence.tag_key == key).delete(synchronize_session=False)
+        TagCloudKey.query.filter(TagCloudKey.tag_key == key).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+
+def _occurrence_payload(row, entries):
+    (tag_key, gravacao_id, radio_id, offset_segundos, exato, quantidade, ouvido_em, gravado_em, radio_nome, cidade, estado) = row
+    entry = entries.get(tag_key) or {}
+    return {
+        'tag_key': tag_key,
+        'tag_text': entry.get('text') or tag_key,
+        'gravacao_id': gravacao_id,
+        'radio_id': radio_id,
+        'radio_nome': radio_nome,
+        'cidade': cidade,
+        'estado': estado,
+        'count': int(quantidade or 1),
+        'offset_seconds': offset_segundos,
+        'heard_at': ouvido_em.astimezone(LOCAL_TZ).isoformat() if ouvido_em else None,
+        'exact_time': bool(exato),
+        'recorded_at': gravado_em.astimezone(LOCAL_TZ).isoformat() if gravado_em else None,
+    }
+
+
+def _occurrence_columns():
+    return (
+        TagOccurrence.tag_key,
+        TagOccurrence.gravacao_id,
+        TagOccurrence.radio_id,
+        TagOccurrence.offset_segundos,
+        TagOccurrence.exato,
+        TagOccurrence.quantidade,
+        TagOccurrence.ouvido_em,
+        TagOccurrence.gravado_em,
+        Radio.nome,
+        Radio.cidade,
+        Radio.estado,
+    )
+
+
+def build_tag_cloud(entries, *, user_id, is_admin, occurrence_limit, occurrence_offset=0):
+    """
+    Monta a resposta da nuvem a partir de tag_ocorrencias (contagens agregadas
+    no banco e ocorrências paginadas), sem reler transcrições. Só agrega as
+    chaves pedidas: nada de contar gravações ou ocorrências da base inteira.
+    """
+    keys = list(entries.keys())
+    pending = ensure_tag_keys_materialized(keys)
+
+    def _scoped(query):
+        query = query.filter(TagOccurrence.tag_key.in_(keys))
+        if not is_admin:
+            query = query.filter(TagOccurrence.user_id == user_id)
+        return query
+
+    aggregates = _scoped(
+        db.session.query(
+            TagOccurrence.tag_key,
+            func.sum(TagOccurrence.quantidade),
+            func.count(func.distinct(TagOccurrence.gravacao_id)),
+            func.count(func.distinct(Radio.nome)),
+            func.count(func.distinct(Radio.cidade)),
+            func.max(TagOccurrence.ouvido_em),
+        ).outerjoin(Radio, Radio.id == TagOccurrence.radio_id)
+    ).group_by(TagOccurrence.tag_key).all()
+    stats = {row[0]: row[1:] for row in aggregates}
+
+    order = (TagOccurrence.ouvido_em.desc().nullslast(), TagOccurrence.gravado_em.desc(), TagOccurrence.id.desc())
+    occurrence_rows = (
+        _scoped(db.session.query(*_occurrence_columns()).outerjoin(Radio, Radio.id == TagOccurrence.radio_id))
+        .order_by(*order)
+        .offset(max(0, int(occurrence_offset or 0)))
+        .limit(occurrence_limit + 1)
+        .all()
+    )
+    occurrences_truncated = len(occurrence_rows) > occurrence_limit
+    occurrences = [_occurrence_payload(row, entries) for row in occurrence_rows[:occurrence_limit]]
+
+    position = func.row_number().over(partition_by=TagOccurrence.tag_key, order_by=order).label('posicao')
+    ranked = _scoped(
+        db.session.query(*_occurrence_columns(), position).outerjoin(Radio, Radio.id == TagOccurrence.radio_id)
+    ).subquery()
+    samples = defaultdict(list)
+    sample_rows = (
+        db.session.query(*[column for column in ranked.c if column.name != 'posicao'])
+        .filter(ranked.c.posicao <= SAMPLE_OCCURRENCES_PER_TAG)
+        .order_by(ranked.c.tag_key, ranked.c.posicao)
+        .all()
+    )
+    for row in sample_rows:
+        samples[row[0]].append(_occurrence_payload(row, entries))
+
+    words = []
+    total_occurrences = 0
+    matched_tags = 0
+    for key, entry in entries.items():
+        count, recordings_count, radios_count, cities_count, last_heard_at = stats.get(key) or (0, 0, 0, 0, None)
+        count = int(count or 0)
+        total_occurrences += count
+        if count > 0:
+            matched_tags += 1
+        words.append({
+            'key': key,
+            'text': entry['text'],
+            'color': entry.get('color'),
+            'count': count,
+            'recordings_count': int(recordings_count or 0),
+            'radios_count': int(radios_count or 0),
+            'cities_count': int(cities_count or 0),
+            'source_tag_ids': entry['source_tag_ids'],
+            'last_heard_at': last_heard_at.astimezone(LOCAL_TZ).isoformat() if last_heard_at else None,
+            'sample_occurrences': samples.get(key, []),
+        })
+    words.sort(key=lambda item: (-item['count'], item['text'].lower()))
+
+    return {
+        'summary': {
+            'total_tags': len(words),
+            'matched_tags': matched_tags,
+            'total_occurrences': total_occurrences,
+            'occurrences_returned': len(occurrences),
+            'occurrence_limit': occurrence_limit,
+            'occurrence_offset': max(0, int(occurrence_offset or 0)),
+            'occurrences_truncated': occurrences_truncated,
+            'pending_tags': len(pending),
+        },
+        'words': words,
+        'occurrences': occurrences,
+    }
@@ -0,0 +1,194 @@
+import os
+import subprocess
+import tempfile
+
+from flask import current_app, has_app_context
+
+from config import Config
+
+WHISPER_SAMPLE_RATE = 16000
+PCM_SAMPLE_WIDTH = 2
+PCM_READ_BYTES = 1024 * 1024
+# Folga da memória mapeada quando a duração informada é menor que a real
+MEMMAP_SLACK_SECONDS = 60
+
+
+def _log_warning(message):
+    if not has_app_context():
+        return
+    try:
+        current_app.logger.warning(message)
+    except Exception:
+        pass
+
+
+def _get_memmap_threshold_bytes():
+    try:
+        return max(0, int(Config.TRANSCRIBE_AUDIO_MEMMAP_MB or 0)) * 1024 * 1024
+    except Exception:
+        return 0
+
+
+def _build_pcm_cmd(filepath):
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-nostdin",
+        "-i",
+        filepath,
+        "-vn",
+    ]
+    audio_filter = (Config.TRANSCRIBE_AUDIO_FILTER or "").strip()
+    if audio_filter:
+        cmd += ["-af", audio_filter]
+    # O modelo recebe o array direto: precisa ser mono a 16 kHz.
+    cmd += [
+        "-ac",
+        "1",
+        "-ar",
+        str(WHISPER_SAMPLE_RATE),
+        "-f",
+        "s16le",
+        "pipe:1",
+    ]
+    return cmd
+
+
+class _MemmapBuffer:
+    """Amostras float32 num arquivo de rascunho mapeado, crescendo sob demanda."""
+
+    def __init__(self, capacity):
+        import numpy as np
+
+        scratch_dir = Config.TRANSCRIBE_SCRATCH_DIR or None
+        if scratch_dir:
+            os.makedirs(scratch_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="transcribe_", suffix=".f32", dir=scratch_dir)
+        os.close(fd)
+        self._np = np
+        self.size = 0
+        self._open(max(WHISPER_SAMPLE_RATE, int(capacity)))
+
+    def _open(self, capacity):
+        with open(self.path, "r+b") as fp:
+            fp.truncate(capacity * 4)
+        self.capacity = capacity
+        self.array = self._np.memmap(self.path, dtype=self._np.float32, mode="r+", shape=(capacity,))
+
+    def append(self, samples):
+        needed = self.size + len(samples)
+        if needed > self.capacity:
+            self.array.flush()
+            del self.array
+            self._open(max(needed, int(self.capacity * 1.25)))
+        self.array[self.size:needed] = samples
+        self.size = needed
+
+    def result(self):
+        self.array.flush()
+        return self.array[: self.size]
+
+
+class _ChunkBuffer:
+    def __init__(self):
+        self.path = None
+        self.chunks = []
+        self.size = 0
+
+    def append(self, samples):
+        self.chunks.append(samples)
+        self.size += len(samples)
+
+    def result(self):
+        import numpy as np
+
+        if not self.chunks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self.chunks)
+
+
+def pcm_to_float32(pcm):
+    """PCM s16le de 16 kHz mono (transcrição ao vivo) no array float32 do modelo."""
+    import numpy as np
+
+    return np.frombuffer(bytes(pcm), dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def load_transcription_audio(filepath, *, duration_seconds=None):
+    """
+    Decodifica e filtra o áudio com ffmpeg direto para um array float32 de
+    16 kHz, sem WAV temporário. Acima de TRANSCRIBE_AUDIO_MEMMAP_MB o array
+    fica num arquivo mapeado em memória (TRANSCRIBE_SCRATCH_DIR).
+
+    Retorna (entrada_do_modelo, caminho_de_rascunho). Sem pré-processamento,
+    ou se o ffmpeg falhar, a entrada é o próprio caminho do arquivo.
+    """
+    if not filepath or not os.path.exists(filepath) or not Config.TRANSCRIBE_AUDIO_PREPROCESS:
+        return filepath, None
+
+    import numpy as np
+
+    expected_samples = int(max(0, float(duration_seconds or 0)) * WHISPER_SAMPLE_RATE)
+    threshold = _get_memmap_threshold_bytes()
+    buffer = None
+    process = None
+    # stderr em arquivo: um pipe lido só no fim trava o ffmpeg quando passa de 64 KB
+    stderr_file = tempfile.TemporaryFile()
+    try:
+        if threshold and expected_samples * 4 >= threshold:
+            buffer = _MemmapBuffer(expected_samples + MEMMAP_SLACK_SECONDS * WHISPER_SAMPLE_RATE)
+        else:
+            buffer = _ChunkBuffer()
+
+        process = subprocess.Popen(
+            _build_pcm_cmd(filepath),
+            stdout=subprocess.PIPE,
+            stderr=stderr_file,
+        )
+        remainder = b""
+        while True:
+            data = process.stdout.read(PCM_READ_BYTES)
+            if not data:
+                break
+            if remainder:
+                data = remainder + data
+                remainder = b""
+            if len(data) % PCM_SAMPLE_WIDTH:
+                remainder = data[-1:]
+                data = data[:-1]
+            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+            samples /= 32768.0
+            buffer.append(samples)
+        return_code = process.wait()
+        if return_code != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read()
+            raise RuntimeError(stderr.decode("utf-8", errors="ignore").strip()[-300:] or f"ffmpeg exit {return_code}")
+        if buffer.size <= 0:
+            raise RuntimeError("ffmpeg nao retornou audio")
+        return buffer.result(), buffer.path
+    except Exception as exc:
+        _log_warning(f"Falha ao preparar audio para transcricao: {exc}")
+        if process is not None and process.poll() is None:
+            try:
+                process.kill()
+                process.wait(timeout=5)
+            except Exception:
+                pass
+        if buffer is not None:
+            cleanup_transcription_audio(buffer.path)
+        return filepath, None
+    finally:
+        stderr_file.close()
+
+
+def cleanup_transcription_audio(scratch_path):
+    if not scratch_path:
+        return
+    try:
+        if os.path.exists(scratch_path):
+            os.remove(scratch_path)
+    except Exception:
+        pass
@@ -0,0 +1,97 @@
+import bisect
+import threading
+from types import SimpleNamespace
+
+from services.transcription_audio import WHISPER_SAMPLE_RATE
+from services.transcription_pool import build_segment_payload
+
+_PIPELINE = None
+_PIPELINE_LOCK = threading.Lock()
+
+
+def get_batched_pipeline(model):
+    """BatchedInferencePipeline sobre o modelo já carregado (faster-whisper >= 1.1)."""
+    global _PIPELINE
+    if _PIPELINE is not None and _PIPELINE.model is model:
+        return _PIPELINE
+    with _PIPELINE_LOCK:
+        if _PIPELINE is None or _PIPELINE.model is not model:
+            try:
+                from faster_whisper import BatchedInferencePipeline
+            except Exception as exc:
+                raise RuntimeError("faster-whisper >= 1.1.0 is required for batched transcription") from exc
+            _PIPELINE = BatchedInferencePipeline(model=model)
+    return _PIPELINE
+
+
+def _speech_chunks(audio, *, chunk_seconds, vad_parameters):
+    """Trechos de fala de uma gravação, cada um com no máximo chunk_seconds."""
+    if vad_parameters is not None:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps, merge_segments
+
+        options = VadOptions(**vad_parameters, max_speech_duration_s=chunk_seconds)
+        return merge_segments(get_speech_timestamps(audio, options), options)
+    step = int(chunk_seconds * WHISPER_SAMPLE_RATE)
+    return [
+        {"start": start, "end": min(len(audio), start + step)}
+        for start in range(0, len(audio), step)
+    ]
+
+
+def build_batch_input(audios, *, chunk_seconds, vad_parameters=None):
+    """
+    Concatena as gravações e gera clip_timestamps com os trechos de fala de
+    cada uma já deslocados para a linha do tempo concatenada. Nenhum trecho
+    atravessa a fronteira entre gravações.
+
+    Retorna (audio, clip_timestamps, offsets_em_amostras).
+    """
+    import numpy as np
+
+    clips = []
+    offsets = []
+    position = 0
+    for audio in audios:
+        offsets.append(position)
+        for chunk in _speech_chunks(audio, chunk_seconds=chunk_seconds, vad_parameters=vad_parameters):
+            if chunk["end"] > chunk["start"]:
+                clips.append({"start": chunk["start"] + position, "end": chunk["end"] + position})
+        position += len(audio)
+    concatenated = np.concatenate(audios) if audios else np.zeros(0, dtype=np.float32)
+    return concatenated, clips, offsets
+
+
+def transcribe_batch(model, audios, transcribe_kwargs, *, batch_size, chunk_seconds, vad_parameters=None):
+    """
+    Transcreve várias gravações numa só passada do pipeline em lote.
+
+    Retorna (segmentos, info), onde segmentos é um iterador de
+    (indice_da_gravacao, payload, fim_do_segmento) com tempos relativos à
+    gravação de origem.
+    """
+    audio, clips, offsets = build_batch_input(
+        audios,
+        chunk_seconds=chunk_seconds,
+        vad_parameters=vad_parameters,
+    )
+    if not clips:
+        return iter(()), SimpleNamespace(language=transcribe_kwargs.get("language"), duration=0)
+
+    pipeline = get_batched_pipeline(model)
+    segments, info = pipeline.transcribe(
+        audio,
+        clip_timestamps=clips,
+        batch_size=max(1, int(batch_size or 1)),
+        **transcribe_kwargs,
+    )
+    offsets_seconds = [offset / float(WHISPER_SAMPLE_RATE) for offset in offsets]
+
+    def _scatter():
+        for segment in segments:
+            start = float(getattr(segment, "start", 0) or 0)
+            end = float(getattr(segment, "end", 0) or 0)
+            index = max(0, bisect.bisect_right(offsets_seconds, (start + end) / 2.0) - 1)
+            offset = offsets_seconds[index]
+            yield index, build_segment_payload(segment, offset_seconds=-offset), end - offset
+
+    return _scatter(), info
@@ -0,0 +1,427 @@
+import atexit
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from types import SimpleNamespace
+
+from config import Config
+from services.transcription_audio import (
+    cleanup_transcription_audio,
+    load_transcription_audio,
+    pcm_to_float32,
+)
+
+POOL_EVENT_TIMEOUT_SECONDS = 1.0
+POOL_DEFAULT_THREADS_PER_PROCESS = 4
+# Job na fila com um processo ocioso há mais que isso: o pedido se perdeu
+POOL_START_GRACE_SECONDS = 15.0
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def build_segment_payload(segment, *, offset_seconds=0.0):
+    text = (segment.text or "").strip()
+    if not text:
+        return None
+    words_payload = []
+    for word in getattr(segment, "words", None) or []:
+        word_text = (getattr(word, "word", "") or "").strip()
+        if not word_text:
+            continue
+        words_payload.append({
+            "start": float(getattr(word, "start", 0) or 0) + offset_seconds,
+            "end": float(getattr(word, "end", 0) or 0) + offset_seconds,
+            "word": word_text,
+            "probability": float(getattr(word, "probability", 0) or 0),
+        })
+    segment_payload = {
+        "start": float(getattr(segment, "start", 0) or 0) + offset_seconds,
+        "end": float(getattr(segment, "end", 0) or 0) + offset_seconds,
+        "text": text,
+    }
+    if words_payload:
+        segment_payload["words"] = words_payload
+    return segment_payload
+
+
+def get_threads_per_process():
+    try:
+        threads = int(Config.TRANSCRIBE_CPU_THREADS or 0)
+    except Exception:
+        threads = 0
+    return threads if threads > 0 else POOL_DEFAULT_THREADS_PER_PROCESS
+
+
+def get_pool_size():
+    """Processos do pool: configurado ou núcleos / threads por modelo."""
+    try:
+        configured = int(Config.TRANSCRIBE_POOL_PROCESSES or 0)
+    except Exception:
+        configured = 0
+    if configured > 0:
+        return configured
+    cores = os.cpu_count() or 1
+    return max(1, cores // get_threads_per_process())
+
+
+def is_pool_enabled():
+    return bool(Config.TRANSCRIBE_ENABLED and Config.TRANSCRIBE_POOL_ENABLED)
+
+
+def get_idle_timeout_seconds():
+    try:
+        return max(60, int(Config.TRANSCRIBE_POOL_IDLE_TIMEOUT_SECONDS or 1800))
+    except Exception:
+        return 1800
+
+
+def _build_model_settings():
+    return {
+        "model": Config.TRANSCRIBE_MODEL,
+        "device": Config.TRANSCRIBE_DEVICE,
+        "compute_type": Config.TRANSCRIBE_COMPUTE_TYPE,
+        "cpu_threads": get_threads_per_process(),
+        "num_workers": max(1, int(Config.TRANSCRIBE_MODEL_WORKERS or 1)),
+    }
+
+
+def _worker_main(settings, job_queue, event_queue, slot, current_jobs, idle_since):
+    """
+    Loop de um processo do pool: um modelo carregado, um job por vez.
+
+    current_jobs[slot] (memória compartilhada, sem depender da fila de eventos)
+    diz qual job o processo está executando, para o despachante falhar o job
+    certo se o processo morrer antes de o evento "start" chegar.
+    """
+    model = None
+    load_error = None
+    try:
+        from faster_whisper import WhisperModel
+
+        model = WhisperModel(
+            settings["model"],
+            device=settings["device"],
+            compute_type=settings["compute_type"],
+            cpu_threads=settings["cpu_threads"],
+            num_workers=settings["num_workers"],
+        )
+    except Exception as exc:
+        load_error = f"falha ao carregar modelo: {exc}"
+
+    pid = os.getpid()
+    scratch_path = None
+    idle_since[slot] = time.time()
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id = job["job_id"]
+        current_jobs[slot] = job_id
+        idle_since[slot] = 0.0
+        cancel_event = job["cancel_event"]
+        event_queue.put((job_id, "start", pid))
+        try:
+            if model is None:
+                event_queue.put((job_id, "error", load_error or "modelo indisponivel"))
+                continue
+            if cancel_event.is_set():
+                event_queue.put((job_id, "cancelled", None))
+                continue
+            if job.get("pcm") is not None:
+                # Janela da transcrição ao vivo: PCM curto, já em 16 kHz mono
+                audio = pcm_to_float32(job["pcm"])
+            else:
+                audio, scratch_path = load_transcription_audio(
+                    job["audio_path"],
+                    duration_seconds=job.get("duration_seconds"),
+                )
+            segments, info = model.transcribe(audio, **job["kwargs"])
+            event_queue.put((
+                job_id,
+                "info",
+                {
+                    "language": getattr(info, "language", None),
+                    "duration": float(getattr(info, "duration", 0) or 0),
+                },
+            ))
+            cancelled = False
+            for segment in segments:
+                event_queue.put((
+                    job_id,
+                    "segment",
+                    (build_segment_payload(segment), float(getattr(segment, "end", 0) or 0)),
+                ))
+                if cancel_event.is_set():
+                    cancelled = True
+                    break
+            event_queue.put((job_id, "cancelled" if cancelled else "done", None))
+        except Exception as exc:
+            event_queue.put((job_id, "error", str(exc)[:500]))
+        finally:
+            audio = None
+            cleanup_transcription_audio(scratch_path)
+            scratch_path = None
+            current_jobs[slot] = 0
+            idle_since[slot] = time.time()
+
+
+class PoolJob:
+    def __init__(self, job_id, cancel_event, *, on_stalled=None):
+        self.job_id = job_id
+        self.cancel_event = cancel_event
+        self.events = queue.Queue()
+        self.pid = None
+        self.finished = False
+        self.submitted_at = time.monotonic()
+        self.last_activity = self.submitted_at
+        self._on_stalled = on_stalled
+
+    def _next_event(self):
+        """
+        Próximo evento do worker. Depois de iniciado, um job sem nenhum evento
+        por TRANSCRIBE_POOL_IDLE_TIMEOUT_SECONDS é abandonado (o processo é
+        reciclado) e a espera termina com erro, em vez de segurar o lease.
+        """
+        idle_timeout = get_idle_timeout_seconds()
+        while True:
+            try:
+                return self.events.get(timeout=POOL_EVENT_TIMEOUT_SECONDS)
+            except queue.Empty:
+                pass
+            if self.pid is not None and time.monotonic() - self.last_activity > idle_timeout:
+                if self._on_stalled is not None:
+                    self._on_stalled(self)
+                raise RuntimeError(f"worker de transcricao sem resposta ha {idle_timeout}s")
+
+    def results(self):
+        """
+        Bloqueia até o worker começar a emitir segmentos.
+
+        Retorna (segmentos, info) no mesmo formato do caminho local: um iterador
+        de (payload, fim_do_segmento) e um objeto com `language` e `duration`.
+        """
+        while True:
+            kind, data = self._next_event()
+            if kind == "info":
+                return self._iter_segments(), SimpleNamespace(**data)
+            if kind == "error":
+                raise RuntimeError(data)
+            if kind in ("done", "cancelled"):
+                return iter(()), SimpleNamespace(language=None, duration=0)
+
+    def _iter_segments(self):
+        while True:
+            kind, data = self._next_event()
+            if kind == "segment":
+                yield data
+            elif kind == "error":
+                raise RuntimeError(data)
+            elif kind in ("done", "cancelled"):
+                return
+
+    def cancel(self):
+        if self.finished:
+            return
+        try:
+            self.cancel_event.set()
+        except Exception:
+            pass
+
+
+class TranscriptionPool:
+    """
+    N processos com um WhisperModel cada, fora do GIL do Flask.
+
+    O banco continua no processo da aplicação: os workers só recebem o caminho
+    do áudio e os parâmetros de transcrição e devolvem segmentos por uma fila;
+    o cancelamento usa um Event do Manager por job.
+    """
+
+    def __init__(self, processes):
+        self._ctx = multiprocessing.get_context("spawn")
+        self._manager = self._ctx.Manager()
+        self._job_queue = self._ctx.Queue()
+        self._event_queue = self._ctx.Queue()
+        self._settings = _build_model_settings()
+        self._size = max(1, int(processes or 1))
+        self._processes = []
+        # Por processo: job em execução (0 = nenhum) e desde quando está ocioso (0 = carregando)
+        self._current_jobs = self._ctx.Array("q", self._size, lock=False)
+        self._idle_since = self._ctx.Array("d", self._size, lock=False)
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._closed = False
+        for index in range(self._size):
+            self._processes.append(self._spawn(index))
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_loop,
+            name="transcription-pool",
+            daemon=True,
+        )
+        self._dispatcher.start()
+
+    @property
+    def size(self):
+        return self._size
+
+    def _spawn(self, index):
+        self._current_jobs[index] = 0
+        self._idle_since[index] = 0.0
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                self._settings,
+                self._job_queue,
+                self._event_queue,
+                index,
+                self._current_jobs,
+                self._idle_since,
+            ),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def submit(self, audio_path, kwargs, *, duration_seconds=None, pcm=None):
+        """Enfileira um arquivo ou, com `pcm`, uma janela da transcrição ao vivo."""
+        job = PoolJob(next(self._ids), self._manager.Event(), on_stalled=self._abandon)
+        with self._jobs_lock:
+            self._jobs[job.job_id] = job
+        self._job_queue.put({
+            "job_id": job.job_id,
+            "audio_path": audio_path,
+            "duration_seconds": duration_seconds,
+            "kwargs": kwargs,
+            "cancel_event": job.cancel_event,
+            "pcm": bytes(pcm) if pcm is not None else None,
+        })
+        return job
+
+    def _route(self, job_id, kind, data):
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            if job is not None and kind in ("done", "cancelled", "error"):
+                self._jobs.pop(job_id, None)
+                job.finished = True
+        if job is None:
+            return
+        job.last_activity = time.monotonic()
+        if kind == "start":
+            job.pid = data
+            return
+        job.events.put((kind, data))
+
+    def _fail_jobs(self, predicate, message):
+        with self._jobs_lock:
+            failed = [job for job in self._jobs.values() if predicate(job)]
+            for job in failed:
+                self._jobs.pop(job.job_id, None)
+                job.finished = True
+        for job in failed:
+            job.events.put(("error", message))
+
+    def _abandon(self, job):
+        """Job travado: sai do pool e o processo dono é encerrado (o despachante repõe)."""
+        with self._jobs_lock:
+            self._jobs.pop(job.job_id, None)
+            job.finished = True
+        job.cancel()
+        for process in list(self._processes):
+            if job.pid is not None and process.pid == job.pid and process.is_alive():
+                try:
+                    process.kill()
+                except Exception:
+                    pass
+
+    def _check_processes(self):
+        for index, process in enumerate(list(self._processes)):
+            if process.is_alive():
+                continue
+            # Worker morto (OOM, segfault): falha o job dele (pelo pid ou pelo slot,
+            # caso o "start" não tenha chegado) e repõe o processo.
+            owned = self._current_jobs[index]
+            self._fail_jobs(
+                lambda job: job.pid == process.pid or job.job_id == owned,
+                f"worker de transcricao encerrado (exit {process.exitcode})",
+            )
+            if not self._closed:
+                self._processes[index] = self._spawn(index)
+
+        # Job ainda sem dono enquanto um processo está ocioso: o pedido se perdeu
+        now = time.time()
+        idle = any(
+            self._idle_since[index] and now - self._idle_since[index] > POOL_START_GRACE_SECONDS
+            for index in range(self._size)
+        )
+        if not idle:
+            return
+        running = set(self._current_jobs[:])
+        started_before = time.monotonic() - POOL_START_GRACE_SECONDS
+        self._fail_jobs(
+            lambda job: job.pid is None and job.job_id not in running and job.submitted_at < started_before,
+            "job de transcricao nao iniciado pelo pool",
+        )
+
+    def _dispatch_loop(self):
+        last_check = time.time()
+        while not self._closed:
+            try:
+                job_id, kind, data = self._event_queue.get(timeout=POOL_EVENT_TIMEOUT_SECONDS)
+                self._route(job_id, kind, data)
+            except queue.Empty:
+                pass
+            except Exception:
+                time.sleep(POOL_EVENT_TIMEOUT_SECONDS)
+            if time.time() - last_check >= POOL_EVENT_TIMEOUT_SECONDS:
+                last_check = time.time()
+                self._check_processes()
+
+    def status(self):
+        with self._jobs_lock:
+            jobs = len(self._jobs)
+        return {
+            "processes": self._size,
+            "alive": sum(1 for process in self._processes if process.is_alive()),
+            "jobs": jobs,
+            "threads_per_process": self._settings["cpu_threads"],
+        }
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._processes:
+            try:
+                self._job_queue.put(None)
+            except Exception:
+                pass
+        for process in self._processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        try:
+            self._manager.shutdown()
+        except Exception:
+            pass
+
+
+def get_transcription_pool():
+    global _POOL
+    if _POOL is not None:
+        return _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = TranscriptionPool(get_pool_size())
+            atexit.register(_POOL.shutdown)
+    return _POOL
+
+
+def get_transcription_pool_status():
+    if _POOL is None:
+        return None
+    return _POOL.status()
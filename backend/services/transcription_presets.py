@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+from config import Config
+from models.gravacao import LOCAL_TZ
+
+PRESET_FAST = "rapido"
+PRESET_DEFAULT = "padrao"
+PRESET_HIGH = "alta_fidelidade"
+
+# Mesmos parâmetros de decodificação de tools/transcription-presets; o
+# "padrao" usa o que estiver no Config.
+TRANSCRIPTION_PRESETS = {
+    PRESET_FAST: {
+        "beam_size": 1,
+        "best_of": 1,
+        "patience": 1.0,
+        "vad_min_silence_ms": 1500,
+        "vad_speech_pad_ms": 300,
+    },
+    PRESET_DEFAULT: {},
+    PRESET_HIGH: {
+        "beam_size": 6,
+        "best_of": 6,
+        "patience": 1.3,
+        "vad_min_silence_ms": 2200,
+        "vad_speech_pad_ms": 550,
+    },
+}
+
+
+def _parse_priority_map(raw):
+    """Formato "id:prioridade,id:prioridade" (ids de rádio ou de cliente)."""
+    priorities = {}
+    for item in str(raw or "").split(","):
+        key, _, value = item.strip().partition(":")
+        key = key.strip()
+        if not key:
+            continue
+        try:
+            priorities[key] = int(value.strip() or 0)
+        except ValueError:
+            continue
+    return priorities
+
+
+def get_transcription_priority(*, radio_id=None, cliente_id=None):
+    priority = 0
+    if radio_id:
+        priority += _parse_priority_map(Config.TRANSCRIBE_PRIORITY_RADIOS).get(str(radio_id), 0)
+    if cliente_id:
+        priority += _parse_priority_map(Config.TRANSCRIBE_PRIORITY_CLIENTES).get(str(cliente_id), 0)
+    return priority
+
+
+def get_preset_model(preset):
+    if preset == PRESET_FAST:
+        return Config.TRANSCRIBE_PRESET_FAST_MODEL or Config.TRANSCRIBE_MODEL
+    if preset == PRESET_HIGH:
+        return Config.TRANSCRIBE_PRESET_HIGH_MODEL or Config.TRANSCRIBE_MODEL
+    return Config.TRANSCRIBE_MODEL
+
+
+def apply_transcription_preset(transcribe_kwargs, preset):
+    overrides = TRANSCRIPTION_PRESETS.get(preset or "") or {}
+    if not overrides:
+        return transcribe_kwargs
+    for key in ("beam_size", "best_of", "patience"):
+        if key in overrides:
+            transcribe_kwargs[key] = overrides[key]
+    vad_parameters = transcribe_kwargs.get("vad_parameters")
+    if isinstance(vad_parameters, dict):
+        vad_parameters = dict(vad_parameters)
+        vad_parameters["min_silence_duration_ms"] = overrides["vad_min_silence_ms"]
+        vad_parameters["speech_pad_ms"] = overrides["vad_speech_pad_ms"]
+        transcribe_kwargs["vad_parameters"] = vad_parameters
+    return transcribe_kwargs
+
+
+def select_transcription_preset(*, queue_depth, age_seconds, priority):
+    """
+    Escolhe o preset do job: rápido com fila longa ou gravação esperando
+    demais, alta fidelidade com fila ociosa ou prioridade alta. Prioridade
+    alta nunca desce abaixo do padrão.
+    """
+    if not Config.TRANSCRIBE_ADAPTIVE_PRESETS:
+        return None
+    high_priority = int(priority or 0) >= int(Config.TRANSCRIBE_PRESET_HIGH_PRIORITY or 10)
+    backlog = int(queue_depth or 0) >= max(1, int(Config.TRANSCRIBE_PRESET_FAST_QUEUE_DEPTH or 10))
+    stale = float(age_seconds or 0) >= max(60, int(Config.TRANSCRIBE_PRESET_FAST_AGE_SECONDS or 3600))
+    if backlog or stale:
+        return PRESET_DEFAULT if high_priority else PRESET_FAST
+    if high_priority or int(queue_depth or 0) <= int(Config.TRANSCRIBE_PRESET_IDLE_QUEUE_DEPTH or 0):
+        return PRESET_HIGH
+    return PRESET_DEFAULT
+
+
+def next_offpeak_start(now=None):
+    """Início da próxima janela fora de pico (ou agora, se já estiver nela)."""
+    now = now or datetime.now(tz=LOCAL_TZ)
+    start_hour = int(Config.TRANSCRIBE_OFFPEAK_START_HOUR or 0) % 24
+    end_hour = int(Config.TRANSCRIBE_OFFPEAK_END_HOUR or 0) % 24
+    hour = now.hour
+    if start_hour <= end_hour:
+        inside = start_hour <= hour < end_hour
+    else:
+        inside = hour >= start_hour or hour < end_hour
+    if inside:
+        return now
+    start = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+    if start <= now:
+        start += timedelta(days=1)
+    return start
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from app import db
+from config import Config
+
+# gravacao_id -> Event de cancelamento das transcrições rodando neste processo
+_CANCEL_EVENTS = {}
+_CANCEL_EVENTS_LOCK = threading.Lock()
+
+
+def get_progress_flush_seconds():
+    try:
+        return max(0.5, float(Config.TRANSCRIBE_PROGRESS_FLUSH_SECONDS or 5))
+    except Exception:
+        return 5.0
+
+
+def register_transcription_cancel(gravacao_id):
+    event = threading.Event()
+    with _CANCEL_EVENTS_LOCK:
+        _CANCEL_EVENTS[gravacao_id] = event
+    return event
+
+
+def release_transcription_cancel(gravacao_id, event):
+    with _CANCEL_EVENTS_LOCK:
+        if _CANCEL_EVENTS.get(gravacao_id) is event:
+            _CANCEL_EVENTS.pop(gravacao_id, None)
+
+
+def signal_transcription_cancel(gravacao_id):
+    """Avisa a transcrição local da gravação; retorna False se ela não roda aqui."""
+    with _CANCEL_EVENTS_LOCK:
+        event = _CANCEL_EVENTS.get(gravacao_id)
+    if event is None:
+        return False
+    event.set()
+    return True
+
+
+class TranscriptionProgress:
+    """
+    Acumula progresso e texto parcial em memória e grava no banco no máximo
+    uma vez a cada TRANSCRIBE_PROGRESS_FLUSH_SECONDS.
+
+    O cancelamento chega pelo Event registrado para a gravação (pedido feito
+    neste processo); pedidos de outro processo/réplica são vistos pela
+    leitura da linha, feita no mesmo ritmo do flush.
+    """
+
+    def __init__(self, gravacao, commit, *, progress=0, flush_seconds=None):
+        self.gravacao = gravacao
+        self._commit = commit
+        self.flush_seconds = flush_seconds if flush_seconds is not None else get_progress_flush_seconds()
+        self.progress_step = max(1, int(Config.TRANSCRIBE_PROGRESS_STEP or 5))
+        self.text_update_seconds = max(1, int(Config.TRANSCRIBE_TEXT_UPDATE_SECONDS or 10))
+        self.progress = progress
+        self.flushed_progress = progress
+        self.parts = []
+        self.flushed_parts = 0
+        self.audio_end = 0.0
+        self.flushed_audio_end = 0.0
+        self._last_flush = time.monotonic()
+        self._last_check = self._last_flush
+        self._cancel_event = register_transcription_cancel(gravacao.id)
+
+    def update(self, *, progress=None, text=None, audio_end=None):
+        if progress is not None:
+            self.progress = max(self.progress, progress)
+        if text:
+            self.parts.append(text)
+        if audio_end:
+            self.audio_end = float(audio_end)
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    @property
+    def text(self):
+        return " ".join(self.parts).strip()
+
+    def _pending(self):
+        progress_due = self.progress > self.flushed_progress and (
+            (self.progress - self.flushed_progress) >= self.progress_step or self.progress >= 99
+        )
+        text_due = (
+            len(self.parts) > self.flushed_parts
+            and (self.audio_end - self.flushed_audio_end) >= self.text_update_seconds
+        )
+        return progress_due, text_due
+
+    def flush(self, *, force=False):
+        self._last_flush = time.monotonic()
+        progress_due, text_due = self._pending()
+        if force:
+            progress_due = self.progress != self.flushed_progress
+            text_due = len(self.parts) > self.flushed_parts
+        if not (progress_due or text_due):
+            return False
+        self._commit(
+            status="processando",
+            progresso=self.progress,
+            texto=self.text if text_due else None,
+        )
+        self.flushed_progress = self.progress
+        if text_due:
+            self.flushed_parts = len(self.parts)
+            self.flushed_audio_end = self.audio_end
+        # O commit expira a instância: a próxima leitura já vem do banco.
+        self._last_check = self._last_flush
+        return True
+
+    def cancelled(self):
+        if self._cancel_event.is_set():
+            return True
+        now = time.monotonic()
+        if now - self._last_check < self.flush_seconds:
+            return bool(self.gravacao.transcricao_cancelada)
+        self._last_check = now
+        try:
+            db.session.refresh(self.gravacao)
+        except Exception:
+            return False
+        return bool(self.gravacao.transcricao_cancelada)
+
+    def close(self):
+        release_transcription_cancel(self.gravacao.id, self._cancel_event)
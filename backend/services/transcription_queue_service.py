@@ -0,0 +1,296 @@
+from datetime import timedelta
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from config import Config
+from models.gravacao import Gravacao
+from models.transcription_job import TRANSCRIPTION_JOB_ACTIVE_STATUSES, TranscriptionJob
+
+
+def get_lease_seconds():
+    try:
+        return max(30, int(Config.TRANSCRIBE_JOB_LEASE_SECONDS or 120))
+    except Exception:
+        return 120
+
+
+def get_max_attempts():
+    try:
+        return max(1, int(Config.TRANSCRIBE_JOB_MAX_ATTEMPTS or 3))
+    except Exception:
+        return 3
+
+
+def _get_retry_backoff_seconds(attempts):
+    try:
+        base = max(1, int(Config.TRANSCRIBE_JOB_RETRY_BACKOFF_SECONDS or 60))
+    except Exception:
+        base = 60
+    return base * (2 ** max(0, int(attempts or 1) - 1))
+
+
+def enqueue_transcription(gravacao_id, *, force=False, priority=0, preset=None, available_at=None, rerun=False):
+    """
+    Enfileira a transcrição no banco. Se já existe job ativo para a gravação,
+    apenas eleva prioridade/force do job pendente (um pedido normal sobre um
+    reprocessamento agendado o transforma em job comum, disponível já).
+    """
+    job = TranscriptionJob(
+        gravacao_id=gravacao_id,
+        status='pendente',
+        prioridade=int(priority or 0),
+        force=bool(force),
+        preset=preset or None,
+        reprocessamento=bool(rerun),
+        max_tentativas=get_max_attempts(),
+    )
+    if available_at is not None:
+        job.disponivel_em = available_at
+    db.session.add(job)
+    try:
+        db.session.commit()
+        return job
+    except IntegrityError:
+        db.session.rollback()
+
+    existing = (
+        TranscriptionJob.query.filter(
+            TranscriptionJob.gravacao_id == gravacao_id,
+            TranscriptionJob.status.in_(TRANSCRIPTION_JOB_ACTIVE_STATUSES),
+        )
+        .first()
+    )
+    if existing is not None and existing.status == 'pendente':
+        changed = False
+        if force and not existing.force:
+            existing.force = True
+            changed = True
+        if int(priority or 0) > (existing.prioridade or 0):
+            existing.prioridade = int(priority or 0)
+            changed = True
+        if existing.reprocessamento and not rerun:
+            existing.reprocessamento = False
+            existing.preset = preset or None
+            existing.disponivel_em = func.now()
+            changed = True
+        if changed:
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+    return existing
+
+
+def count_pending_transcription_jobs():
+    """Jobs prontos para rodar agora (reprocessamentos agendados ficam de fora)."""
+    try:
+        return (
+            db.session.query(func.count(TranscriptionJob.id))
+            .filter(
+                TranscriptionJob.status == 'pendente',
+                TranscriptionJob.disponivel_em <= func.now(),
+            )
+            .scalar()
+            or 0
+        )
+    except Exception:
+        db.session.rollback()
+        return 0
+
+
+def _claimed_job_payload(job):
+    return {
+        'id': job.id,
+        'gravacao_id': job.gravacao_id,
+        'force': bool(job.force),
+        'tentativas': job.tentativas,
+        'prioridade': job.prioridade or 0,
+        'preset': job.preset,
+        'reprocessamento': bool(job.reprocessamento),
+        'criado_em': job.criado_em,
+    }
+
+
+def has_active_transcription_job(gravacao_id):
+    return (
+        db.session.query(TranscriptionJob.id)
+        .filter(
+            TranscriptionJob.gravacao_id == gravacao_id,
+            TranscriptionJob.status.in_(TRANSCRIPTION_JOB_ACTIVE_STATUSES),
+        )
+        .first()
+        is not None
+    )
+
+
+def has_running_transcription_job(gravacao_id):
+    return (
+        db.session.query(TranscriptionJob.id)
+        .filter(
+            TranscriptionJob.gravacao_id == gravacao_id,
+            TranscriptionJob.status == 'executando',
+        )
+        .first()
+        is not None
+    )
+
+
+def claim_transcription_job(worker_id):
+    """
+    Reserva o próximo job (pendente, ou executando com lease vencido) com
+    FOR UPDATE SKIP LOCKED, para que réplicas e workers avulsos nunca peguem
+    o mesmo job. Jobs que esgotaram as tentativas vão para 'morto'.
+    """
+    while True:
+        now = func.now()
+        job = (
+            TranscriptionJob.query.filter(
+                or_(
+                    and_(
+                        TranscriptionJob.status == 'pendente',
+                        TranscriptionJob.disponivel_em <= now,
+                    ),
+                    and_(
+                        TranscriptionJob.status == 'executando',
+                        TranscriptionJob.lease_expira_em < now,
+                    ),
+                )
+            )
+            .order_by(TranscriptionJob.prioridade.desc(), TranscriptionJob.criado_em.asc())
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.session.rollback()
+            return None
+
+        if job.status == 'executando' and (job.tentativas or 0) >= (job.max_tentativas or 1):
+            job.status = 'morto'
+            job.ultimo_erro = job.ultimo_erro or 'lease_expirado'
+            job.lease_owner = None
+            job.lease_expira_em = None
+            db.session.commit()
+            continue
+
+        job.status = 'executando'
+        job.tentativas = (job.tentativas or 0) + 1
+        job.lease_owner = worker_id
+        job.lease_expira_em = now + timedelta(seconds=get_lease_seconds())
+        db.session.commit()
+        return _claimed_job_payload(job)
+
+
+def claim_transcription_jobs(worker_id, *, limit, max_duration_seconds):
+    """
+    Reserva até `limit` jobs pendentes de gravações curtas (duração conhecida
+    e <= max_duration_seconds) para transcrição em lote. Jobs com preset
+    próprio (reprocessamentos) seguem pelo caminho individual.
+    """
+    now = func.now()
+    jobs = (
+        TranscriptionJob.query.join(Gravacao, Gravacao.id == TranscriptionJob.gravacao_id)
+        .filter(
+            TranscriptionJob.status == 'pendente',
+            TranscriptionJob.disponivel_em <= now,
+            TranscriptionJob.preset.is_(None),
+            TranscriptionJob.reprocessamento.is_(False),
+            Gravacao.duracao_segundos > 0,
+            Gravacao.duracao_segundos <= max_duration_seconds,
+        )
+        .order_by(TranscriptionJob.prioridade.desc(), TranscriptionJob.criado_em.asc())
+        .with_for_update(skip_locked=True, of=TranscriptionJob)
+        .limit(max(1, int(limit or 1)))
+        .all()
+    )
+    if not jobs:
+        db.session.rollback()
+        return []
+    claimed = []
+    for job in jobs:
+        job.status = 'executando'
+        job.tentativas = (job.tentativas or 0) + 1
+        job.lease_owner = worker_id
+        job.lease_expira_em = now + timedelta(seconds=get_lease_seconds())
+        claimed.append(job)
+    db.session.commit()
+    return [_claimed_job_payload(job) for job in claimed]
+
+
+def _owned_job_query(job_id, worker_id):
+    return TranscriptionJob.query.filter(
+        TranscriptionJob.id == job_id,
+        TranscriptionJob.status == 'executando',
+        TranscriptionJob.lease_owner == worker_id,
+    )
+
+
+def heartbeat_transcription_job(job_id, worker_id):
+    """Renova o lease; False indica que o job foi perdido para outro worker."""
+    try:
+        updated = _owned_job_query(job_id, worker_id).update(
+            {TranscriptionJob.lease_expira_em: func.now() + timedelta(seconds=get_lease_seconds())},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        return updated > 0
+    except Exception:
+        db.session.rollback()
+        return True
+
+
+def complete_transcription_job(job_id, worker_id):
+    try:
+        _owned_job_query(job_id, worker_id).update(
+            {
+                TranscriptionJob.status: 'concluido',
+                TranscriptionJob.lease_owner: None,
+                TranscriptionJob.lease_expira_em: None,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+
+def fail_transcription_job(job_id, worker_id, error, *, retry=True):
+    """Devolve o job para a fila com backoff exponencial ou manda para 'morto'."""
+    try:
+        job = _owned_job_query(job_id, worker_id).with_for_update().first()
+        if job is None:
+            db.session.rollback()
+            return
+        job.ultimo_erro = str(error or '')[:500] or None
+        job.lease_owner = None
+        job.lease_expira_em = None
+        if retry and (job.tentativas or 0) < (job.max_tentativas or 1):
+            job.status = 'pendente'
+            job.disponivel_em = func.now() + timedelta(seconds=_get_retry_backoff_seconds(job.tentativas))
+        else:
+            job.status = 'morto'
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+
+def cancel_transcription_jobs(gravacao_id):
+    """Descarta jobs pendentes; o executando para pelo flag de cancelamento."""
+    try:
+        TranscriptionJob.query.filter(
+            TranscriptionJob.gravacao_id == gravacao_id,
+            TranscriptionJob.status == 'pendente',
+        ).update({TranscriptionJob.status: 'cancelado'}, synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+
+def get_transcription_queue_stats():
+    rows = (
+        db.session.query(TranscriptionJob.status, func.count(TranscriptionJob.id))
+        .group_by(TranscriptionJob.status)
+        .all()
+    )
+    return {status: count for status, count in rows}
@@ -0,0 +1,120 @@
+from sqlalchemy import func
+
+from app import db
+from models.gravacao import Gravacao
+from models.radio import Radio
+from models.transcription_segment import SEARCH_TEXT_CONFIG, TranscriptionSegment
+
+HEADLINE_OPTIONS = "StartSel=<mark>,StopSel=</mark>,MaxWords=40,MinWords=15,MaxFragments=2"
+
+
+def _build_tsquery(query_text):
+    # websearch_to_tsquery aceita aspas, OR e -termo sem erro de sintaxe
+    return func.websearch_to_tsquery(SEARCH_TEXT_CONFIG, query_text)
+
+
+def _apply_search_filters(query, *, user_id, is_admin, radio_id=None, cidade=None, estado=None, data_inicio=None, data_fim=None):
+    if not is_admin:
+        query = query.filter(Gravacao.user_id == user_id)
+    if radio_id and radio_id != 'all':
+        query = query.filter(Gravacao.radio_id == radio_id)
+    if data_inicio is not None:
+        query = query.filter(Gravacao.criado_em >= data_inicio)
+    if data_fim is not None:
+        query = query.filter(Gravacao.criado_em <= data_fim)
+    if cidade or estado:
+        query = query.join(Radio, Radio.id == Gravacao.radio_id)
+        if cidade:
+            query = query.filter(Radio.cidade.ilike(f"%{cidade}%"))
+        if estado:
+            query = query.filter(func.upper(Radio.estado) == estado.upper())
+    return query
+
+
+def search_transcriptions(query_text, *, user_id, is_admin, limit, offset=0, hits_per_recording=5, **filters):
+    """
+    Busca textual nos segmentos transcritos (tsvector 'portuguese' + GIN).
+
+    Retorna (total, resultados), com resultados ordenados por relevância:
+    [{gravacao_id, score, total_hits, hits: [{segment_id, start, end, text, highlight}]}].
+    """
+    tsquery = _build_tsquery(query_text)
+    rank = func.ts_rank_cd(TranscriptionSegment.busca, tsquery)
+
+    matches = _apply_search_filters(
+        db.session.query(
+            TranscriptionSegment.gravacao_id.label('gravacao_id'),
+            func.sum(rank).label('score'),
+            func.count(TranscriptionSegment.id).label('total_hits'),
+        )
+        .join(Gravacao, Gravacao.id == TranscriptionSegment.gravacao_id)
+        .filter(TranscriptionSegment.busca.op('@@')(tsquery)),
+        user_id=user_id,
+        is_admin=is_admin,
+        **filters,
+    ).group_by(TranscriptionSegment.gravacao_id, Gravacao.criado_em)
+
+    total = db.session.query(func.count()).select_from(matches.subquery()).scalar() or 0
+    if not total:
+        return 0, []
+
+    ranked = (
+        matches.order_by(func.sum(rank).desc(), Gravacao.criado_em.desc())
+        .offset(max(0, int(offset or 0)))
+        .limit(max(1, int(limit or 1)))
+        .all()
+    )
+    if not ranked:
+        return total, []
+
+    results = {
+        row.gravacao_id: {
+            'gravacao_id': row.gravacao_id,
+            'score': float(row.score or 0),
+            'total_hits': int(row.total_hits or 0),
+            'hits': [],
+        }
+        for row in ranked
+    }
+
+    # Só os melhores trechos de cada gravação da página, na ordem do áudio
+    position = func.row_number().over(
+        partition_by=TranscriptionSegment.gravacao_id,
+        order_by=(rank.desc(), TranscriptionSegment.inicio.asc()),
+    ).label('posicao')
+    best = (
+        db.session.query(
+            TranscriptionSegment.gravacao_id.label('gravacao_id'),
+            TranscriptionSegment.id.label('segment_id'),
+            TranscriptionSegment.inicio.label('inicio'),
+            TranscriptionSegment.fim.label('fim'),
+            TranscriptionSegment.texto.label('texto'),
+            position,
+        )
+        .filter(TranscriptionSegment.gravacao_id.in_(list(results.keys())))
+        .filter(TranscriptionSegment.busca.op('@@')(tsquery))
+        .subquery()
+    )
+    hits = (
+        db.session.query(
+            best.c.gravacao_id,
+            best.c.segment_id,
+            best.c.inicio,
+            best.c.fim,
+            best.c.texto,
+            func.ts_headline(SEARCH_TEXT_CONFIG, best.c.texto, tsquery, HEADLINE_OPTIONS),
+        )
+        .filter(best.c.posicao <= max(1, int(hits_per_recording or 1)))
+        .order_by(best.c.gravacao_id, best.c.inicio)
+        .all()
+    )
+    for gravacao_id, segment_id, inicio, fim, texto, highlight in hits:
+        results[gravacao_id]['hits'].append({
+            'segment_id': segment_id,
+            'start': inicio,
+            'end': fim,
+            'text': texto,
+            'highlight': highlight,
+        })
+
+    return total, [results[row.gravacao_id] for row in ranked]
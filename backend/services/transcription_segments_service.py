@@ -0,0 +1,153 @@
+import json
+import os
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import undefer
+
+from app import db
+from config import Config
+from models.transcription_segment import TranscriptionSegment, pack_words, unpack_words
+
+
+def _legacy_segments_path(gravacao_id):
+    if not gravacao_id:
+        return None
+    return os.path.join(Config.STORAGE_PATH, "transcripts", f"{gravacao_id}.segments.json")
+
+
+def _build_rows(gravacao_id, segments, first_order):
+    rows = []
+    for index, segment in enumerate(segments or []):
+        if not isinstance(segment, dict):
+            continue
+        rows.append({
+            "gravacao_id": gravacao_id,
+            "ordem": first_order + index,
+            "inicio": float(segment.get("start") or 0),
+            "fim": float(segment.get("end") or 0),
+            "texto": str(segment.get("text") or ""),
+            "palavras": pack_words(segment.get("words")),
+        })
+    return rows
+
+
+def _insert_rows(rows):
+    if rows:
+        db.session.execute(insert(TranscriptionSegment), rows)
+
+
+def replace_transcription_segments(gravacao_id, segments):
+    """Substitui todos os segmentos da gravação (uma transação)."""
+    if not gravacao_id:
+        return
+    try:
+        TranscriptionSegment.query.filter_by(gravacao_id=gravacao_id).delete(synchronize_session=False)
+        _insert_rows(_build_rows(gravacao_id, segments, 0))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return
+    _remove_legacy_file(gravacao_id)
+
+
+def append_transcription_segments(gravacao_id, segments):
+    if not gravacao_id or not segments:
+        return
+    try:
+        last_order = (
+            db.session.query(func.max(TranscriptionSegment.ordem))
+            .filter(TranscriptionSegment.gravacao_id == gravacao_id)
+            .scalar()
+        )
+        first_order = 0 if last_order is None else last_order + 1
+        _insert_rows(_build_rows(gravacao_id, segments, first_order))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+
+def reset_transcription_segments(gravacao_id):
+    if not gravacao_id:
+        return
+    try:
+        TranscriptionSegment.query.filter_by(gravacao_id=gravacao_id).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+    _remove_legacy_file(gravacao_id)
+
+
+def get_transcription_segments(gravacao_id, *, start=None, end=None, include_words=True):
+    """
+    Segmentos da gravação em ordem, opcionalmente só os que cruzam o
+    intervalo [start, end] (segundos). Sem include_words, as palavras não
+    saem do banco; use load_segment_words com os ids quando precisar.
+    """
+    if not gravacao_id:
+        return []
+    query = TranscriptionSegment.query.filter(TranscriptionSegment.gravacao_id == gravacao_id)
+    if end is not None:
+        query = query.filter(TranscriptionSegment.inicio <= float(end))
+    if start is not None:
+        query = query.filter(TranscriptionSegment.fim >= float(start))
+    if include_words:
+        query = query.options(undefer(TranscriptionSegment.palavras))
+    rows = query.order_by(TranscriptionSegment.ordem.asc()).all()
+    if not rows and import_legacy_segments(gravacao_id):
+        return get_transcription_segments(gravacao_id, start=start, end=end, include_words=include_words)
+    return [row.to_dict(include_words=include_words) for row in rows]
+
+
+def load_segment_words(segment_ids):
+    """{id_do_segmento: [palavras]} para os segmentos pedidos."""
+    ids = [segment_id for segment_id in segment_ids or [] if segment_id is not None]
+    if not ids:
+        return {}
+    rows = (
+        db.session.query(TranscriptionSegment.id, TranscriptionSegment.palavras)
+        .filter(TranscriptionSegment.id.in_(ids))
+        .all()
+    )
+    return {segment_id: unpack_words(palavras) for segment_id, palavras in rows}
+
+
+def import_legacy_segments(gravacao_id):
+    """
+    Migra o antigo storage/transcripts/<id>.segments.json para a tabela.
+    Retorna quantos segmentos foram importados.
+    """
+    path = _legacy_segments_path(gravacao_id)
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            data = json.load(fp) or {}
+    except Exception:
+        return 0
+    segments = data.get("segments")
+    if not isinstance(segments, list):
+        segments = []
+    rows = _build_rows(gravacao_id, segments, 0)
+    try:
+        exists = (
+            db.session.query(TranscriptionSegment.id)
+            .filter(TranscriptionSegment.gravacao_id == gravacao_id)
+            .first()
+        )
+        if exists is None:
+            _insert_rows(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return 0
+    _remove_legacy_file(gravacao_id)
+    return len(rows)
+
+
+def _remove_legacy_file(gravacao_id):
+    path = _legacy_segments_path(gravacao_id)
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
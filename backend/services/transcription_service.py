@@ -1,31 +1,77 @@
-import json
+import functools
+import itertools
 import os
-import queue
-import subprocess
-import tempfile
+import socket
 import threading
-from collections import Counter
+from datetime import datetime, timedelta
 
 from flask import current_app, has_app_context
-from sqlalchemy import or_
 
 from app import db
 from config import Config
-from models.gravacao import Gravacao
+from models.gravacao import LOCAL_TZ, Gravacao
+from models.transcription_job import TRANSCRIPTION_JOB_ACTIVE_STATUSES, TranscriptionJob
+from services.audio_location_service import forget_local_audio
 from services.audio_storage_service import get_dropbox_marker_path, resolve_audio_filepath
+from services.media_probe_service import probe_duration_seconds
+from services.transcription_audio import (
+    WHISPER_SAMPLE_RATE,
+    cleanup_transcription_audio,
+    load_transcription_audio,
+)
+from services.transcription_batch import transcribe_batch
+from services.transcription_pool import (
+    build_segment_payload as _build_segment_payload,
+    get_pool_size,
+    get_transcription_pool,
+    is_pool_enabled,
+)
+from services.transcription_presets import (
+    PRESET_FAST,
+    PRESET_HIGH,
+    apply_transcription_preset,
+    get_preset_model,
+    get_transcription_priority,
+    next_offpeak_start,
+    select_transcription_preset,
+)
+from services.transcription_progress import TranscriptionProgress, signal_transcription_cancel
+from services.transcription_queue_service import (
+    cancel_transcription_jobs,
+    claim_transcription_job,
+    claim_transcription_jobs,
+    complete_transcription_job,
+    count_pending_transcription_jobs,
+    enqueue_transcription,
+    fail_transcription_job,
+    get_lease_seconds,
+    has_active_transcription_job,
+    has_running_transcription_job,
+    heartbeat_transcription_job,
+)
+from services.alert_service import evaluate_keyword_alerts
+from services.tag_cloud_service import refresh_tag_occurrences_for_gravacao
+from services.transcription_segments_service import replace_transcription_segments
 from services.websocket_service import broadcast_update
 
-_MODEL = None
+# Modelos carregados por nome (presets podem usar modelos diferentes)
+_MODELS = {}
 _MODEL_LOCK = threading.Lock()
 _TRANSCRIBE_LOCK = threading.Lock()
-_TRANSCRIBE_QUEUE = queue.Queue()
 _TRANSCRIBE_WORKERS = []
 _TRANSCRIBE_WORKER_LOCK = threading.Lock()
-_TRANSCRIBE_IN_FLIGHT = Counter()
-_TRANSCRIBE_IN_FLIGHT_LOCK = threading.Lock()
-_TRANSCRIBE_ACTIVE = 0
-_TRANSCRIBE_ACTIVE_LOCK = threading.Lock()
-_RECOVERABLE_TRANSCRIPTION_STATUSES = ("fila", "processando")
+_TRANSCRIBE_WAKE = threading.Event()
+_TRANSCRIBE_WORKER_IDS = itertools.count()
+MANUAL_TRANSCRIPTION_PRIORITY = 10
+# Reprocessamentos fora de pico ficam atrás de qualquer job normal
+OFFPEAK_RERUN_PRIORITY = -10
+# Erros que não mudam numa nova tentativa: o job vai direto para 'morto'
+_PERMANENT_TRANSCRIPTION_ERRORS = (
+    "arquivo_de_audio_nao_encontrado",
+    "arquivo_de_audio_invalido",
+    "transcricao_vazia",
+)
+_BACKFILL_STALE_MINUTES = 10
 
 def _safe_session_remove(app_obj=None):
     """Fecha a sessão do SQLAlchemy com contexto ativo."""
@@ -41,75 +87,435 @@ def _safe_session_remove(app_obj=None):
 
 
 def _get_transcribe_max_workers():
+    if is_pool_enabled():
+        # Uma thread por processo do pool: ela só espera os segmentos e grava no banco.
+        return get_pool_size()
     try:
         return max(1, int(Config.TRANSCRIBE_MAX_CONCURRENT or 1))
     except Exception:
         return 1
 
 
-def _get_transcribe_recovery_batch_size():
+def _is_batch_enabled():
+    # O lote roda com o modelo do próprio processo; no modo pool cada job já tem um processo.
+    return bool(Config.TRANSCRIBE_BATCH_ENABLED) and not is_pool_enabled()
+
+
+def _get_batch_recordings():
     try:
-        return max(1, int(Config.TRANSCRIBE_RECOVERY_BATCH_SIZE or 5))
+        return max(1, int(Config.TRANSCRIBE_BATCH_RECORDINGS or 8))
+    except Exception:
+        return 8
+
+
+def _get_batch_max_duration_seconds():
+    try:
+        return max(1, int(Config.TRANSCRIBE_BATCH_MAX_DURATION_SECONDS or 900))
+    except Exception:
+        return 900
+
+
+def _get_transcribe_poll_seconds():
+    try:
+        return max(1, int(Config.TRANSCRIBE_JOB_POLL_SECONDS or 5))
     except Exception:
         return 5
 
 
-def _ensure_transcribe_workers():
+def _build_worker_id(index):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def start_transcription_workers(app_obj=None):
+    """Inicia os workers locais que consomem a fila de transcrição do banco."""
+    if not Config.TRANSCRIBE_ENABLED:
+        return 0
+    if app_obj is None:
+        app_obj = current_app._get_current_object()
     max_workers = _get_transcribe_max_workers()
     with _TRANSCRIBE_WORKER_LOCK:
         alive_workers = [worker for worker in _TRANSCRIBE_WORKERS if worker.is_alive()]
         _TRANSCRIBE_WORKERS[:] = alive_workers
         while len(_TRANSCRIBE_WORKERS) < max_workers:
-            worker = threading.Thread(target=_transcribe_worker, daemon=True)
+            index = next(_TRANSCRIBE_WORKER_IDS)
+            worker = threading.Thread(
+                target=_transcribe_worker,
+                args=(app_obj, _build_worker_id(index)),
+                name=f"transcribe-worker-{index}",
+                daemon=True,
+            )
             _TRANSCRIBE_WORKERS.append(worker)
             worker.start()
+        return len(_TRANSCRIBE_WORKERS)
 
 
-def _transcribe_worker():
-    global _TRANSCRIBE_ACTIVE
+def _transcribe_worker(app_obj, worker_id):
     while True:
-        job = _TRANSCRIBE_QUEUE.get()
+        job = None
+        batch = []
+        try:
+            with app_obj.app_context():
+                if _is_batch_enabled():
+                    batch = claim_transcription_jobs(
+                        worker_id,
+                        limit=_get_batch_recordings(),
+                        max_duration_seconds=_get_batch_max_duration_seconds(),
+                    )
+                    if len(batch) == 1:
+                        job = batch.pop()
+                if not batch and job is None:
+                    job = claim_transcription_job(worker_id)
+        except Exception:
+            job = None
+            with app_obj.app_context():
+                try:
+                    current_app.logger.exception("Falha ao reservar job de transcricao")
+                except Exception:
+                    pass
+        finally:
+            _safe_session_remove(app_obj)
+
+        if batch:
+            _run_transcription_batch(app_obj, worker_id, batch)
+            continue
         if job is None:
-            _TRANSCRIBE_QUEUE.task_done()
-            break
-        gravacao_id = job.get("gravacao_id")
-        force = bool(job.get("force"))
-        app_obj = job.get("app_obj")
+            _TRANSCRIBE_WAKE.wait(_get_transcribe_poll_seconds())
+            _TRANSCRIBE_WAKE.clear()
+            continue
+        _run_transcription_job(app_obj, worker_id, job)
 
-        with _TRANSCRIBE_ACTIVE_LOCK:
-            _TRANSCRIBE_ACTIVE += 1
 
-        ctx = None
+def _run_lease_heartbeat(app_obj, job_ids, worker_id, stop_event):
+    interval = max(5, get_lease_seconds() // 3)
+    while not stop_event.wait(interval):
         try:
-            if app_obj:
-                ctx = app_obj.app_context()
-                ctx.push()
-            try:
-                gravacao = Gravacao.query.get(gravacao_id)
-            except Exception:
-                gravacao = None
-            if gravacao and gravacao.transcricao_cancelada:
+            with app_obj.app_context():
+                for job_id in job_ids:
+                    if not heartbeat_transcription_job(job_id, worker_id):
+                        current_app.logger.warning(
+                            "Lease do job de transcricao %s perdido por %s", job_id, worker_id
+                        )
+        except Exception:
+            pass
+        finally:
+            _safe_session_remove(app_obj)
+
+
+def _select_job_preset(job):
+    if job.get("preset"):
+        return job["preset"]
+    criado_em = job.get("criado_em")
+    age_seconds = 0
+    if criado_em is not None:
+        age_seconds = (datetime.now(tz=LOCAL_TZ) - criado_em).total_seconds()
+    preset = select_transcription_preset(
+        queue_depth=count_pending_transcription_jobs(),
+        age_seconds=age_seconds,
+        priority=job.get("prioridade", 0),
+    )
+    if preset:
+        current_app.logger.info(
+            "Transcricao %s com preset %s (prioridade %s, espera %ss)",
+            job["gravacao_id"],
+            preset,
+            job.get("prioridade", 0),
+            int(age_seconds),
+        )
+    return preset
+
+
+def _schedule_offpeak_rerun(gravacao_id):
+    """Reenfileira em alta fidelidade, na próxima janela fora de pico."""
+    if not Config.TRANSCRIBE_OFFPEAK_RERUN:
+        return
+    if _local_audio_removed_after_transcription():
+        # Sem cópia local até a janela fora de pico: o job só falharia
+        return
+    try:
+        enqueue_transcription(
+            gravacao_id,
+            force=True,
+            priority=OFFPEAK_RERUN_PRIORITY,
+            preset=PRESET_HIGH,
+            available_at=next_offpeak_start(),
+            rerun=True,
+        )
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Falha ao agendar reprocessamento da transcricao %s", gravacao_id)
+
+
+def _run_transcription_job(app_obj, worker_id, job):
+    job_id = job["id"]
+    gravacao_id = job["gravacao_id"]
+    stop_heartbeat = threading.Event()
+    threading.Thread(
+        target=_run_lease_heartbeat,
+        args=(app_obj, [job_id], worker_id, stop_heartbeat),
+        daemon=True,
+    ).start()
+
+    ctx = app_obj.app_context()
+    ctx.push()
+    try:
+        gravacao = Gravacao.query.get(gravacao_id)
+        if gravacao is None:
+            complete_transcription_job(job_id, worker_id)
+            return
+        if gravacao.transcricao_cancelada:
+            _commit_transcription(
+                gravacao,
+                status="interrompido",
+                progresso=gravacao.transcricao_progresso or 0,
+                cancelada=True,
+            )
+            complete_transcription_job(job_id, worker_id)
+            return
+
+        preset = _select_job_preset(job)
+        if transcribe_gravacao(
+            gravacao_id,
+            force=job["force"],
+            preset=preset,
+            rerun=job.get("reprocessamento", False),
+        ):
+            complete_transcription_job(job_id, worker_id)
+            if preset == PRESET_FAST:
+                _schedule_offpeak_rerun(gravacao_id)
+            return
+
+        gravacao = Gravacao.query.get(gravacao_id)
+        if gravacao is not None and gravacao.transcricao_status == "erro":
+            erro = gravacao.transcricao_erro or "erro"
+            fail_transcription_job(
+                job_id,
+                worker_id,
+                erro,
+                retry=erro not in _PERMANENT_TRANSCRIPTION_ERRORS,
+            )
+        else:
+            complete_transcription_job(job_id, worker_id)
+    except Exception as exc:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        fail_transcription_job(job_id, worker_id, str(exc))
+    finally:
+        stop_heartbeat.set()
+        ctx.pop()
+        _safe_session_remove(app_obj)
+
+
+def _build_batch_transcribe_kwargs():
+    # Um lote mistura rádios: prompt e hotwords por emissora ficam de fora.
+    transcribe_kwargs = {
+        "language": Config.TRANSCRIBE_LANGUAGE or None,
+        "beam_size": max(1, int(Config.TRANSCRIBE_BEAM_SIZE or 1)),
+        "best_of": max(1, int(Config.TRANSCRIBE_BEST_OF or 1)),
+        "patience": max(1.0, float(Config.TRANSCRIBE_PATIENCE or 1.0)),
+        "word_timestamps": bool(Config.TRANSCRIBE_WORD_TIMESTAMPS),
+    }
+    prompt = _normalize_hint(Config.TRANSCRIBE_INITIAL_PROMPT)
+    if prompt:
+        transcribe_kwargs["initial_prompt"] = prompt
+    hotwords = _normalize_hint(Config.TRANSCRIBE_HOTWORDS)
+    if hotwords:
+        transcribe_kwargs["hotwords"] = hotwords
+    return transcribe_kwargs
+
+
+def _build_batch_vad_parameters():
+    if not Config.TRANSCRIBE_VAD:
+        return None
+    return {
+        "min_silence_duration_ms": int(Config.TRANSCRIBE_VAD_MIN_SILENCE_MS or 2000),
+        "speech_pad_ms": int(Config.TRANSCRIBE_VAD_SPEECH_PAD_MS or 500),
+    }
+
+
+def _finish_batch_entry(entry, worker_id, detected_lang):
+    entry["done"] = True
+    gravacao = entry["gravacao"]
+    job_id = entry["job"]["id"]
+    reporter = entry["reporter"]
+    reporter.close()
+    texto = reporter.text
+    try:
+        db.session.refresh(gravacao)
+    except Exception:
+        pass
+    if gravacao.transcricao_cancelada:
+        _commit_transcription(
+            gravacao,
+            status="interrompido",
+            texto=texto,
+            progresso=reporter.progress,
+            cancelada=True,
+        )
+        complete_transcription_job(job_id, worker_id)
+        return
+    if not texto:
+        _commit_transcription(
+            gravacao,
+            status="erro",
+            erro="transcricao_vazia",
+            progresso=reporter.progress,
+        )
+        fail_transcription_job(job_id, worker_id, "transcricao_vazia", retry=False)
+        return
+    _commit_transcription(
+        gravacao,
+        status="concluido",
+        texto=texto,
+        idioma=detected_lang or Config.TRANSCRIBE_LANGUAGE,
+        modelo=Config.TRANSCRIBE_MODEL,
+        progresso=100,
+        cancelada=False,
+    )
+    replace_transcription_segments(gravacao.id, entry["segments"])
+    refresh_tag_occurrences_for_gravacao(gravacao.id)
+    evaluate_keyword_alerts(gravacao, entry["segments"])
+    _cleanup_local_audio_after_transcription(gravacao)
+    complete_transcription_job(job_id, worker_id)
+
+
+def _transcribe_batch_entries(entries, worker_id):
+    model = _load_model()
+    chunk_seconds = min(30, max(1, int(Config.TRANSCRIBE_CHUNK_LENGTH or 30)))
+    segments, info = transcribe_batch(
+        model,
+        [entry["audio"] for entry in entries],
+        _build_batch_transcribe_kwargs(),
+        batch_size=max(1, int(Config.TRANSCRIBE_BATCH_SIZE or 8)),
+        chunk_seconds=chunk_seconds,
+        vad_parameters=_build_batch_vad_parameters(),
+    )
+    detected_lang = getattr(info, "language", None)
+
+    current = None
+    for index, segment_payload, segment_end in segments:
+        # Os trechos saem na ordem da linha do tempo concatenada: ao mudar de
+        # gravação, as anteriores já receberam todos os seus segmentos.
+        if current is not None and index != current:
+            for entry in entries[:index]:
+                if not entry["done"]:
+                    _finish_batch_entry(entry, worker_id, detected_lang)
+        current = index
+
+        entry = entries[index]
+        if entry["done"]:
+            continue
+        if segment_payload:
+            entry["segments"].append(segment_payload)
+        reporter = entry["reporter"]
+        reporter.update(
+            progress=max(1, min(99, int((segment_end / entry["duration"]) * 100))),
+            text=segment_payload["text"] if segment_payload else None,
+            audio_end=segment_end,
+        )
+        if reporter.cancelled():
+            _finish_batch_entry(entry, worker_id, detected_lang)
+
+    for entry in entries:
+        if not entry["done"]:
+            _finish_batch_entry(entry, worker_id, detected_lang)
+
+
+def _run_transcription_batch(app_obj, worker_id, jobs):
+    """
+    Transcreve várias gravações curtas numa só passada do pipeline em lote.
+    Qualquer gravação que não possa entrar no lote (ou um lote que falhe)
+    segue pelo caminho individual, com o mesmo job já reservado.
+    """
+    stop_heartbeat = threading.Event()
+    threading.Thread(
+        target=_run_lease_heartbeat,
+        args=(app_obj, [job["id"] for job in jobs], worker_id, stop_heartbeat),
+        daemon=True,
+    ).start()
+
+    entries = []
+    fallback = []
+    scratch_paths = []
+    ctx = app_obj.app_context()
+    ctx.push()
+    try:
+        for job in jobs:
+            gravacao = Gravacao.query.get(job["gravacao_id"])
+            if gravacao is None:
+                complete_transcription_job(job["id"], worker_id)
+                continue
+            if gravacao.transcricao_cancelada:
                 _commit_transcription(
                     gravacao,
                     status="interrompido",
                     progresso=gravacao.transcricao_progresso or 0,
                     cancelada=True,
                 )
-            else:
-                transcribe_gravacao(gravacao_id, force=force)
-        finally:
-            if ctx:
-                ctx.pop()
-            _safe_session_remove(app_obj)
-            with _TRANSCRIBE_ACTIVE_LOCK:
-                _TRANSCRIBE_ACTIVE = max(0, _TRANSCRIBE_ACTIVE - 1)
-            with _TRANSCRIBE_IN_FLIGHT_LOCK:
-                if gravacao_id:
-                    if _TRANSCRIBE_IN_FLIGHT.get(gravacao_id, 0) > 1:
-                        _TRANSCRIBE_IN_FLIGHT[gravacao_id] -= 1
-                    else:
-                        _TRANSCRIBE_IN_FLIGHT.pop(gravacao_id, None)
-            _TRANSCRIBE_QUEUE.task_done()
+                complete_transcription_job(job["id"], worker_id)
+                continue
+            if gravacao.transcricao_texto and not job["force"]:
+                complete_transcription_job(job["id"], worker_id)
+                continue
+            filepath = _resolve_audio_filepath(gravacao)
+            if not filepath or not os.path.exists(filepath):
+                fallback.append(job)
+                continue
+            audio, scratch_path = load_transcription_audio(
+                filepath,
+                duration_seconds=gravacao.duracao_segundos,
+            )
+            if scratch_path:
+                scratch_paths.append(scratch_path)
+            if isinstance(audio, str):
+                fallback.append(job)
+                continue
+            _commit_transcription(
+                gravacao,
+                status="processando",
+                erro=None,
+                modelo=Config.TRANSCRIBE_MODEL,
+                progresso=1,
+                cancelada=False,
+            )
+            entries.append({
+                "job": job,
+                "gravacao": gravacao,
+                "audio": audio,
+                "duration": max(1.0, len(audio) / float(WHISPER_SAMPLE_RATE)),
+                "segments": [],
+                "reporter": TranscriptionProgress(
+                    gravacao,
+                    functools.partial(_commit_transcription, gravacao),
+                    progress=1,
+                ),
+                "done": False,
+            })
+        if entries:
+            _transcribe_batch_entries(entries, worker_id)
+    except Exception:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        try:
+            current_app.logger.exception("Falha na transcricao em lote; seguindo individualmente")
+        except Exception:
+            pass
+        fallback.extend(entry["job"] for entry in entries if not entry["done"])
+    finally:
+        stop_heartbeat.set()
+        for entry in entries:
+            entry["reporter"].close()
+        entries = None
+        for scratch_path in scratch_paths:
+            cleanup_transcription_audio(scratch_path)
+        ctx.pop()
+        _safe_session_remove(app_obj)
+
+    for job in fallback:
+        _run_transcription_job(app_obj, worker_id, job)
 
 
 def _get_audio_filepath(gravacao):
@@ -168,22 +574,25 @@ def _resolve_audio_filepath(gravacao):
     return resolve_audio_filepath(gravacao)
 
 
-def _cleanup_local_audio_after_transcription(gravacao):
-    if not gravacao:
-        return
+def _local_audio_removed_after_transcription():
+    """Dropbox com delete_local e retenção 0: o áudio local some ao fim da transcrição."""
     try:
         from services.dropbox_service import get_dropbox_config
-    except Exception:
-        return
-    try:
+
         dropbox_cfg = get_dropbox_config()
     except Exception:
-        return
-    if not (
+        return False
+    return bool(
         dropbox_cfg.is_ready
         and dropbox_cfg.delete_local_after_upload
         and dropbox_cfg.local_retention_days <= 0
-    ):
+    )
+
+
+def _cleanup_local_audio_after_transcription(gravacao):
+    if not gravacao:
+        return
+    if not _local_audio_removed_after_transcription():
         return
 
     filepath = _resolve_audio_filepath(gravacao)
@@ -198,27 +607,31 @@ def _cleanup_local_audio_after_transcription(gravacao):
         os.remove(marker_path)
     except Exception:
         pass
+    forget_local_audio(gravacao.id)
 
 
-def _load_model():
-    global _MODEL
-    if _MODEL is not None:
-        return _MODEL
+def _load_model(model_name=None):
+    model_name = model_name or Config.TRANSCRIBE_MODEL
+    model = _MODELS.get(model_name)
+    if model is not None:
+        return model
     with _MODEL_LOCK:
-        if _MODEL is not None:
-            return _MODEL
+        model = _MODELS.get(model_name)
+        if model is not None:
+            return model
         try:
             from faster_whisper import WhisperModel
         except Exception as exc:
             raise RuntimeError("faster-whisper is not installed") from exc
-        _MODEL = WhisperModel(
-            Config.TRANSCRIBE_MODEL,
+        model = WhisperModel(
+            model_name,
             device=Config.TRANSCRIBE_DEVICE,
             compute_type=Config.TRANSCRIBE_COMPUTE_TYPE,
             cpu_threads=max(0, int(Config.TRANSCRIBE_CPU_THREADS or 0)),
             num_workers=max(1, int(Config.TRANSCRIBE_MODEL_WORKERS or 1)),
         )
-    return _MODEL
+        _MODELS[model_name] = model
+    return model
 
 
 def _normalize_hint(value):
@@ -277,126 +690,36 @@ def _build_transcription_prompt(gravacao):
     return " ".join(prompt_parts).strip() or None
 
 
-def _prepare_audio_for_transcription(filepath):
-    if not filepath or not os.path.exists(filepath) or not Config.TRANSCRIBE_AUDIO_PREPROCESS:
-        return filepath, None
-
-    prepared_path = None
-
-    try:
-        fd, prepared_path = tempfile.mkstemp(prefix="transcribe_", suffix=".wav")
-        os.close(fd)
-
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-hide_banner",
-            "-loglevel",
-            "error",
-            "-nostdin",
-            "-y",
-            "-i",
-            filepath,
-        ]
-
-        audio_filter = (Config.TRANSCRIBE_AUDIO_FILTER or "").strip()
-        if audio_filter:
-            ffmpeg_cmd += ["-af", audio_filter]
-
-        ffmpeg_cmd += [
-            "-ac",
-            str(max(1, int(Config.TRANSCRIBE_AUDIO_CHANNELS or 1))),
-            "-ar",
-            str(max(8000, int(Config.TRANSCRIBE_AUDIO_SAMPLE_RATE or 16000))),
-            "-c:a",
-            "pcm_s16le",
-            prepared_path,
-        ]
-
-        subprocess.run(
-            ffmpeg_cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.PIPE,
-            check=True,
+def _build_transcribe_kwargs(gravacao):
+    language = Config.TRANSCRIBE_LANGUAGE or None
+    prompt = _build_transcription_prompt(gravacao)
+    hotwords = _build_transcription_hotwords(gravacao)
+    transcribe_kwargs = {
+        "language": language,
+        "beam_size": max(1, int(Config.TRANSCRIBE_BEAM_SIZE or 1)),
+        "best_of": max(1, int(Config.TRANSCRIBE_BEST_OF or 1)),
+        "patience": max(1.0, float(Config.TRANSCRIBE_PATIENCE or 1.0)),
+        "condition_on_previous_text": bool(Config.TRANSCRIBE_CONDITION_ON_PREVIOUS_TEXT),
+        "word_timestamps": bool(Config.TRANSCRIBE_WORD_TIMESTAMPS),
+    }
+    if prompt:
+        transcribe_kwargs["initial_prompt"] = prompt
+    if hotwords:
+        transcribe_kwargs["hotwords"] = hotwords
+    if Config.TRANSCRIBE_WORD_TIMESTAMPS and Config.TRANSCRIBE_HALLUCINATION_SILENCE_THRESHOLD is not None:
+        transcribe_kwargs["hallucination_silence_threshold"] = float(
+            Config.TRANSCRIBE_HALLUCINATION_SILENCE_THRESHOLD
         )
-        if os.path.exists(prepared_path) and os.path.getsize(prepared_path) > 0:
-            return prepared_path, prepared_path
-    except Exception as exc:
-        if has_app_context():
-            try:
-                current_app.logger.warning(f"Falha ao preparar audio para transcricao: {exc}")
-            except Exception:
-                pass
-
-    try:
-        if prepared_path and os.path.exists(prepared_path):
-            os.remove(prepared_path)
-    except Exception:
-        pass
-    return filepath, None
-
-
-def _cleanup_prepared_audio(filepath):
-    if not filepath:
-        return
-    try:
-        if os.path.exists(filepath):
-            os.remove(filepath)
-    except Exception:
-        pass
-
-
-def _probe_duration_seconds(filepath):
-    if not filepath or not os.path.exists(filepath):
-        return None
-    try:
-        out = subprocess.check_output(
-            [
-                "ffprobe",
-                "-v",
-                "error",
-                "-show_entries",
-                "format=duration",
-                "-of",
-                "default=noprint_wrappers=1:nokey=1",
-                filepath,
-            ],
-            stderr=subprocess.STDOUT,
-        )
-        return int(round(float(out.strip())))
-    except Exception:
-        return None
-
-
-def _get_transcription_segments_path(gravacao_id):
-    if not gravacao_id:
-        return None
-    filename = f"{gravacao_id}.segments.json"
-    return os.path.join(Config.STORAGE_PATH, "transcripts", filename)
-
-
-def _persist_transcription_segments(gravacao_id, segments):
-    path = _get_transcription_segments_path(gravacao_id)
-    if not path:
-        return
-    try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as fp:
-            json.dump({"segments": segments}, fp, ensure_ascii=True)
-    except Exception:
-        pass
-
-
-def get_transcription_segments(gravacao_id):
-    path = _get_transcription_segments_path(gravacao_id)
-    if not path or not os.path.exists(path):
-        return []
-    try:
-        with open(path, "r", encoding="utf-8") as fp:
-            data = json.load(fp) or {}
-    except Exception:
-        return []
-    segments = data.get("segments")
-    return segments if isinstance(segments, list) else []
+    if Config.TRANSCRIBE_VAD:
+        transcribe_kwargs["vad_filter"] = True
+        transcribe_kwargs["vad_parameters"] = {
+            "min_silence_duration_ms": int(Config.TRANSCRIBE_VAD_MIN_SILENCE_MS or 2000),
+            "speech_pad_ms": int(Config.TRANSCRIBE_VAD_SPEECH_PAD_MS or 500),
+        }
+    chunk_length = int(Config.TRANSCRIBE_CHUNK_LENGTH or 0)
+    if chunk_length > 0:
+        transcribe_kwargs["chunk_length"] = chunk_length
+    return transcribe_kwargs
 
 
 def _transcription_changed(
@@ -481,7 +804,12 @@ def _update_progress(gravacao, progresso):
     )
 
 
-def transcribe_gravacao(gravacao_id, *, force=False):
+def transcribe_gravacao(gravacao_id, *, force=False, preset=None, rerun=False):
+    """
+    Transcreve a gravação com o preset indicado. Num reprocessamento (rerun)
+    nada é gravado até o fim: o texto atual só é substituído se a nova
+    transcrição concluir.
+    """
     if not Config.TRANSCRIBE_ENABLED:
         return False
 
@@ -492,10 +820,16 @@ def transcribe_gravacao(gravacao_id, *, force=False):
     if gravacao.transcricao_texto and not force:
         return True
 
+    def _commit(**kwargs):
+        if rerun:
+            return False
+        return _commit_transcription(gravacao, **kwargs)
+
+    model_name = Config.TRANSCRIBE_MODEL if is_pool_enabled() else get_preset_model(preset)
+
     filepath = _resolve_audio_filepath(gravacao)
     if not filepath or not os.path.exists(filepath):
-        _commit_transcription(
-            gravacao,
+        _commit(
             status="erro",
             erro="arquivo_de_audio_nao_encontrado",
             progresso=gravacao.transcricao_progresso or 0,
@@ -506,8 +840,7 @@ def transcribe_gravacao(gravacao_id, *, force=False):
     except Exception:
         file_size = 0
     if file_size < 1024 and not force:
-        _commit_transcription(
-            gravacao,
+        _commit(
             status="erro",
             erro="arquivo_de_audio_invalido",
             progresso=gravacao.transcricao_progresso or 0,
@@ -515,7 +848,7 @@ def transcribe_gravacao(gravacao_id, *, force=False):
         return False
 
     if (gravacao.duracao_segundos or 0) <= 0:
-        probed_duration = _probe_duration_seconds(filepath) or 0
+        probed_duration = probe_duration_seconds(filepath) or 0
         if probed_duration > 0:
             gravacao.duracao_segundos = probed_duration
             try:
@@ -523,23 +856,22 @@ def transcribe_gravacao(gravacao_id, *, force=False):
             except Exception:
                 db.session.rollback()
 
-    _commit_transcription(
-        gravacao,
+    _commit(
         status="processando",
         erro=None,
-        modelo=Config.TRANSCRIBE_MODEL,
+        modelo=model_name,
         progresso=0,
         cancelada=False,
     )
 
-    prepared_filepath = None
-    transcribe_input_path = filepath
+    scratch_path = None
+    pool_job = None
     lock_acquired = False
-    if Config.TRANSCRIBE_SERIALIZE_JOBS:
+    reporter = TranscriptionProgress(gravacao, _commit, progress=gravacao.transcricao_progresso or 0)
+    if Config.TRANSCRIBE_SERIALIZE_JOBS and not is_pool_enabled():
         lock_acquired = _TRANSCRIBE_LOCK.acquire(blocking=False)
         if not lock_acquired:
-            _commit_transcription(
-                gravacao,
+            _commit(
                 status="fila",
                 progresso=gravacao.transcricao_progresso or 0,
                 cancelada=False,
@@ -548,33 +880,27 @@ def transcribe_gravacao(gravacao_id, *, force=False):
                 if _TRANSCRIBE_LOCK.acquire(timeout=1):
                     lock_acquired = True
                     break
-                try:
-                    db.session.refresh(gravacao)
-                    if gravacao.transcricao_cancelada:
-                        _commit_transcription(
-                            gravacao,
-                            status="interrompido",
-                            progresso=gravacao.transcricao_progresso or 0,
-                            cancelada=True,
-                        )
-                        return False
-                except Exception:
-                    pass
+                if reporter.cancelled():
+                    _commit(
+                        status="interrompido",
+                        progresso=gravacao.transcricao_progresso or 0,
+                        cancelada=True,
+                    )
+                    reporter.close()
+                    return False
 
     try:
         try:
             db.session.refresh(gravacao)
             if gravacao.transcricao_cancelada:
-                _commit_transcription(
-                    gravacao,
+                _commit(
                     status="interrompido",
                     progresso=gravacao.transcricao_progresso or 0,
                     cancelada=True,
                 )
                 return False
             if gravacao.transcricao_status == "fila":
-                _commit_transcription(
-                    gravacao,
+                _commit(
                     status="processando",
                     progresso=max(1, gravacao.transcricao_progresso or 0),
                     cancelada=False,
@@ -582,145 +908,90 @@ def transcribe_gravacao(gravacao_id, *, force=False):
         except Exception:
             pass
 
-        transcribe_input_path, prepared_filepath = _prepare_audio_for_transcription(filepath)
-        model = _load_model()
-        language = Config.TRANSCRIBE_LANGUAGE or None
-        prompt = _build_transcription_prompt(gravacao)
-        hotwords = _build_transcription_hotwords(gravacao)
-        transcribe_kwargs = {
-            "language": language,
-            "beam_size": max(1, int(Config.TRANSCRIBE_BEAM_SIZE or 1)),
-            "best_of": max(1, int(Config.TRANSCRIBE_BEST_OF or 1)),
-            "patience": max(1.0, float(Config.TRANSCRIBE_PATIENCE or 1.0)),
-            "condition_on_previous_text": bool(Config.TRANSCRIBE_CONDITION_ON_PREVIOUS_TEXT),
-            "word_timestamps": bool(Config.TRANSCRIBE_WORD_TIMESTAMPS),
-        }
-        if prompt:
-            transcribe_kwargs["initial_prompt"] = prompt
-        if hotwords:
-            transcribe_kwargs["hotwords"] = hotwords
-        if Config.TRANSCRIBE_WORD_TIMESTAMPS and Config.TRANSCRIBE_HALLUCINATION_SILENCE_THRESHOLD is not None:
-            transcribe_kwargs["hallucination_silence_threshold"] = float(
-                Config.TRANSCRIBE_HALLUCINATION_SILENCE_THRESHOLD
+        transcribe_kwargs = apply_transcription_preset(_build_transcribe_kwargs(gravacao), preset)
+        if is_pool_enabled():
+            # O processo do pool decodifica o áudio: nada de arrays grandes pela fila.
+            pool_job = get_transcription_pool().submit(
+                filepath,
+                transcribe_kwargs,
+                duration_seconds=gravacao.duracao_segundos,
+            )
+            segments, info = pool_job.results()
+        else:
+            audio, scratch_path = load_transcription_audio(
+                filepath,
+                duration_seconds=gravacao.duracao_segundos,
+            )
+            model = _load_model(model_name)
+            raw_segments, info = model.transcribe(audio, **transcribe_kwargs)
+            segments = (
+                (_build_segment_payload(segment), getattr(segment, "end", 0) or 0)
+                for segment in raw_segments
             )
-        if Config.TRANSCRIBE_VAD:
-            transcribe_kwargs["vad_filter"] = True
-            transcribe_kwargs["vad_parameters"] = {
-                "min_silence_duration_ms": int(Config.TRANSCRIBE_VAD_MIN_SILENCE_MS or 2000),
-                "speech_pad_ms": int(Config.TRANSCRIBE_VAD_SPEECH_PAD_MS or 500),
-            }
-        chunk_length = int(Config.TRANSCRIBE_CHUNK_LENGTH or 0)
-        if chunk_length > 0:
-            transcribe_kwargs["chunk_length"] = chunk_length
-        segments, info = model.transcribe(transcribe_input_path, **transcribe_kwargs)
         detected_lang = getattr(info, "language", None)
 
         total_duration = gravacao.duracao_segundos or int(round(getattr(info, "duration", 0) or 0)) or 0
         if total_duration <= 0:
-            total_duration = _probe_duration_seconds(filepath) or 0
+            total_duration = probe_duration_seconds(filepath) or 0
 
-        parts = []
         segments_payload = []
-        last_progress = gravacao.transcricao_progresso or 0
-        last_text_end = 0.0
-        text_update_seconds = max(1, int(Config.TRANSCRIBE_TEXT_UPDATE_SECONDS or 10))
-        progress_step = max(1, int(Config.TRANSCRIBE_PROGRESS_STEP or 5))
-
-        _commit_transcription(
-            gravacao,
-            status="processando",
-            progresso=last_progress or 1,
-        )
-        if last_progress == 0:
-            last_progress = 1
-
-        for segment in segments:
-            text = (segment.text or "").strip()
-            if text:
-                words_payload = []
-                for word in getattr(segment, "words", None) or []:
-                    word_text = (getattr(word, "word", "") or "").strip()
-                    if not word_text:
-                        continue
-                    words_payload.append({
-                        "start": float(getattr(word, "start", 0) or 0),
-                        "end": float(getattr(word, "end", 0) or 0),
-                        "word": word_text,
-                        "probability": float(getattr(word, "probability", 0) or 0),
-                    })
-                parts.append(text)
-                segment_payload = {
-                    "start": float(getattr(segment, "start", 0) or 0),
-                    "end": float(getattr(segment, "end", 0) or 0),
-                    "text": text,
-                }
-                if words_payload:
-                    segment_payload["words"] = words_payload
+        if reporter.progress == 0:
+            reporter.progress = 1
+        reporter.flush(force=True)
+
+        # Progresso e texto parcial ficam no reporter e vão ao banco no ritmo
+        # de TRANSCRIBE_PROGRESS_FLUSH_SECONDS, não a cada segmento.
+        for segment_payload, segment_end in segments:
+            if segment_payload:
                 segments_payload.append(segment_payload)
 
-            segment_end = getattr(segment, "end", 0) or 0
             if total_duration:
                 progress = int((segment_end / total_duration) * 100)
                 if progress == 0 and segment_end:
                     progress = 1
-                progress = max(last_progress, min(99, progress))
+                progress = min(99, progress)
             else:
-                progress = min(99, last_progress + 1)
-
-            text_update = segment_end and (segment_end - last_text_end) >= text_update_seconds
-            progress_update = progress > last_progress and (
-                (progress - last_progress) >= progress_step or progress >= 99
+                progress = min(99, reporter.progress + 1)
+            reporter.update(
+                progress=progress,
+                text=segment_payload["text"] if segment_payload else None,
+                audio_end=segment_end,
             )
-            if progress_update or text_update:
-                texto_parcial = " ".join(parts).strip() if text_update else None
-                _commit_transcription(
-                    gravacao,
-                    status="processando",
-                    progresso=progress if progress_update else last_progress,
-                    texto=texto_parcial,
-                )
-                if progress_update:
-                    last_progress = progress
-                if text_update:
-                    last_text_end = float(segment_end)
 
-            try:
-                db.session.refresh(gravacao)
-                if gravacao.transcricao_cancelada:
-                    partial = " ".join(parts).strip()
-                    _commit_transcription(
-                        gravacao,
-                        status="interrompido",
-                        texto=partial,
-                        progresso=last_progress,
-                        cancelada=True,
-                    )
-                    return False
-            except Exception:
-                pass
+            if reporter.cancelled():
+                _commit(
+                    status="interrompido",
+                    texto=reporter.text,
+                    progresso=reporter.progress,
+                    cancelada=True,
+                )
+                return False
     except Exception as exc:
-        _commit_transcription(
-            gravacao,
+        if rerun:
+            current_app.logger.warning("Reprocessamento da transcricao %s falhou: %s", gravacao.id, exc)
+        _commit(
             status="erro",
             erro=str(exc)[:500],
             progresso=gravacao.transcricao_progresso or 0,
         )
         return False
     finally:
+        reporter.close()
+        if pool_job is not None:
+            pool_job.cancel()
         if lock_acquired:
             try:
                 _TRANSCRIBE_LOCK.release()
             except Exception:
                 pass
-        _cleanup_prepared_audio(prepared_filepath)
+        cleanup_transcription_audio(scratch_path)
 
-    texto = " ".join(parts).strip()
+    texto = reporter.text
     if not texto:
-        _commit_transcription(
-            gravacao,
+        _commit(
             status="erro",
             erro="transcricao_vazia",
-            progresso=last_progress,
+            progresso=reporter.progress,
         )
         return False
 
@@ -729,16 +1000,20 @@ def transcribe_gravacao(gravacao_id, *, force=False):
         status="concluido",
         texto=texto,
         idioma=detected_lang or Config.TRANSCRIBE_LANGUAGE,
-        modelo=Config.TRANSCRIBE_MODEL,
+        modelo=model_name,
         progresso=100,
         cancelada=False,
     )
-    _persist_transcription_segments(gravacao.id, segments_payload)
+    replace_transcription_segments(gravacao.id, segments_payload)
+    refresh_tag_occurrences_for_gravacao(gravacao.id)
+    if not rerun:
+        # O reprocessamento só melhora o texto; os alertas já saíram na primeira passada
+        evaluate_keyword_alerts(gravacao, segments_payload)
     _cleanup_local_audio_after_transcription(gravacao)
     return True
 
 
-def start_transcription(gravacao_id, *, force=False):
+def start_transcription(gravacao_id, *, force=False, priority=0):
     if not Config.TRANSCRIBE_ENABLED:
         return False
 
@@ -747,97 +1022,80 @@ def start_transcription(gravacao_id, *, force=False):
     except Exception:
         gravacao = None
 
+    # Texto parcial de uma sessão ao vivo interrompida (ainda "processando") não conta
+    partial_text = bool(gravacao and gravacao.transcricao_texto and gravacao.transcricao_status == "processando")
     if gravacao:
-        if gravacao.transcricao_texto and not force:
+        if gravacao.transcricao_texto and not partial_text and not force:
             return True
 
-    _ensure_transcribe_workers()
+    if force and has_running_transcription_job(gravacao_id):
+        # Não há como reenfileirar sobre um job em execução (um ativo por gravação):
+        # recusa em vez de zerar o status e perder o pedido
+        return False
+
+    if not force:
+        from services.live_transcription_service import is_live_transcription_active
 
-    with _TRANSCRIBE_IN_FLIGHT_LOCK:
-        if not force and _TRANSCRIBE_IN_FLIGHT.get(gravacao_id, 0) > 0:
+        # A sessão ao vivo conclui a transcrição (ou reenfileira com force em caso de falha).
+        if is_live_transcription_active(gravacao_id):
+            return True
+        if has_active_transcription_job(gravacao_id):
             return True
-        _TRANSCRIBE_IN_FLIGHT[gravacao_id] += 1
+        # O worker só refaz gravações com texto quando o job vem com force
+        force = partial_text
 
     if gravacao:
-        with _TRANSCRIBE_ACTIVE_LOCK:
-            active = _TRANSCRIBE_ACTIVE
-        pending = _TRANSCRIBE_QUEUE.qsize()
-        max_workers = _get_transcribe_max_workers()
-        queued = active >= max_workers or pending > 0
-        initial_status = "fila" if queued else "processando"
         _commit_transcription(
             gravacao,
-            status=initial_status,
+            status="fila",
             erro=None,
             modelo=Config.TRANSCRIBE_MODEL,
             progresso=0,
             cancelada=False,
         )
+        usuario = getattr(gravacao, "usuario", None)
+        priority = (priority or 0) + get_transcription_priority(
+            radio_id=gravacao.radio_id,
+            cliente_id=getattr(usuario, "cliente_id", None),
+        )
 
-    try:
-        app_obj = current_app._get_current_object()
-    except Exception:
-        app_obj = None
-
-    _TRANSCRIBE_QUEUE.put({
-        "gravacao_id": gravacao_id,
-        "force": force,
-        "app_obj": app_obj,
-    })
-    return True
+    job = enqueue_transcription(gravacao_id, force=force, priority=priority)
+    _TRANSCRIBE_WAKE.set()
+    return job is not None
 
 
-def recover_pending_transcriptions(limit=None):
+def backfill_transcription_jobs():
+    """
+    Enfileira gravações marcadas como fila/processando sem job ativo (deixadas
+    pela fila em memória antiga, por sessões ao vivo interrompidas ou por
+    workers reiniciados). Roda na subida e periodicamente pelo scheduler;
+    gravações ainda em andamento ficam para a finalização.
+    """
     if not Config.TRANSCRIBE_ENABLED:
         return 0
-
-    batch_size = max(1, int(limit or _get_transcribe_recovery_batch_size()))
-    query = db.session.query(Gravacao.id).filter(Gravacao.status == "concluido")
-    query = query.filter(
-        or_(
-            Gravacao.transcricao_texto.is_(None),
-            Gravacao.transcricao_texto == "",
-        )
-    )
-    query = query.filter(
-        or_(
-            Gravacao.arquivo_nome.isnot(None),
-            Gravacao.arquivo_url.isnot(None),
-        )
-    )
-    query = query.filter(
-        or_(
-            Gravacao.transcricao_cancelada.is_(None),
-            Gravacao.transcricao_cancelada.is_(False),
+    cutoff = datetime.now(tz=LOCAL_TZ) - timedelta(minutes=_BACKFILL_STALE_MINUTES)
+    active_job = (
+        db.session.query(TranscriptionJob.id)
+        .filter(
+            TranscriptionJob.gravacao_id == Gravacao.id,
+            TranscriptionJob.status.in_(TRANSCRIPTION_JOB_ACTIVE_STATUSES),
         )
+        .exists()
     )
-    query = query.filter(
-        or_(
-            Gravacao.transcricao_status.is_(None),
-            Gravacao.transcricao_status == "",
-            db.func.lower(Gravacao.transcricao_status).in_(_RECOVERABLE_TRANSCRIPTION_STATUSES),
-        )
+    rows = (
+        db.session.query(Gravacao.id)
+        .filter(db.func.lower(Gravacao.transcricao_status).in_(("fila", "processando")))
+        .filter(Gravacao.atualizado_em <= cutoff)
+        .filter(Gravacao.status.notin_(("iniciando", "gravando")))
+        .filter(~active_job)
+        .all()
     )
-    gravacao_ids = [
-        row[0]
-        for row in query.order_by(Gravacao.criado_em.asc()).limit(batch_size).all()
-        if row and row[0]
-    ]
-
     queued = 0
-    for gravacao_id in gravacao_ids:
-        try:
-            if start_transcription(gravacao_id, force=False):
-                queued += 1
-        except Exception:
-            if has_app_context():
-                try:
-                    current_app.logger.exception(
-                        "Falha ao recuperar transcricao pendente %s",
-                        gravacao_id,
-                    )
-                except Exception:
-                    pass
+    for (gravacao_id,) in rows:
+        if enqueue_transcription(gravacao_id) is not None:
+            queued += 1
+    if queued:
+        _TRANSCRIBE_WAKE.set()
     return queued
 
 
@@ -849,10 +1107,22 @@ def request_transcription_stop(gravacao_id):
         return False
     if gravacao.transcricao_status not in ("processando", "interrompendo", "fila"):
         return False
+    cancel_transcription_jobs(gravacao.id)
+    if gravacao.transcricao_status == "fila" and not has_active_transcription_job(gravacao.id):
+        # Job ainda não reservado: nenhum worker vai concluir a interrupção.
+        _commit_transcription(
+            gravacao,
+            status="interrompido",
+            progresso=gravacao.transcricao_progresso or 0,
+            cancelada=True,
+        )
+        return True
     _commit_transcription(
         gravacao,
         status="interrompendo",
         progresso=gravacao.transcricao_progresso or 0,
         cancelada=True,
     )
+    # Worker neste processo para já; em outro processo, no próximo flush.
+    signal_transcription_cancel(gravacao.id)
     return True
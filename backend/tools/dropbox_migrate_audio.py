@@ -13,13 +13,16 @@ from app import db
 from config import Config
 from models.gravacao import Gravacao
 from models.radio import Radio
+from services.audio_location_service import record_audio_location
 from services.dropbox_service import (
+    CONCURRENT_UPLOAD_MIN_BYTES,
     DropboxError,
     build_audio_destination,
     build_remote_audio_path,
     get_audio_id_from_filename,
     get_dropbox_config,
     upload_file,
+    upload_files_batch,
 )
 
 
@@ -63,6 +66,29 @@ def resolve_gravacao_by_filename(filename: str) -> Optional[Gravacao]:
     return Gravacao.query.get(gravacao_id)
 
 
+def after_upload(app, local_path: str, remote_path: str, gravacao_id: Optional[str], *, delete_local: bool) -> None:
+    if delete_local:
+        try:
+            os.remove(local_path)
+        except Exception as exc:
+            print(f"Falha ao remover local {local_path}: {exc}")
+    else:
+        marker_path = f"{local_path}.dropbox"
+        try:
+            with open(marker_path, "w", encoding="utf-8") as fp:
+                fp.write(remote_path)
+        except Exception as exc:
+            print(f"Falha ao criar marcador {marker_path}: {exc}")
+    if app and gravacao_id:
+        with app.app_context():
+            record_audio_location(
+                gravacao_id,
+                filename=local_path if os.path.exists(local_path) else None,
+                dropbox_path=remote_path,
+                marker=os.path.exists(f"{local_path}.dropbox"),
+            )
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description="Migra arquivos de audio locais (storage/audio) para Dropbox e, opcionalmente, remove do disco.",
@@ -82,6 +108,12 @@ def main() -> int:
         action="store_true",
         help="Remove o arquivo local apos upload bem-sucedido.",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=50,
+        help="Arquivos pequenos confirmados por finish_batch (1 = um upload por arquivo).",
+    )
     parser.add_argument(
         "--limit",
         type=int,
@@ -117,15 +149,16 @@ def main() -> int:
     if cfg.audio_layout == "hierarchy":
         app = create_db_app()
 
-    ok = 0
-    failed = 0
+    plan = []
     for local_path in files:
         filename = os.path.basename(local_path)
         remote_path = build_remote_audio_path(filename, base_path=cfg.audio_path)
+        gravacao_id = None
         if app:
             with app.app_context():
                 gravacao = resolve_gravacao_by_filename(filename)
                 if gravacao:
+                    gravacao_id = gravacao.id
                     radio_obj = gravacao.radio or Radio.query.get(gravacao.radio_id)
                     remote_path, _ = build_audio_destination(
                         gravacao,
@@ -134,30 +167,53 @@ def main() -> int:
                         base_path=cfg.audio_path,
                         layout=cfg.audio_layout,
                     )
+        plan.append((local_path, remote_path, gravacao_id))
+
+    if args.dry_run:
+        for local_path, remote_path, _ in plan:
+            print(f"[dry-run] upload {local_path} -> {remote_path}")
+        return 0
+
+    # Arquivos pequenos sobem juntos e são confirmados num único finish_batch
+    batch_size = max(1, args.batch_size)
+    small = []
+    large = []
+    for entry in plan:
+        try:
+            is_small = batch_size > 1 and os.path.getsize(entry[0]) <= CONCURRENT_UPLOAD_MIN_BYTES
+        except OSError:
+            is_small = False
+        (small if is_small else large).append(entry)
+
+    ok = 0
+    failed = 0
+    for start in range(0, len(small), batch_size):
+        batch = small[start:start + batch_size]
         try:
-            if args.dry_run:
-                print(f"[dry-run] upload {local_path} -> {remote_path}")
-            else:
-                upload_file(local_path, remote_path, token=cfg.access_token)
-                ok += 1
-                if delete_local:
-                    try:
-                        os.remove(local_path)
-                    except Exception as exc:
-                        print(f"Falha ao remover local {local_path}: {exc}")
-                else:
-                    marker_path = f"{local_path}.dropbox"
-                    try:
-                        with open(marker_path, "w", encoding="utf-8") as fp:
-                            fp.write(remote_path)
-                    except Exception as exc:
-                        print(f"Falha ao criar marcador {marker_path}: {exc}")
+            results = upload_files_batch([(local_path, remote_path) for local_path, remote_path, _ in batch], token=cfg.access_token)
+        except Exception as exc:
+            results = [exc] * len(batch)
+        for (local_path, remote_path, gravacao_id), result in zip(batch, results):
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"Falha no upload {local_path}: {result}")
+                continue
+            ok += 1
+            after_upload(app, local_path, remote_path, gravacao_id, delete_local=delete_local)
+
+    for local_path, remote_path, gravacao_id in large:
+        try:
+            upload_file(local_path, remote_path, token=cfg.access_token)
         except DropboxError as exc:
             failed += 1
             print(f"Falha no upload {local_path}: {exc}")
+            continue
         except Exception as exc:
             failed += 1
             print(f"Erro inesperado em {local_path}: {exc}")
+            continue
+        ok += 1
+        after_upload(app, local_path, remote_path, gravacao_id, delete_local=delete_local)
 
     print(f"Concluido. Sucesso: {ok}, Falhas: {failed}")
     return 0 if failed == 0 else 1
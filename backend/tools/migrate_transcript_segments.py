@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+from typing import Iterable
+
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from flask import Flask
+
+from app import db
+from config import Config
+from models.gravacao import Gravacao
+from models.transcription_segment import TranscriptionSegment
+from services.transcription_segments_service import import_legacy_segments
+
+LEGACY_SUFFIX = ".segments.json"
+
+
+def create_db_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = Config.SQLALCHEMY_ENGINE_OPTIONS
+    db.init_app(app)
+    try:
+        Config.init_app(app)
+    except Exception:
+        pass
+    return app
+
+
+def iter_legacy_ids(transcripts_dir: str) -> Iterable[str]:
+    if not os.path.isdir(transcripts_dir):
+        return
+    for name in sorted(os.listdir(transcripts_dir)):
+        if name.endswith(LEGACY_SUFFIX):
+            yield name[: -len(LEGACY_SUFFIX)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Migra storage/transcripts/*.segments.json para a tabela transcricao_segmentos.",
+    )
+    parser.add_argument("--limit", type=int, default=0, help="Maximo de arquivos (0 = todos).")
+    parser.add_argument("--dry-run", action="store_true", help="Apenas lista o que seria migrado.")
+    args = parser.parse_args()
+
+    transcripts_dir = os.path.join(Config.STORAGE_PATH, "transcripts")
+    app = create_db_app()
+    migrated = 0
+    segments = 0
+    orphaned = 0
+    with app.app_context():
+        TranscriptionSegment.__table__.create(db.engine, checkfirst=True)
+        for gravacao_id in iter_legacy_ids(transcripts_dir):
+            if args.limit and migrated >= args.limit:
+                break
+            if db.session.get(Gravacao, gravacao_id) is None:
+                orphaned += 1
+                print(f"[SKIP] {gravacao_id}: gravacao nao encontrada")
+                continue
+            if args.dry_run:
+                print(f"[DRY] {gravacao_id}")
+                migrated += 1
+                continue
+            count = import_legacy_segments(gravacao_id)
+            segments += count
+            migrated += 1
+            print(f"[OK] {gravacao_id}: {count} segmentos")
+            db.session.expunge_all()
+
+    print(f"Arquivos migrados: {migrated}; segmentos: {segments}; sem gravacao: {orphaned}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
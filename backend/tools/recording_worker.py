@@ -0,0 +1,59 @@
+"""
+Gravador avulso: roda o scheduler (agendamentos, supervisor das gravações,
+recuperação de órfãs) fora do gunicorn, para que reciclar ou reiniciar a API
+não derrube o ffmpeg das gravações em andamento.
+
+Uso: defina SCHEDULER_ENABLED=false na API e rode este processo à parte.
+Parada manual e /api/recording/status chegam aqui pela tabela
+gravacao_processos. Eventos de Socket.IO emitidos deste processo só chegam
+aos clientes com um message queue configurado no SocketIO.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+# O app importado não inicia o scheduler; quem inicia é este processo, uma vez só.
+os.environ["SCHEDULER_ENABLED"] = "false"
+
+from app import app, wait_for_db
+from services.recording_supervisor import get_supervisor_status
+from services.scheduler_service import init_scheduler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Processo dedicado ao scheduler e ao supervisor das gravacoes.",
+    )
+    parser.add_argument(
+        "--status-interval",
+        type=int,
+        default=300,
+        help="Segundos entre os resumos de gravacoes ativas no log (0 = desligado).",
+    )
+    args = parser.parse_args()
+
+    with app.app_context():
+        wait_for_db(max_tries=60, delay=1)
+        init_scheduler(app)
+    print("Gravador ativo (scheduler e supervisor fora da API).")
+
+    last_status = time.time()
+    try:
+        while True:
+            time.sleep(5)
+            if args.status_interval > 0 and time.time() - last_status >= args.status_interval:
+                last_status = time.time()
+                print(f"Gravacoes ativas: {len(get_supervisor_status())}")
+    except KeyboardInterrupt:
+        print("Encerrando gravador.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
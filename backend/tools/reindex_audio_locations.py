@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+from flask import Flask
+
+from app import db
+from config import Config
+from models.audio_location import AudioLocation
+from services.audio_location_service import reindex_audio_locations
+
+
+def create_db_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = Config.SQLALCHEMY_ENGINE_OPTIONS
+    db.init_app(app)
+    try:
+        Config.init_app(app)
+    except Exception:
+        pass
+    return app
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Reconstroi o indice audio_localizacoes a partir de storage/audio (arquivos e marcadores .dropbox).",
+    )
+    parser.add_argument(
+        "--storage-path",
+        default=Config.STORAGE_PATH,
+        help="Raiz do storage (default: STORAGE_PATH).",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="So conta o que seria gravado.")
+    args = parser.parse_args()
+
+    app = create_db_app()
+    with app.app_context():
+        AudioLocation.__table__.create(db.engine, checkfirst=True)
+        stats = reindex_audio_locations(storage_path=os.path.abspath(args.storage_path), dry_run=args.dry_run)
+
+    prefix = "[dry-run] " if args.dry_run else ""
+    print(
+        f"{prefix}Gravacoes: {stats['gravacoes']}; com arquivo local: {stats['locais']}; "
+        f"com marcador: {stats['marcadores']}; sem arquivo local: {stats['sem_arquivo']}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+# Processo dedicado à fila: sem scheduler, para não duplicar agendamentos/gravações.
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+from flask import Flask
+
+from app import db
+from config import Config
+from services.transcription_service import backfill_transcription_jobs, start_transcription_workers
+
+
+def create_db_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = Config.SQLALCHEMY_ENGINE_OPTIONS
+    db.init_app(app)
+    try:
+        Config.init_app(app)
+    except Exception:
+        pass
+    return app
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Worker avulso da fila de transcricao (tabela transcricao_jobs).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Threads consumidoras (0 = TRANSCRIBE_MAX_CONCURRENT ou tamanho do pool de processos).",
+    )
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="Enfileira gravacoes em fila/processando sem job ativo antes de iniciar.",
+    )
+    args = parser.parse_args()
+
+    if not Config.TRANSCRIBE_ENABLED:
+        print("Transcricao desativada. Defina TRANSCRIBE_ENABLED=true.")
+        return 2
+    if args.workers and args.workers > 0:
+        Config.TRANSCRIBE_MAX_CONCURRENT = args.workers
+        Config.TRANSCRIBE_POOL_PROCESSES = args.workers
+
+    app = create_db_app()
+    with app.app_context():
+        if args.backfill:
+            print(f"Jobs enfileirados no backfill: {backfill_transcription_jobs()}")
+        started = start_transcription_workers(app)
+    print(f"Workers de transcricao ativos: {started}")
+
+    try:
+        while True:
+            time.sleep(30)
+            # Repõe threads que morreram por erro inesperado
+            with app.app_context():
+                start_transcription_workers(app)
+    except KeyboardInterrupt:
+        print("Encerrando worker de transcricao.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -210,9 +210,9 @@ const NuvemPalavrasPage = () => {
               />
               <SummaryCard
                 icon={Radio}
-                title="Gravações lidas"
-                value={summary.recordings_scanned ?? 0}
-                description={`${summary.recordings_with_matches ?? 0} gravações tiveram pelo menos uma correspondência.`}
+                title="Tags em indexação"
+                value={summary.pending_tags ?? 0}
+                description="Tags novas ainda sendo procuradas nas transcrições; as contagens completam em seguida."
                 accentClass="text-amber-300"
               />
               <SummaryCard